@@ -10,10 +10,11 @@ MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
 See the Mulan PSL v2 for more details.
 '''
 import argparse
+import logging
 import os
 
 from dataclasses import dataclass
-from app import util
+from app import util, outbox
 
 @dataclass
 class _Plugin:
@@ -33,27 +34,32 @@ class App:
         self.parser = None
         self.subparser_gen = {}
 
-    def _get_ext_spec(self):
-        for plugin in self.plugins:
-            plugin:_Plugin = plugin
-            self.spec_exts[plugin.name] = util.get_spec_ext(plugin.path, plugin.class_name)
+    def get_command(self, name):
+        '''
+        return the command instance of name, the plugin module is only
+        imported when the command is requested for the first time
+        '''
+        if name not in self.spec_exts:
+            plugin:_Plugin = self.plugins[name]
+            self.spec_exts[name] = util.get_spec_ext(plugin.path, plugin.class_name)
+        return self.spec_exts[name]
 
     def _get_plugins(self):
         plugins_data = util.parse_yaml(os.path.join(util.get_conf_path(), 'plugins.yaml'))
         # print(plugins_data)
-        plugins = []
+        plugins = {}
         for plugin in plugins_data['plugins']:
-            plugins.append(_Plugin(
+            plugins[plugin['name']] = _Plugin(
                 plugin['name'],
                 plugin['class'],
-                plugin['path']))
+                plugin['path'])
         return plugins
 
     def _setup_parsers(self):
         parser = argparse.ArgumentParser()
         subparser_gen = parser.add_subparsers(metavar='<command>', dest="command")
-        for plugin in self.plugins:
-            self.subparser_gen[plugin.name] = subparser_gen.add_parser(name = plugin.name)
+        for name in self.plugins:
+            self.subparser_gen[name] = subparser_gen.add_parser(name = name)
         self.parser = parser
 
     def run_command(self, argv):
@@ -62,11 +68,11 @@ class App:
         '''
         args, unknow = self.parser.parse_known_args(args=argv)
         if args.command is None or \
-            args.command not in self.spec_exts or \
+            args.command not in self.plugins or \
             args.command == 'help':
             self.help()
             return
-        cmd = self.spec_exts[args.command]
+        cmd = self.get_command(args.command)
 
         subargs = cmd.add_parser(self.subparser_gen[args.command])
 
@@ -82,6 +88,13 @@ class App:
         '''
         Program running portal
         '''
-        self._get_ext_spec()
+        # e.g. EMBEDDED_CI_LOG_LEVEL=debug shows the timing of every forge request
+        log_level = os.environ.get("EMBEDDED_CI_LOG_LEVEL")
+        if log_level:
+            logging.basicConfig(level=log_level.upper())
         self._setup_parsers()
-        self.run_command(argv)
+        try:
+            self.run_command(argv)
+        finally:
+            # send the forge mutations queued by the command
+            outbox.close_all()
@@ -64,6 +64,8 @@ class BuildParam:
     datetime: str = None
     sstate_cache_in: str = None
     sstate_cache_out: str = None
+    # copy only the objects the images need from the index of sstate_cache_in
+    sstate_prefetch: bool = False
     oebuild_extra: str = None
 
     #when gate.py remove ,four para can be delete
@@ -180,3 +182,48 @@ class Check(ABC):
         """
         def __init__(self, message):
             super().__init__(message)
+
+@dataclass
+class BenchParam:
+    '''
+    This class defines some basic parameter properties
+    as a standard for benchmark interface parameters
+    '''
+    commands: Optional[list] = None
+    rounds: int = 5
+    max_ms: Optional[float] = None
+    work_dir: Optional[str] = None
+    output: Optional[str] = None
+    # the pull request sizes, latency and 429 interval of the forge stub, the
+    # first size is the tree size in MB of the checksum benchmark
+    sizes: Optional[list] = None
+    latency_ms: float = 0
+    throttle_every: int = 0
+
+
+class Bench(ABC):
+    '''
+    The bench class is a defined interface class that defines
+    the called benchmark function, the bench command will call the
+    interface to measure a code path, and the business needs
+    to inherit the interface class and implement the bench interface
+    '''
+
+    @abstractmethod
+    def do_bench(self, param: BenchParam):
+        '''
+        This interface needs to be implemented by specific services
+        '''
+
+    def bench(self, param: BenchParam):
+        '''
+        This function is called by the body framework
+        '''
+        return self.do_bench(param)
+
+    class BenchError(Exception):
+        """
+        Bench Error
+        """
+        def __init__(self, message):
+            super().__init__(message)
@@ -0,0 +1,189 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import io
+import os
+import re
+import json
+import time
+from collections import deque
+
+from app import util
+
+LOG_SUFFIX = ".log.zst"
+INDEX_SUFFIX = ".idx"
+# NOTE: Running task 1234 of 5678 (/path/to/zlib_1.3.bb:do_compile)
+RUNNING_TASK_PATTERN = re.compile(r'^NOTE: Running (setscene )?task (\d+) of (\d+) \(')
+# NOTE: recipe zlib-1.3-r0: task do_compile: Started
+RECIPE_TASK_PATTERN = re.compile(r'^NOTE: recipe (\S+): task (\S+): (Started|Succeeded|Failed)$')
+# the lines that always reach the console
+SHOWN_PREFIXES = ("ERROR:", "WARNING:", "NOTE: Tasks Summary", "Summary:", "Sstate summary")
+# the recipes named in a progress line
+SHOWN_RECIPES = 4
+
+def get_log_path(log_dir, name, target):
+    '''
+    return the path of the full log of a bitbake target of a board
+    '''
+    target = re.sub(r'[^\w.-]+', '_', target)
+    return os.path.join(log_dir, f"{name}_{target}{LOG_SUFFIX}")
+
+def read_lines(log_path, start = 0, count = None):
+    '''
+    yield count lines of a full log from line start on, the line index
+    takes the reader to the zstd frame the line is in
+    '''
+    zstandard = util.import_module('zstandard')
+    first_line, offset = 0, 0
+    try:
+        with open(log_path + INDEX_SUFFIX, 'r', encoding="utf-8") as r_f:
+            for frame_line, frame_offset in json.loads(r_f.read()).get('frames', []):
+                if frame_line > start:
+                    break
+                first_line, offset = frame_line, frame_offset
+    except (OSError, ValueError):
+        # a log without index, e.g. of a build that was killed, is read from the start
+        pass
+    with open(log_path, 'rb') as r_f:
+        r_f.seek(offset)
+        reader = zstandard.ZstdDecompressor().stream_reader(r_f, read_across_frames=True)
+        line_no = first_line
+        for line in io.TextIOWrapper(reader, encoding="utf-8", errors="replace"):
+            if line_no >= start:
+                if count is not None and line_no >= start + count:
+                    return
+                yield line.rstrip('\n')
+            line_no += 1
+
+class BuildLog:
+    '''
+    The full output of a bitbake run written to a zstd log with a line
+    index, the console only gets the progress, warnings and errors of it.
+    The log is written in zstd frames, one every frame_lines lines or
+    progress interval, and the index keeps the first line and offset of
+    every frame so that read_lines seeks to a line without reading the
+    log before it
+    '''
+    def __init__(self, log_path, write = None):
+        conf = util.get_common_conf().get('build_log') or {}
+        self.is_condense = bool(conf.get('condense', True))
+        self.frame_lines = int(conf.get('frame_lines', 10000))
+        self.progress_interval = int(conf.get('progress_interval', 30))
+        self.log_path = log_path
+        self.lines = 0
+        self.last_line = ""
+        self._write = write or print
+        self._task = None
+        self._running = {}
+        self._last_progress = time.time()
+        self._is_error = False
+        self._errors = deque(maxlen=int(conf.get('excerpt_lines', 200)))
+        self._tail = deque(maxlen=int(conf.get('tail_lines', 50)))
+        self._chunk = []
+        self._frames = []
+        zstandard = util.import_module('zstandard')
+        self._cctx = zstandard.ZstdCompressor(level=int(conf.get('zstd_level', 3)))
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self._file = open(log_path, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if self._file is not None:
+            self.close(exc_type is not None)
+
+    def feed(self, line):
+        '''
+        take a line of the bitbake output
+        '''
+        self.last_line = line
+        self.lines += 1
+        self._chunk.append(line + "\n")
+        self._tail.append(line)
+        if line.startswith("| ") and self._is_error:
+            # the log data of a failed task after its ERROR line
+            self._errors.append(line)
+        else:
+            self._is_error = line.startswith("ERROR:")
+            if self._is_error:
+                self._errors.append(line)
+        if not self.is_condense:
+            self._write(line)
+        else:
+            self._condense(line)
+        if len(self._chunk) >= self.frame_lines:
+            self._write_frame()
+
+    def _condense(self, line):
+        match = RUNNING_TASK_PATTERN.match(line)
+        if match is not None:
+            self._task = (match.group(1) or "", match.group(2), match.group(3))
+        else:
+            match = RECIPE_TASK_PATTERN.match(line)
+            if match is not None:
+                key = f"{match.group(1)}:{match.group(2)}"
+                if match.group(3) == "Started":
+                    self._running[key] = True
+                else:
+                    self._running.pop(key, None)
+            elif line.startswith(SHOWN_PREFIXES):
+                self._write(line)
+        if time.time() - self._last_progress >= self.progress_interval:
+            self._write_progress()
+            self._write_frame()
+
+    def _write_progress(self):
+        self._last_progress = time.time()
+        if self._task is None:
+            return
+        setscene, num, total = self._task
+        running = list(self._running)
+        recipes = ", ".join(running[:SHOWN_RECIPES])
+        if len(running) > SHOWN_RECIPES:
+            recipes += f" and {len(running) - SHOWN_RECIPES} more"
+        self._write(f"{setscene}task {num}/{total} ({int(num) * 100 // max(int(total), 1)}%)"
+                    + (f", running: {recipes}" if recipes else ""))
+
+    def _write_frame(self):
+        if len(self._chunk) == 0:
+            return
+        self._frames.append([self.lines - len(self._chunk), self._file.tell()])
+        self._file.write(self._cctx.compress("".join(self._chunk).encode("utf-8")))
+        self._file.flush()
+        self._chunk = []
+
+    def close(self, is_faild = False):
+        '''
+        write the rest of the log and its index, a failed run shows the
+        error excerpt and the last lines of the output
+        '''
+        self._write_frame()
+        self._file.close()
+        self._file = None
+        try:
+            with open(self.log_path + INDEX_SUFFIX, 'w', encoding="utf-8") as w_f:
+                w_f.write(json.dumps({'lines': self.lines, 'frames': self._frames}))
+        except OSError as e_p:
+            print(f"[WARN]: write the index of {self.log_path} faild: {e_p}")
+        if not self.is_condense:
+            return
+        self._write_progress()
+        if is_faild:
+            if len(self._errors) > 0:
+                self._write("------------------------- errors -------------------------")
+                for line in self._errors:
+                    self._write(line)
+            self._write(f"---------------------- last {len(self._tail)} lines ----------------------")
+            for line in self._tail:
+                self._write(line)
+        self._write(f"the full log of {self.lines} lines: {self.log_path}")
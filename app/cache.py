@@ -0,0 +1,119 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import hashlib
+
+from app import util
+
+# the first line of every cached object, followed by its etag
+HEADER_PREFIX = b"objcache1 "
+
+class ObjectCache:
+    '''
+    A content-addressed cache on the local disk, every object is stored in a
+    file named by the hash of its key, so the concurrent jobs on the shared
+    directory never lock each other. The cache is bounded by size, the least
+    recently used objects are evicted first
+    '''
+    # check the size of the cache every evict_interval writes
+    evict_interval = 64
+
+    def __init__(self, cache_dir, max_size = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._put_count = 0
+
+    def _get_path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def get_with_etag(self, key):
+        '''
+        return the object of key and the etag stored with it, the object is
+        None if it is not cached and the etag None if it has none
+        '''
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as r_f:
+                data = r_f.read()
+            # the mtime marks the last use of the object for LRU eviction
+            os.utime(path)
+        except OSError:
+            return None, None
+        # the etag is the header line of the object, so that both are always
+        # replaced together and a reader never pairs a body with another etag
+        header, sep, body = data.partition(b"\n")
+        if sep == b"" or not header.startswith(HEADER_PREFIX):
+            return None, None
+        etag = header[len(HEADER_PREFIX):].decode('utf-8')
+        return body, etag or None
+
+    def get(self, key):
+        '''
+        return the object of key, or None if it is not cached
+        '''
+        return self.get_with_etag(key)[0]
+
+    def put(self, key, data, etag = None):
+        '''
+        store the object of key, an optional etag is kept for revalidation
+        '''
+        path = self._get_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{util.generate_random_str(8)}.tmp"
+            with open(tmp_path, 'wb') as w_f:
+                w_f.write(HEADER_PREFIX + (etag or "").encode('utf-8') + b"\n")
+                w_f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e_p:
+            print(f"[WARN]: write cache {path} faild: {e_p}")
+            return
+
+        if self._put_count % self.evict_interval == 0:
+            self.evict()
+        self._put_count = self._put_count + 1
+
+    def evict(self):
+        '''
+        remove the least recently used objects until the cache fits in max_size
+        '''
+        entries = []
+        total_size = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size = total_size + stat.st_size
+        if total_size <= self.max_size:
+            return
+        # evict down to 90% so the next writes do not trigger it at once
+        entries.sort()
+        target_size = self.max_size * 0.9
+        for _, size, path in entries:
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size = total_size - size
@@ -0,0 +1,269 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import json
+import mmap
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# the suffix of the checksum file written next to every file
+SUM_SUFFIX = ".sha256sum"
+# the checksum index of every directory, in the format of sha256sum
+SUMS_NAME = "SHA256SUMS"
+# the suffix of the checksum cache written next to a tree
+CACHE_SUFFIX = ".sha256cache.json"
+# the read size of the files hashed with read
+READ_SIZE = 8 * 1024 * 1024
+# the files of this size or more are hashed from a memory map
+MMAP_SIZE = 64 * 1024 * 1024
+# below this total size the files are hashed in the calling process, a
+# process pool costs more than it saves
+POOL_SIZE = 64 * 1024 * 1024
+
+def iter_files(top_dir):
+    '''
+    yield the path and stat of every file under top_dir, the checksum files
+    and caches are skipped so that signing a signed directory does not sign
+    them again
+    '''
+    stack = [top_dir]
+    while len(stack) > 0:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name != SUMS_NAME and \
+                        not entry.name.endswith((SUM_SUFFIX, CACHE_SUFFIX)):
+                    yield entry.path, entry.stat()
+
+def hash_file(path):
+    '''
+    return the sha256 hex digest of the file
+    '''
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as r_f:
+        size = os.fstat(r_f.fileno()).st_size
+        if size >= MMAP_SIZE:
+            # one update over the whole map, no copy into python buffers
+            with mmap.mmap(r_f.fileno(), 0, access=mmap.ACCESS_READ) as r_m:
+                sha256.update(r_m)
+            return sha256.hexdigest()
+        buffer = bytearray(min(max(size, 1), READ_SIZE))
+        view = memoryview(buffer)
+        while True:
+            count = r_f.readinto(buffer)
+            if not count:
+                break
+            sha256.update(view[:count])
+    return sha256.hexdigest()
+
+def hash_files(paths, sizes = None, workers = None):
+    '''
+    return the sha256 hex digests of the files in the order of paths, they
+    are spread over a process pool when there is enough data to hash
+    '''
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    total = sum(sizes) if sizes is not None else POOL_SIZE
+    if workers <= 1 or len(paths) <= 1 or total < POOL_SIZE:
+        return [hash_file(path) for path in paths]
+    # the workers come from a forkserver, forking this process could copy a
+    # lock held by one of its threads, e.g. the sftp uploaders
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)),
+                             mp_context=multiprocessing.get_context("forkserver")) as executor:
+        # small files go in batches so that they do not cost a round trip each
+        return list(executor.map(hash_file, paths, chunksize=max(1, len(paths) // (workers * 8))))
+
+def get_cache_path(top_dir):
+    '''
+    return the path of the checksum cache of the tree, it is a sidecar next
+    to the tree so that it is never uploaded or signed with it
+    '''
+    top_dir = os.path.abspath(top_dir)
+    return os.path.join(os.path.dirname(top_dir), f".{os.path.basename(top_dir)}{CACHE_SUFFIX}")
+
+class ChecksumCache:
+    '''
+    The sha256 of the files of a tree keyed by their device and inode, with
+    the size and mtime_ns they had when they were hashed. A file that still
+    has both is not read again, so a tree signed by one step costs the next
+    step a stat per file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._is_dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as r_f:
+                self.entries = json.loads(r_f.read()).get('entries') or {}
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    @staticmethod
+    def get_key(stat):
+        '''
+        return the cache key of the stat
+        '''
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def get(self, stat):
+        '''
+        return the cached sha256 of the file, None if it changed since
+        '''
+        entry = self.entries.get(self.get_key(stat))
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            return None
+        return entry[2]
+
+    def put(self, stat, digest):
+        '''
+        cache the sha256 of the file
+        '''
+        self.entries[self.get_key(stat)] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._is_dirty = True
+
+    def prune(self, keys):
+        '''
+        drop the entries of the files that are gone
+        '''
+        for key in set(self.entries) - set(keys):
+            del self.entries[key]
+            self._is_dirty = True
+
+    def save(self):
+        '''
+        write the cache if it changed, a failure only costs the next run time
+        '''
+        if not self._is_dirty:
+            return
+        try:
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as w_f:
+                w_f.write(json.dumps({'entries': self.entries}))
+            os.replace(self.path + ".tmp", self.path)
+            self._is_dirty = False
+        except OSError as e_p:
+            print(f"[WARN]: write checksum cache {self.path} faild: {e_p}")
+
+def _iter_parent_caches(top_dir):
+    # a tree inside a signed tree finds its files in the cache of that tree
+    parent_dir = os.path.dirname(os.path.abspath(top_dir))
+    while True:
+        cache_path = get_cache_path(parent_dir)
+        if os.path.exists(cache_path):
+            yield ChecksumCache(cache_path)
+        if os.path.dirname(parent_dir) == parent_dir:
+            return
+        parent_dir = os.path.dirname(parent_dir)
+
+def get_sums(top_dir, files, workers = None, is_prune = False):
+    '''
+    return the sha256 of the (path, stat) files of the tree keyed by path,
+    only the files that are new or changed since the last run are hashed.
+    With is_prune the files are the whole tree and the cache drops the rest
+    '''
+    cache = ChecksumCache(get_cache_path(top_dir))
+    parent_caches = None
+    sums = {}
+    missing = []
+    for path, stat in files:
+        digest = cache.get(stat)
+        if digest is None:
+            if parent_caches is None:
+                parent_caches = list(_iter_parent_caches(top_dir))
+            for parent_cache in parent_caches:
+                digest = parent_cache.get(stat)
+                if digest is not None:
+                    cache.put(stat, digest)
+                    break
+        if digest is None:
+            missing.append((path, stat))
+        else:
+            sums[path] = digest
+    digests = hash_files(
+        [path for path, _ in missing],
+        sizes=[stat.st_size for _, stat in missing],
+        workers=workers)
+    for (path, stat), digest in zip(missing, digests):
+        cache.put(stat, digest)
+        sums[path] = digest
+    if is_prune:
+        cache.prune([ChecksumCache.get_key(stat) for _, stat in files])
+    cache.save()
+    return sums
+
+def write_sum(path, digest):
+    '''
+    write the checksum file of the file, in the format "<sha256> <name>",
+    an existing one with the same content is left alone
+    '''
+    content = f"{digest} {os.path.basename(path)}"
+    try:
+        with open(f"{path}{SUM_SUFFIX}", 'r', encoding="utf-8") as r_f:
+            if r_f.read() == content:
+                return
+    except (OSError, ValueError):
+        pass
+    with open(f"{path}{SUM_SUFFIX}", 'w', encoding="utf-8") as w_f:
+        w_f.write(content)
+
+def is_sum_file(rel_path):
+    '''
+    return True if the file is a checksum file or a checksum index
+    '''
+    name = os.path.basename(rel_path)
+    return name.endswith(SUM_SUFFIX) or name == SUMS_NAME
+
+def get_sum_files(sums, is_index = True):
+    '''
+    return the content of the checksum file of every file and, with
+    is_index, of the index of every directory keyed by relative path, sums
+    is the sha256 of the files keyed by relative path
+    '''
+    sum_files = {}
+    dir_lines = {}
+    for rel_path, digest in sorted(sums.items()):
+        name = os.path.basename(rel_path)
+        sum_files[f"{rel_path}{SUM_SUFFIX}"] = f"{digest} {name}".encode()
+        dir_lines.setdefault(os.path.dirname(rel_path), []).append(f"{digest}  {name}\n")
+    for rel_dir, lines in dir_lines.items() if is_index else []:
+        sum_files[os.path.join(rel_dir, SUMS_NAME)] = "".join(lines).encode()
+    return sum_files
+
+def write_sum_files(top_dir, sum_files):
+    '''
+    write the checksum files of get_sum_files under top_dir, the ones with
+    the same content are left alone
+    '''
+    for rel_path, data in sum_files.items():
+        path = os.path.join(top_dir, rel_path)
+        try:
+            with open(path, 'rb') as r_f:
+                if r_f.read() == data:
+                    continue
+        except OSError:
+            pass
+        with open(path, 'wb') as w_f:
+            w_f.write(data)
+
+def add_sum_to_local_dir(local_dir, workers = None):
+    '''
+    write a checksum file next to every file in the directory, return the
+    sha256 of every file keyed by its path. The files that did not change
+    since the last run are not hashed again, see ChecksumCache
+    '''
+    files = list(iter_files(local_dir))
+    sums = get_sums(local_dir, files, workers=workers, is_prune=True)
+    for path, _ in files:
+        write_sum(path, sums[path])
+    return sums
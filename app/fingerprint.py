@@ -0,0 +1,142 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from app import util
+
+# the directory under the share dir that keeps the fingerprints of the boards
+FINGERPRINT_DIR = "board_fingerprints"
+
+def _git(repo_dir, *args):
+    result = subprocess.run(
+        ["git", "-C", repo_dir] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        encoding="utf-8",
+        check=False)
+    return result.returncode, result.stdout.strip()
+
+def get_git_head(repo_dir):
+    '''
+    return the HEAD commit of the repo, None if it is not a git repo
+    '''
+    if not os.path.isdir(os.path.join(repo_dir, ".git")):
+        return None
+    code, head = _git(repo_dir, "rev-parse", "HEAD")
+    if code != 0:
+        return None
+    return head
+
+def get_remote_head(repo_dir):
+    '''
+    return the commit the repo builds at next: the head of its branch on
+    the remote when it is on a branch, the next update moves it there, or
+    its HEAD when it is detached at a fixed version. None if the repo is
+    not a git repo or the remote can not be reached
+    '''
+    if not os.path.isdir(os.path.join(repo_dir, ".git")):
+        return None
+    code, branch = _git(repo_dir, "symbolic-ref", "-q", "--short", "HEAD")
+    if code != 0 or branch == "":
+        return get_git_head(repo_dir)
+    code, output = _git(repo_dir, "ls-remote", "origin", f"refs/heads/{branch}")
+    if code != 0 or output == "":
+        return None
+    return output.split()[0]
+
+def get_remote_revisions(src_dir, workers = 8):
+    '''
+    return the remote head of every git repo in the src dir of a workspace
+    keyed by its name, see get_remote_head, None if one of them is unknown
+    '''
+    if not os.path.isdir(src_dir):
+        return {}
+    names = [name for name in sorted(os.listdir(src_dir))
+             if os.path.isdir(os.path.join(src_dir, name, ".git"))]
+    # one round trip to the remote per repo, they go at once
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        heads = list(executor.map(get_remote_head, [os.path.join(src_dir, name) for name in names]))
+    if None in heads:
+        return None
+    return dict(zip(names, heads))
+
+def get_manifest_revisions(yocto_dir):
+    '''
+    return the version of every layer in the manifest of yocto-meta-openeuler
+    keyed by its name, empty if there is no manifest
+    '''
+    manifest_path = os.path.join(yocto_dir, '.oebuild/manifest.yaml')
+    if not os.path.exists(manifest_path):
+        return {}
+    manifest = util.parse_yaml(manifest_path).get('manifest_list') or {}
+    return {name: repo.get('version') for name, repo in manifest.items() if isinstance(repo, dict)}
+
+def get_fingerprint(inputs):
+    '''
+    return the sha256 of the inputs of a build, a dict that can be dumped
+    to json
+    '''
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+class FingerprintStore:
+    '''
+    The fingerprints of the inputs of the last successful build of every
+    board of a job and branch. A board whose inputs did not change since
+    is skipped, its sstate and its published output are still those of
+    that build
+    '''
+    def __init__(self, job, branch, share_dir = None):
+        if share_dir is None:
+            share_dir = os.path.join(tempfile.gettempdir(), f"embedded-ci-{os.getuid()}")
+        self.path = os.path.join(share_dir, FINGERPRINT_DIR, f"{job}_{branch}.json")
+        try:
+            with open(self.path, 'r', encoding="utf-8") as r_f:
+                self.entries = json.loads(r_f.read())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get_unchanged(self, board, fingerprint):
+        '''
+        return the entry of the last successful build of the board if its
+        fingerprint is the same, None otherwise
+        '''
+        entry = self.entries.get(board)
+        if isinstance(entry, dict) and entry.get('fingerprint') == fingerprint:
+            return entry
+        return None
+
+    def put(self, board, fingerprint):
+        '''
+        record the fingerprint of a successful build of the board
+        '''
+        self.entries[board] = {
+            'fingerprint': fingerprint,
+            'time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}
+
+    def save(self):
+        '''
+        write the fingerprints, a failure only costs the next run a rebuild
+        '''
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", 'w', encoding="utf-8") as w_f:
+                w_f.write(json.dumps(self.entries, indent=2, sort_keys=True))
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e_p:
+            print(f"[WARN]: write board fingerprints {self.path} faild: {e_p}")
@@ -16,7 +16,10 @@ import subprocess
 
 from app.build import Build,BuildRes,Arch,Board
 from app import util
+from app import trash
 from app.lib import Result
+from app.scheduler import BoardScheduler
+from app.sstate import SstateMetrics
 
 NATIVE_SDK_DIR= "/opt/buildtools/nativesdk"
 GCC_DIR = "/usr1/openeuler/gcc"
@@ -30,7 +33,7 @@ class Run(Build):
         # because oebuild_worksapce directory will be initialize by oebuild,
         # so if exists and delete it
         if os.path.exists(oebuild_workspace):
-            shutil.rmtree(oebuild_workspace)
+            trash.remove(oebuild_workspace)
 
         # execute oebuild init and move repo to oebuild_workspace's src directory
         os.chdir(param.workspace)
@@ -55,10 +58,14 @@ class Run(Build):
             gate_path = build_path_in_ci
         gate_conf = util.parse_yaml(gate_path)
 
-        arch_res = []
+        # the boards are generated one by one and built at once, see BoardScheduler
+        scheduler = BoardScheduler(
+            log_dir=os.path.join(oebuild_workspace, "logs"),
+            disk_dir=oebuild_workspace)
+        arch_jobs = []
         for arch in gate_conf['build_check']:
             toolchain_dir = os.path.join(GCC_DIR, arch['toolchain'])
-            board_res = []
+            jobs_start = len(scheduler.jobs)
             for board in arch['board']:
                 os.chdir(oebuild_workspace)
                 err_code, result = subprocess.getstatusoutput(f"oebuild generate\
@@ -95,36 +102,59 @@ class Run(Build):
                                 version = layer_repo['version'],
                                 depth = 1)
 
-                for image in board['image']:
-                    # run `oebuild bitbake openeuler-image`
-                    with subprocess.Popen(
-                                f"oebuild bitbake {image['name']}",
-                                shell=True,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,
-                                cwd=os.path.join(oebuild_workspace, 'build', board['directory']),
-                                encoding="utf-8") as s_p:
-                        last_line = ""
-                        for line in s_p.stderr:
-                            line = line.strip('\n')
-                            last_line = line
-                            print(line)
-                        for line in s_p.stdout:
-                            line = line.strip('\n')
-                            last_line = line
-                            print(line)
-                        s_p.wait()
+                scheduler.add(
+                    board['directory'], self._build_board, oebuild_workspace, board,
+                    param.branch, param.share_dir)
+            arch_jobs.append((arch['arch'], jobs_start, len(scheduler.jobs)))
 
-                        if last_line.find("returning a non-zero exit code.") != -1:
-                            build_res = Result().faild
-                        else:
-                            build_res = Result().success
-                        board_res.append(Board(name=f"{image['name']}({board['name']})", result=build_res))
-                # because tmp directory use large space so support a param to delete it
-                # when build finished
-                tmp_dir = os.path.join(oebuild_workspace, 'build', board['directory'], 'tmp')
-                if os.path.exists(tmp_dir):
-                    shutil.rmtree(tmp_dir)
-            arch_res.append(Arch(name=arch['arch'],boards=board_res))
+        jobs = scheduler.run()
+        arch_res = []
+        for arch_name, jobs_start, jobs_end in arch_jobs:
+            board_res = []
+            for job in jobs[jobs_start:jobs_end]:
+                board_res.extend(job.result)
+            arch_res.append(Arch(name=arch_name, boards=board_res))
 
         return BuildRes(archs=arch_res)
+
+    @staticmethod
+    def _build_board(job, oebuild_workspace, board, branch, share_dir):
+        build_dir = os.path.join(oebuild_workspace, 'build', board['directory'])
+        job.set_compile_threads(os.path.join(build_dir, 'compile.yaml'))
+        board_res = []
+        for image in board['image']:
+            metrics = SstateMetrics("gate", branch, board['directory'], image['name'])
+            # run `oebuild bitbake openeuler-image`
+            with subprocess.Popen(
+                        f"oebuild bitbake {image['name']}",
+                        shell=True,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        cwd=build_dir,
+                        encoding="utf-8") as s_p, job.open_build_log(image['name']) as build_log:
+                last_line = ""
+                for line in s_p.stderr:
+                    line = line.strip('\n')
+                    last_line = line
+                    metrics.feed(line)
+                    build_log.feed(line)
+                for line in s_p.stdout:
+                    line = line.strip('\n')
+                    last_line = line
+                    metrics.feed(line)
+                    build_log.feed(line)
+                s_p.wait()
+
+                if last_line.find("returning a non-zero exit code.") != -1:
+                    build_res = Result().faild
+                else:
+                    build_res = Result().success
+                build_log.close(build_res == Result().faild)
+                metrics.save(build_res == Result().success, share_dir)
+                board_res.append(Board(name=f"{image['name']}({board['name']})", result=build_res))
+        # because tmp directory use large space so support a param to delete it
+        # when build finished
+        tmp_dir = os.path.join(build_dir, 'tmp')
+        if os.path.exists(tmp_dir):
+            trash.remove(tmp_dir, is_sync=True)
+        return board_res
@@ -11,179 +11,356 @@ See the Mulan PSL v2 for more details.
 '''
 
 import os
+import re
+import json
 import time
-from app import util
-
-import requests
-try:
-    import jenkins
-except ImportError:
-    util.install_package('python-jenkins')
-    import jenkins
-
-try:
-    from paramiko import SSHClient, AutoAddPolicy, RSAKey, SSHException
-except ImportError:
-    util.install_package('paramiko')
-    from paramiko import SSHClient, AutoAddPolicy, RSAKey, SSHException
-
-
-class Gitee:
+import fcntl
+import random
+import shlex
+import hashlib
+import logging
+import threading
+import contextlib
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+
+from app import util, transfer, checksum
+from app.cache import ObjectCache
+
+log = logging.getLogger(__name__)
+
+# the directory under the share dir that caches the forge objects
+FORGE_CACHE_DIR = "forge_cache"
+# the directory under the share dir that keeps the rate limit state
+RATE_LIMIT_DIR = "forge_ratelimit"
+# the lowest pace in requests per second and the longest pause in seconds
+# the rate limiter falls to when the quota runs out
+MIN_RATE = 0.05
+MAX_PAUSE = 300
+
+# the responses with these status are retried with backoff
+RETRY_STATUS = [
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT]
+# the methods that can be sent again without side effects, the others, e.g.
+# a POST that adds a comment, are only sent again when the forge surely did
+# not handle them
+IDEMPOTENT_METHODS = ["GET", "HEAD", "PUT", "DELETE", "OPTIONS"]
+
+
+def _mask_token(url):
+    return re.sub(r"access_token=[^&]*", "access_token=***", url)
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
     '''
-    reencapsulate some of Gitee's interface to pull requests
+    A token bucket that paces the requests sent with one forge token once
+    the forge signals a limit, before that they are not held back. The
+    bucket holds the quota left by the X-RateLimit headers of the responses,
+    or refills rate per second after a 429 without them. Its state is kept in
+    a file under the share dir when given, so the concurrent jobs on the node
+    draw from the same bucket instead of failing one by one on 429
     '''
-
-    def __init__(self, owner, repo, token=None):
-        self._owner = owner
-        self._repo = repo
-        self._token = token
-        self._api_url_pre = "https://gitee.com/api/v5/repos"
-        self.request_ok_list = [
-            requests.codes['ok'],
-            requests.codes['created'],
-            requests.codes['no_content']]
-        self.request_timeout = 10
-
-    @property
-    def owner(self):
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(self, state_path = None, capacity = 30, rate = 10.0):
+        self.state_path = state_path
+        self.capacity = capacity
+        self.rate = rate
+        self._state = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, share_dir, key):
         '''
-        return param owner
-        '''
-        return self._owner
-
-    @property
-    def repo(self):
-        '''
-        return param repo
-        '''
-        return self._repo
-
-    @property
-    def token(self):
+        return the limiter of key, the forge clients with the same key share it
         '''
-        return param token
-        '''
-        return self._token
-
-    def get_pr_commits(self, pr_num):
-        '''
-        get pull request commits list
-        '''
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/commits"
-        if self._token is not None:
-            url = url + rf"?access_token={self._token}"
-        resp = requests.get(url=url, timeout=self.request_timeout)
-        if resp.status_code not in self.request_ok_list:
-            return None
-
-        return resp.content
-
-    def get_commits_files(self, pr_num):
-        """
-        get pull request commits with files
-        """
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/files"
-        if self._token is not None:
-            url = url + rf"?access_token={self._token}"
-        resp = requests.get(url=url, timeout=self.request_timeout)
-        if resp.status_code not in self.request_ok_list:
-            return None
-
-        return resp.content
+        digest = hashlib.sha256(str(key).encode()).hexdigest()[:16]
+        state_path = None
+        if share_dir is not None:
+            state_path = os.path.join(share_dir, RATE_LIMIT_DIR, f"{digest}.json")
+        limiter_key = state_path or digest
+        with cls._limiters_lock:
+            if limiter_key not in cls._limiters:
+                http_conf = util.get_common_conf().get('http') or {}
+                cls._limiters[limiter_key] = cls(
+                    state_path=state_path,
+                    capacity=int(http_conf.get('rate_capacity', 30)),
+                    rate=float(http_conf.get('rate', 10)))
+            return cls._limiters[limiter_key]
+
+    def _new_state(self):
+        return {
+            'tokens': float(self.capacity),
+            'capacity': float(self.capacity),
+            'rate': float(self.rate),
+            'updated': time.time(),
+            'blocked_until': 0.0,
+            'paced': False}
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        with self._lock:
+            if self.state_path is None:
+                if self._state is None:
+                    self._state = self._new_state()
+                yield self._state
+                return
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(self.state_path, 'a+', encoding='utf-8') as s_f:
+                fcntl.flock(s_f.fileno(), fcntl.LOCK_EX)
+                s_f.seek(0)
+                try:
+                    state = json.loads(s_f.read())
+                except ValueError:
+                    state = self._new_state()
+                yield state
+                s_f.seek(0)
+                s_f.truncate()
+                s_f.write(json.dumps(state))
+                s_f.flush()
 
-    def filter_delete_commit_files(self, commit_files):
-        """
-        filter the delete status files
-        """
-        filter_commit_files = []
-        for file in commit_files:
-            # if the file is delete, passed
-            if file['patch']['deleted_file']:
-                continue
-            filter_commit_files.append(file)
-        return filter_commit_files
-
-    def get_a_commit_info(self, commit_id):
-        """
-        get a commit info from repository
-        """
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/commits/{commit_id}"
-        if self._token is not None:
-            url = url + rf"?access_token={self._token}"
-        resp = requests.get(url=url, timeout=self.request_timeout)
-        if resp.status_code not in self.request_ok_list:
-            return None
-
-        return resp.content
+    @staticmethod
+    def _refill(state, now):
+        elapsed = max(now - state['updated'], 0)
+        state['tokens'] = min(state['capacity'], state['tokens'] + elapsed * state['rate'])
+        state['updated'] = now
 
-    def comment_pr(self, pr_num, comment):
+    def acquire(self):
         '''
-        add comment to pull request
+        take a token from the bucket, wait until there is one
         '''
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/comments"
-        data = {"access_token": self._token, "body": comment}
-
-        resp = requests.post(url=url, data=data, timeout=self.request_timeout)
-
-        if resp.status_code not in self.request_ok_list:
-            print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
-            return False
-        return True
-
-    def add_tags_of_pr(self, pr_num, *tags):
+        waited = 0
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                self._refill(state, now)
+                wait = state['blocked_until'] - now
+                if wait <= 0:
+                    if not state.get('paced', False):
+                        return waited
+                    if state['tokens'] >= 1:
+                        state['tokens'] = state['tokens'] - 1
+                        if waited > 0:
+                            log.debug("waited %.2fs for the forge rate limit", waited)
+                        return waited
+                    wait = (1 - state['tokens']) / state['rate']
+            # sleep in short steps, the other processes may update the bucket
+            wait = min(wait, 10)
+            time.sleep(wait)
+            waited = waited + wait
+
+    def update(self, resp):
         '''
-        add tags to pull request
+        adjust the bucket to the rate limit headers of the response
         '''
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/labels?access_token={self._token}"
-
-        resp = requests.post(url=url, json=list(tags), timeout=self.request_timeout)
-        if resp.status_code not in self.request_ok_list:
-            print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
-            return False
-        return True
-
-    def delete_tags_of_pr(self, pr_num, *tags):
+        limit = _to_float(resp.headers.get('X-RateLimit-Limit'))
+        remaining = _to_float(resp.headers.get('X-RateLimit-Remaining'))
+        reset = _to_float(resp.headers.get('X-RateLimit-Reset'))
+        is_limited = resp.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        if limit is None and remaining is None and not is_limited:
+            return
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            # the reset header is either an epoch time or the seconds left
+            reset_in = None
+            if reset is not None:
+                reset_in = reset - now if reset > 1e9 else reset
+            if limit is not None:
+                state['capacity'] = float(max(1, limit))
+            if remaining is not None:
+                # the bucket holds the quota the forge says is left, so the
+                # requests are only held back when it runs low
+                state['paced'] = True
+                state['capacity'] = max(state['capacity'], remaining)
+                state['tokens'] = remaining
+                if reset_in is not None and reset_in > 0:
+                    # spread what is left of the quota over the rest of the window
+                    state['rate'] = max(remaining / reset_in, MIN_RATE)
+                    if remaining < 1:
+                        # nothing is sent until the window resets with the full quota
+                        state['blocked_until'] = max(state['blocked_until'], now + reset_in)
+                        state['tokens'] = state['capacity']
+                else:
+                    state['rate'] = float(self.rate)
+            if is_limited:
+                state['paced'] = True
+                state['capacity'] = min(state['capacity'], float(self.capacity))
+                state['tokens'] = 0.0
+                retry_after = _to_float(resp.headers.get('Retry-After'))
+                pause = retry_after if retry_after is not None else (reset_in or 1)
+                state['blocked_until'] = max(state['blocked_until'], now + min(pause, MAX_PAUSE))
+
+
+class HttpSession:
+    '''
+    A pooled keep-alive http session shared by all forge clients in the process,
+    the 5xx and 429 responses and connection errors are retried with jittered
+    exponential backoff, the settings come from the http section of comm.yaml.
+    A request that is not idempotent is only retried on 429 and when the
+    connection could not be set up
+    '''
+    _instance = None
+
+    def __init__(self, pool_size = 10, max_retries = 3, backoff_factor = 0.5, max_backoff = 30):
+        requests = util.import_module('requests')
+        self._session = requests.Session()
+        self._adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=0)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._retry_exceptions = (requests.ConnectionError, requests.Timeout)
+        self._connect_timeout = requests.ConnectTimeout
+        self._new_connection_error = util.import_module('urllib3').exceptions.NewConnectionError
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def get_instance(cls):
         '''
-        delete tags to pull request
+        return the session shared in the process
         '''
-        name = ','.join(list(tags))
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/labels/{name}?access_token={self._token}"
-
-        resp = requests.delete(url=url, timeout=self.request_timeout)
-        if resp.status_code not in self.request_ok_list:
-            print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
-            return False
-        return True
+        if cls._instance is None:
+            http_conf = util.get_common_conf().get('http') or {}
+            cls._instance = cls(
+                pool_size=int(http_conf.get('pool_size', 10)),
+                max_retries=int(http_conf.get('max_retries', 3)),
+                backoff_factor=float(http_conf.get('backoff_factor', 0.5)),
+                max_backoff=float(http_conf.get('max_backoff', 30)))
+        return cls._instance
+
+    def _get_backoff(self, attempt, retry_after = None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        backoff = self.backoff_factor * (2 ** attempt)
+        # full jitter keeps the concurrent gate jobs from retrying in lockstep
+        return random.uniform(0, min(backoff, self.max_backoff))
+
+    def _is_not_sent(self, error):
+        # the request never left when the connection could not be set up
+        if isinstance(error, self._connect_timeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if len(error.args) > 0 else None
+        return isinstance(reason, self._new_connection_error)
+
+    def _is_retryable(self, method, error = None, status = None):
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        if error is not None:
+            return self._is_not_sent(error)
+        return status == HTTPStatus.TOO_MANY_REQUESTS
+
+    def _count_connections(self):
+        # the connections opened so far, a growing count means the request
+        # had to set up a new tcp and tls connection
+        try:
+            pools = self._adapter.poolmanager.pools
+            return sum(pools[key].num_connections for key in pools.keys())
+        except (AttributeError, KeyError):
+            return 0
 
-    def add_issue_to_repo(self, title, body):
+    def request(self, method, url, limiter:RateLimiter = None, **kwargs):
         '''
-        add issue to repo
+        send a request through the pooled session and retry it if needed,
+        every attempt is paced by the limiter if given
         '''
-        url = rf"{self._api_url_pre}/{self._owner}/issues"
-        data = {"access_token": self._token, "repo": self._repo,"title":title, "body": body}
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            conn_count = self._count_connections()
+            start = time.perf_counter()
+            try:
+                resp = self._session.request(method, url, **kwargs)
+            except self._retry_exceptions as e_p:
+                if attempt >= self.max_retries or not self._is_retryable(method, error=e_p):
+                    raise
+                backoff = self._get_backoff(attempt)
+                log.debug("%s %s faild: %s, retry in %.2fs", method, _mask_token(url), e_p, backoff)
+                time.sleep(backoff)
+                attempt = attempt + 1
+                continue
+            cost = (time.perf_counter() - start) * 1000
+            is_new_conn = self._count_connections() > conn_count
+            log.debug("%s %s -> %s, total %.1fms, headers after %.1fms, %s connection",
+                      method,
+                      _mask_token(url),
+                      resp.status_code,
+                      cost,
+                      resp.elapsed.total_seconds() * 1000,
+                      "new" if is_new_conn else "reused")
+            if limiter is not None:
+                limiter.update(resp)
+            if resp.status_code in RETRY_STATUS and attempt < self.max_retries and \
+                    self._is_retryable(method, status=resp.status_code):
+                backoff = self._get_backoff(attempt, resp.headers.get('Retry-After'))
+                log.debug("%s %s -> %s, retry in %.2fs",
+                          method, _mask_token(url), resp.status_code, backoff)
+                resp.close()
+                time.sleep(backoff)
+                attempt = attempt + 1
+                continue
+            return resp
 
-        resp = requests.post(url=url, data=data, timeout=self.request_timeout)
 
-        if resp.status_code not in self.request_ok_list:
-            print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
-            return False
-        return True
-
-class Gitcode:
+class Forge:
     '''
-    reencapsulate some of Gitcode's interface to pull requests
+    reencapsulate the pull request interfaces which are common to the gitee-like
+    forges, the sub class gives the api url of the forge
     '''
-
-    def __init__(self, owner, repo, token=None):
+    api_url_pre = None
+    # the environment variable that overrides api_url_pre, e.g. to point the
+    # client to the local forge stub of the benchmark
+    api_url_env = None
+    # the extra query params when getting a commit info
+    commit_info_params = {}
+
+    def __init__(self, owner, repo, token=None, share_dir=None):
         self._owner = owner
         self._repo = repo
         self._token = token
-        self._api_url_pre = "https://api.gitcode.com/api/v5/repos"
+        self._api_url_pre = self.api_url_pre
+        if self.api_url_env is not None and os.environ.get(self.api_url_env):
+            self._api_url_pre = os.environ[self.api_url_env].rstrip('/')
+        self._http = HttpSession.get_instance()
+        # the requests with the same token are paced together
+        self._limiter = RateLimiter.get_instance(
+            share_dir=share_dir,
+            key=f"{self._api_url_pre}|{token}")
+        # the status of the last mutation, the outbox drops the ones the
+        # forge rejects for good instead of retrying them
+        self.last_status = None
         self.request_ok_list = [
-            requests.codes['ok'],
-            requests.codes['created'],
-            requests.codes['no_content']]
-        self.request_timeout = 10
+            HTTPStatus.OK,
+            HTTPStatus.CREATED,
+            HTTPStatus.NO_CONTENT]
+        http_conf = util.get_common_conf().get('http') or {}
+        self.request_timeout = int(http_conf.get('timeout', 10))
+        # the objects fetched from the forge are cached under the share dir
+        # so that the retriggered jobs do not download them again
+        self._cache = None
+        if share_dir is not None:
+            self._cache = ObjectCache(
+                cache_dir=os.path.join(share_dir, FORGE_CACHE_DIR),
+                max_size=int(http_conf.get('cache_size', 512)) * 1024 * 1024)
 
     @property
     def owner(self):
@@ -206,31 +383,87 @@ class Gitcode:
         '''
         return self._token
 
-    def get_pr_commits(self, pr_num):
+    def _request(self, method, url, **kwargs):
+        return self._http.request(
+            method, url, limiter=self._limiter, timeout=self.request_timeout, **kwargs)
+
+    def _get_params(self, **params):
+        if self._token is not None:
+            params['access_token'] = self._token
+        return params
+
+    def _get_revalidated(self, url, **params):
         '''
-        get pull request commits list
+        get a mutable object, the cached copy is revalidated with its etag
+        and reused when the forge answers 304 not modified
         '''
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/commits"
-        if self._token is not None:
-            url = url + rf"?access_token={self._token}"
-        resp = requests.get(url=url, timeout=self.request_timeout)
+        key = f"{url}?{sorted(params.items())}"
+        headers = {}
+        content, etag = None, None
+        if self._cache is not None:
+            # the object and its etag are read at once, a 304 answers for this copy
+            content, etag = self._cache.get_with_etag(key)
+            if content is not None and etag is not None:
+                headers['If-None-Match'] = etag
+        resp = self._request("GET", url, params=self._get_params(**params), headers=headers)
+        if resp.status_code == HTTPStatus.NOT_MODIFIED and 'If-None-Match' in headers:
+            return content
         if resp.status_code not in self.request_ok_list:
             return None
-
+        if self._cache is not None and resp.headers.get('ETag') is not None:
+            self._cache.put(key, resp.content, etag=resp.headers['ETag'])
         return resp.content
 
+    def get_pr_commits(self, pr_num):
+        '''
+        get pull request commits list
+        '''
+        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/commits"
+        return self._get_revalidated(url)
+
     def get_commits_files(self, pr_num):
         """
         get pull request commits with files
         """
         url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/files"
-        if self._token is not None:
-            url = url + rf"?access_token={self._token}"
-        resp = requests.get(url=url, timeout=self.request_timeout)
-        if resp.status_code not in self.request_ok_list:
-            return None
+        return self._get_revalidated(url)
 
-        return resp.content
+    def _get_pages(self, url, per_page):
+        '''
+        return the items of a paginated list, the pages are fetched until one
+        is not full, every caller needs the whole list
+        '''
+        items = []
+        page = 1
+        pre_content = None
+        while True:
+            content = self._get_revalidated(url, page=page, per_page=per_page)
+            if content is None:
+                raise ValueError(f"get page {page} of {url} faild")
+            # some endpoints ignore the page param and return the same list
+            if content == pre_content:
+                break
+            page_items = json.loads(content)
+            items.extend(page_items)
+            if len(page_items) < per_page:
+                break
+            page = page + 1
+            pre_content = content
+        return items
+
+    def list_pr_commits(self, pr_num, per_page = 100):
+        '''
+        return all commits of pull request, following the pagination
+        '''
+        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/commits"
+        return self._get_pages(url, per_page)
+
+    def list_pr_files(self, pr_num, per_page = 100):
+        '''
+        return all changed files of pull request, following the pagination
+        '''
+        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/files"
+        return self._get_pages(url, per_page)
 
     def filter_delete_commit_files(self, commit_files):
         """
@@ -248,16 +481,38 @@ class Gitcode:
         """
         get a commit info from repository
         """
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/commits/{commit_id}?show_diff=true"
-        if self._token is not None:
-            url = url + rf"&access_token={self._token}"
+        # the info of a full commit sha never changes, so it is cached forever
+        # while a branch or tag name has to be fetched every time
+        key = None
+        if self._cache is not None and re.fullmatch(r"[0-9a-f]{40}", str(commit_id)):
+            key = f"{self._owner}/{self._repo}/commits/{commit_id}?{sorted(self.commit_info_params.items())}"
+            content = self._cache.get(key)
+            if content is not None:
+                return content
 
-        resp = requests.get(url=url, timeout=self.request_timeout)
+        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/commits/{commit_id}"
+        resp = self._request("GET", url, params=self._get_params(**self.commit_info_params))
         if resp.status_code not in self.request_ok_list:
             return None
 
+        if key is not None:
+            self._cache.put(key, resp.content)
         return resp.content
 
+    def get_commits_info(self, commit_ids, max_workers = None):
+        """
+        get the info of many commits concurrently, the results keep the order
+        of commit_ids, the concurrency is bounded by the http pool size
+        """
+        commit_ids = list(commit_ids)
+        if max_workers is None:
+            max_workers = self._http.pool_size
+        max_workers = max(1, min(max_workers, len(commit_ids)))
+        if max_workers == 1:
+            return [self.get_a_commit_info(commit_id) for commit_id in commit_ids]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.get_a_commit_info, commit_ids))
+
     def comment_pr(self, pr_num, comment):
         '''
         add comment to pull request
@@ -265,8 +520,9 @@ class Gitcode:
         url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/comments"
         data = {"access_token": self._token, "body": comment}
 
-        resp = requests.post(url=url, data=data, timeout=self.request_timeout)
+        resp = self._request("POST", url, data=data)
 
+        self.last_status = resp.status_code
         if resp.status_code not in self.request_ok_list:
             print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
             return False
@@ -276,9 +532,10 @@ class Gitcode:
         '''
         add tags to pull request
         '''
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/labels?access_token={self._token}"
+        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/labels"
 
-        resp = requests.post(url=url, json=list(tags), timeout=self.request_timeout)
+        resp = self._request("POST", url, params=self._get_params(), json=list(tags))
+        self.last_status = resp.status_code
         if resp.status_code not in self.request_ok_list:
             print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
             return False
@@ -289,9 +546,10 @@ class Gitcode:
         delete tags to pull request
         '''
         name = ','.join(list(tags))
-        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/labels/{name}?access_token={self._token}"
+        url = rf"{self._api_url_pre}/{self._owner}/{self._repo}/pulls/{pr_num}/labels/{name}"
 
-        resp = requests.delete(url=url, timeout=self.request_timeout)
+        resp = self._request("DELETE", url, params=self._get_params())
+        self.last_status = resp.status_code
         if resp.status_code not in self.request_ok_list:
             print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
             return False
@@ -304,18 +562,35 @@ class Gitcode:
         url = rf"{self._api_url_pre}/{self._owner}/issues"
         data = {"access_token": self._token, "repo": self._repo,"title":title, "body": body}
 
-        resp = requests.post(url=url, data=data, timeout=self.request_timeout)
+        resp = self._request("POST", url, data=data)
 
+        self.last_status = resp.status_code
         if resp.status_code not in self.request_ok_list:
             print(f"status_code: {resp.status_code}, content: {resp.content.decode()}")
             return False
         return True
 
+class Gitee(Forge):
+    '''
+    reencapsulate some of Gitee's interface to pull requests
+    '''
+    api_url_pre = "https://gitee.com/api/v5/repos"
+    api_url_env = "EMBEDDED_CI_GITEE_API"
+
+class Gitcode(Forge):
+    '''
+    reencapsulate some of Gitcode's interface to pull requests
+    '''
+    api_url_pre = "https://api.gitcode.com/api/v5/repos"
+    api_url_env = "EMBEDDED_CI_GITCODE_API"
+    commit_info_params = {"show_diff": "true"}
+
 class Jenkins:
     '''
     a simple Jenkins class with built-in interfaces with high demand frequency
     '''
     def __init__(self, jenkins_user, jenkins_token):
+        jenkins = util.import_module('jenkins', 'python-jenkins')
         comm_conf = util.get_common_conf()
         jenkins_conf = comm_conf['jenkins']
         base_url = jenkins_conf['base_url']
@@ -344,16 +619,28 @@ class Remote:
     '''
     A simple Remote class that mainly implements the function of file upload
     '''
-    def __init__(self, remote_ip, remote_port, remote_user, remote_pwd, remote_key):
+    def __init__(self, remote_ip, remote_port = 22, remote_user = None, remote_pwd = None, remote_key = None):
         self.remote_ip = remote_ip
-        self.remote_port = remote_port
+        self.remote_port = int(remote_port) if remote_port is not None else 22
         self.remote_user = remote_user
         self.remote_pwd = remote_pwd
         self.remote_key = remote_key
-
-    def _get_ssh_client(self):
-        ssh_cli = SSHClient()
-        ssh_cli.set_missing_host_key_policy(AutoAddPolicy)
+        remote_conf = util.get_common_conf().get('remote') or {}
+        self.connections = int(remote_conf.get('connections', 4))
+        self.window_size = int(remote_conf.get('window_size', 64)) * 1024 * 1024
+        self.block_size = int(remote_conf.get('block_size', 4)) * 1024 * 1024
+        self.zstd_level = int(remote_conf.get('zstd_level', 3))
+        self.chunk_size = int(remote_conf.get('chunk_size', 64)) * 1024 * 1024
+        self.retries = int(remote_conf.get('retries', 3))
+        self.keep_publications = int(remote_conf.get('keep_publications', 7))
+
+    def get_ssh_client(self):
+        '''
+        open a ssh connection and a sftp channel with a large window on it
+        '''
+        paramiko = util.import_module('paramiko')
+        ssh_cli = paramiko.SSHClient()
+        ssh_cli.set_missing_host_key_policy(paramiko.AutoAddPolicy)
         try:
             if self.remote_key is None:
                 ssh_cli.connect(
@@ -362,7 +649,7 @@ class Remote:
                     username = self.remote_user,
                     password = self.remote_pwd)
             else:
-                pri_key = RSAKey.from_private_key_file(self.remote_key)
+                pri_key = paramiko.RSAKey.from_private_key_file(self.remote_key)
                 # 打印连接参数
                 print(f"Connecting to {self.remote_ip}:{self.remote_port} as user {self.remote_user}")
                 ssh_cli.connect(
@@ -371,77 +658,382 @@ class Remote:
                     username = self.remote_user,
                     pkey=pri_key)
 
-            sftp_cli = ssh_cli.open_sftp()
+            sftp_cli = paramiko.SFTPClient.from_transport(
+                ssh_cli.get_transport(),
+                window_size=self.window_size)
             return ssh_cli, sftp_cli
-        except SSHException:
+        except paramiko.SSHException:
             print("ssh init faild")
         return None, None
 
-    def _get_files_from_dir(self, local_dir):
+    @staticmethod
+    def exec_command(ssh_cli, command):
+        '''
+        run command on the remote and wait for it, return the exit code and output
+        '''
+        _, stdout, stderr = ssh_cli.exec_command(command)
+        output = stdout.read().decode(errors="replace")
+        err_output = stderr.read().decode(errors="replace")
+        code = stdout.channel.recv_exit_status()
+        if code != 0:
+            print(f"remote command faild: {command[:200]}\n{err_output}")
+        return code, output
+
+    def make_dirs(self, ssh_cli, dirs):
+        '''
+        create all the remote directories in as few commands as possible
+        '''
+        for batch in transfer.quote_paths(sorted(set(dirs))):
+            self.exec_command(ssh_cli, "mkdir -p " + " ".join(batch))
+
+    def _clear_dst(self, ssh_cli, dst_dir):
+        dst_arg = shlex.quote(dst_dir.rstrip('/'))
+        self.exec_command(ssh_cli, f"rm -rf {dst_arg}/* && mkdir -p {dst_arg}")
+
+    def _get_files_from_dir(self, local_dir, is_sign = False):
+        # the checksum files of a signed upload are written after it
         all_files = []
-        files = os.listdir(local_dir)
-        for file_name in files:
-            file_path = os.path.join(local_dir, file_name)
-            if os.path.isdir(file_path):
-                all_files.extend(self._get_files_from_dir(local_dir = file_path))
-            else:
-                all_files.append(file_path)
+        with os.scandir(local_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    all_files.extend(self._get_files_from_dir(local_dir = entry.path, is_sign = is_sign))
+                elif not is_sign or not checksum.is_sum_file(entry.name):
+                    all_files.append(entry.path)
         return all_files
 
-    def put_to_remote(self, local_dir, dst_dir, is_delete_dst=False):
+    def _sign(self, ssh_cli, local_dir, dst_dir, sums, is_index=True):
+        # the .sha256sum of every file and the SHA256SUMS of every directory,
+        # written locally and sent to the remote as one tar stream
+        sum_files = checksum.get_sum_files(sums, is_index)
+        checksum.write_sum_files(local_dir, sum_files)
+        streamer = transfer.TarStreamer(
+            ssh_cli=ssh_cli,
+            window_size=self.window_size,
+            block_size=self.block_size)
+        error = streamer.put_members(dst_dir, sorted(sum_files.items()))
+        if error is not None:
+            print(f"put checksum files to {dst_dir} faild: {error}")
+            return False
+        print(f"signed {len(sums)} files under {dst_dir}")
+        return True
+
+    @staticmethod
+    def _get_report_sums(local_dir, report:transfer.TransferReport):
+        return {os.path.relpath(stat.local_path, local_dir): stat.sha256
+                for stat in report.files if stat.error is None and stat.sha256 is not None}
+
+    def _upload(self, ssh_cli, jobs):
+        self.make_dirs(ssh_cli, [os.path.dirname(remote_path) for _, remote_path in jobs])
+        uploader = transfer.SftpUploader(
+            remote=self,
+            connections=self.connections,
+            block_size=self.block_size,
+            chunk_size=self.chunk_size,
+            retries=self.retries)
+        report = uploader.upload(jobs)
+        report.print_summary()
+        return report
+
+    def _put_stream(self, ssh_cli, local_dir, dst_dir, rel_paths, is_zstd):
+        if is_zstd and self.exec_command(ssh_cli, "command -v zstd >/dev/null")[0] != 0:
+            print("zstd is not found on the remote, the tar stream is not compressed")
+            is_zstd = False
+        streamer = transfer.TarStreamer(
+            ssh_cli=ssh_cli,
+            window_size=self.window_size,
+            block_size=self.block_size,
+            is_zstd=is_zstd,
+            zstd_level=self.zstd_level)
+        report = streamer.stream(local_dir, rel_paths, dst_dir)
+        report.print_summary()
+        return report
+
+    def _list_remote_files(self, ssh_cli, dst_dir):
+        # the path and size of every file under dst_dir, in one round trip
+        code, output = self.exec_command(
+            ssh_cli,
+            f"find {shlex.quote(dst_dir)} -type f -printf '%P\\t%s\\n' 2>/dev/null || true")
+        remote_sizes = {}
+        if code != 0:
+            return remote_sizes
+        for line in output.splitlines():
+            rel_path, _, size = line.rpartition('\t')
+            if rel_path:
+                remote_sizes[rel_path] = int(size)
+        return remote_sizes
+
+    @staticmethod
+    def _read_manifest(sftp_cli, dst_dir):
+        try:
+            with sftp_cli.open(os.path.join(dst_dir, transfer.MANIFEST_NAME), 'rb') as r_f:
+                return transfer.Manifest.loads(r_f.read())
+        except IOError:
+            return transfer.Manifest()
+
+    @staticmethod
+    def _write_manifest(sftp_cli, dst_dir, manifest:transfer.Manifest):
+        manifest_path = os.path.join(dst_dir, transfer.MANIFEST_NAME)
+        with sftp_cli.open(manifest_path + ".tmp", 'wb') as w_f:
+            w_f.write(manifest.dumps().encode())
+        sftp_cli.posix_rename(manifest_path + ".tmp", manifest_path)
+
+    def get_manifest(self, dst_dir):
         '''
-        put local directory to destination
+        return the manifest of a directory put in delta mode or published,
+        an empty one if there is none, None if the connection faild
         '''
-        ssh_cli, sftp_cli = self._get_ssh_client()
+        ssh_cli, sftp_cli = self.get_ssh_client()
+        if ssh_cli is None:
+            return None
+        try:
+            return self._read_manifest(sftp_cli, dst_dir)
+        finally:
+            sftp_cli.close()
+            ssh_cli.close()
+
+    def _prune(self, ssh_cli, dst_dir, rel_paths):
+        paths = [os.path.join(dst_dir, rel_path) for rel_path in rel_paths]
+        for batch in transfer.quote_paths(paths):
+            self.exec_command(ssh_cli, "rm -f " + " ".join(batch))
+        self.exec_command(
+            ssh_cli,
+            f"find {shlex.quote(dst_dir)} -mindepth 1 -type d -empty -delete")
+        print(f"pruned {len(paths)} obsolete files under {dst_dir}")
+
+    def _put_delta(self, ssh_cli, sftp_cli, local_dir, dst_dir, all_files, is_delete_dst,
+                   is_stream=False, is_zstd=False, is_sign=False):
+        local_manifest = transfer.Manifest.from_local(local_dir, all_files)
+        remote_manifest = self._read_manifest(sftp_cli, dst_dir)
+        # the remote is only listed to find the files to prune, the manifest
+        # is trusted for what is there otherwise
+        remote_sizes = self._list_remote_files(ssh_cli, dst_dir) if is_delete_dst else None
+        changed = local_manifest.get_changed(remote_manifest, remote_sizes)
+        print(f"delta upload: {len(changed)} of {len(all_files)} files changed")
+
+        self.make_dirs(ssh_cli, [dst_dir])
+        if len(changed) > 0:
+            # the changed files leave the remote manifest first, so an aborted
+            # upload never leaves a broken file that the manifest vouches for
+            for rel_path in changed:
+                remote_manifest.files.pop(rel_path, None)
+            self._write_manifest(sftp_cli, dst_dir, remote_manifest)
+        if is_stream:
+            report = self._put_stream(ssh_cli, local_dir, dst_dir, changed, is_zstd)
+        else:
+            report = self._upload(
+                ssh_cli,
+                [(os.path.join(local_dir, rel_path), os.path.join(dst_dir, rel_path)) for rel_path in changed])
+        for stat in report.failed:
+            local_manifest.files.pop(os.path.relpath(stat.local_path, local_dir), None)
         if is_delete_dst:
-            ssh_cli.exec_command(f"rm -rf {dst_dir}/*")
-            ssh_cli.exec_command(f"mkdir -p {dst_dir}")
-        os.chdir(local_dir)
-        all_files = self._get_files_from_dir(local_dir=local_dir)
-        print(all_files)
-
-        for file_path in all_files:
-            remote_dir = os.path.dirname(file_path)
-            remote_dir = os.path.relpath(remote_dir, local_dir)
-            dst_remote_dir = os.path.join(dst_dir, remote_dir)
-            ssh_cli.exec_command(f"mkdir -p {dst_remote_dir}")
-            remote_file = os.path.join(dst_remote_dir, os.path.basename(file_path))
-            try:
-                print(file_path)
-                sftp_cli.put(file_path, remote_file)
-                time.sleep(0.1)
-                print(f"dst_file: {remote_file} successful")
-            except FileNotFoundError:
-                print(f"local_file: {file_path} not exists")
-            except IOError:
-                print(f"file put faild: {file_path}")
-
-        sftp_cli.close()
-        ssh_cli.close()
+            # the files that failed stay for the next upload to replace, and
+            # the partial files for the next upload to resume
+            local_paths = {os.path.relpath(path, local_dir) for path in all_files}
+            local_dirs = {os.path.dirname(rel_path) for rel_path in local_paths}
+            obsolete = [rel_path for rel_path in remote_sizes
+                        if rel_path not in local_paths
+                        and rel_path != transfer.MANIFEST_NAME
+                        and not transfer.is_partial_path(rel_path)
+                        and not (is_sign and self._is_sum_of(rel_path, local_paths, local_dirs))]
+            if len(obsolete) > 0:
+                self._prune(ssh_cli, dst_dir, obsolete)
+        else:
+            # the files that are only on the remote are kept in the manifest
+            for rel_path, info in remote_manifest.files.items():
+                local_manifest.files.setdefault(rel_path, info)
+        if is_sign:
+            local_paths = {os.path.relpath(path, local_dir) for path in all_files}
+            self._sign(ssh_cli, local_dir, dst_dir, {
+                rel_path: info['sha256'] for rel_path, info in local_manifest.files.items()
+                if rel_path in local_paths})
+        self._write_manifest(sftp_cli, dst_dir, local_manifest)
+        return report
 
-    def put_file_to_remote(self, local_path, dst_dir, is_delete_dst=False):
+    @staticmethod
+    def _is_sum_of(rel_path, local_paths, local_dirs):
+        # the checksum files of the local files are not obsolete
+        if os.path.basename(rel_path) == checksum.SUMS_NAME:
+            return os.path.dirname(rel_path) in local_dirs
+        return rel_path.endswith(checksum.SUM_SUFFIX) \
+            and rel_path[:-len(checksum.SUM_SUFFIX)] in local_paths
+
+    def put_to_remote(self, local_dir, dst_dir, is_delete_dst=False, is_delta=False,
+                      is_stream=False, is_zstd=False, is_sign=False):
         '''
-        put local directory to destination
+        put local directory to destination, the files are uploaded over
+        several connections at once, return the transfer report. In delta
+        mode only the files that differ from the remote manifest are uploaded,
+        and with is_delete_dst the remote files that are not in local_dir are
+        pruned after the upload instead of clearing dst_dir before it. In
+        stream mode the files are sent as one tar stream, zstd compressed
+        with is_zstd, which suits trees of many small files. With is_sign
+        the checksum files are made from the data sent, see _sign
         '''
-        ssh_cli, sftp_cli = self._get_ssh_client()
-        if is_delete_dst:
-            ssh_cli.exec_command(f"rm -rf {dst_dir}/*")
-            ssh_cli.exec_command(f"mkdir -p {dst_dir}")
+        local_dir = os.path.abspath(local_dir)
+        ssh_cli, sftp_cli = self.get_ssh_client()
+        if ssh_cli is None:
+            return None
+        try:
+            all_files = self._get_files_from_dir(local_dir=local_dir, is_sign=is_sign)
+            if is_delta:
+                return self._put_delta(
+                    ssh_cli, sftp_cli, local_dir, dst_dir, all_files, is_delete_dst,
+                    is_stream, is_zstd, is_sign)
+            if is_delete_dst:
+                self._clear_dst(ssh_cli, dst_dir)
+            if is_stream:
+                report = self._put_stream(
+                    ssh_cli,
+                    local_dir,
+                    dst_dir,
+                    [os.path.relpath(file_path, local_dir) for file_path in all_files],
+                    is_zstd)
+            else:
+                jobs = []
+                for file_path in all_files:
+                    rel_path = os.path.relpath(file_path, local_dir)
+                    jobs.append((file_path, os.path.join(dst_dir, rel_path)))
+                report = self._upload(ssh_cli, jobs)
+            if is_sign:
+                self._sign(ssh_cli, local_dir, dst_dir, self._get_report_sums(local_dir, report))
+            return report
+        finally:
+            sftp_cli.close()
+            ssh_cli.close()
 
-        ssh_cli.exec_command(f"mkdir -p {dst_dir}")
-        remote_file = os.path.join(dst_dir, os.path.basename(local_path))
+    @staticmethod
+    def _get_latest(sftp_cli, dst_dir):
         try:
-            print(local_path)
-            sftp_cli.put(local_path, remote_file)
-            time.sleep(0.1)
-            print(f"dst_file: {remote_file} successful")
-        except FileNotFoundError:
-            print(f"local_file: {local_path} not exists")
+            return os.path.basename(sftp_cli.readlink(os.path.join(dst_dir, transfer.LATEST_NAME)))
         except IOError:
-            print(f"file put faild: {local_path}")
+            return None
+
+    def _link_files(self, ssh_cli, sftp_cli, src_dir, dst_dir, rel_paths):
+        # one script of mkdir and ln lines instead of a command per file
+        lines = [f"mkdir -p {shlex.quote(os.path.join(dst_dir, rel_dir))}"
+                 for rel_dir in sorted({os.path.dirname(rel_path) for rel_path in rel_paths})]
+        for rel_path in rel_paths:
+            lines.append(f"ln -- {shlex.quote(os.path.join(src_dir, rel_path))} "
+                         f"{shlex.quote(os.path.join(dst_dir, rel_path))}")
+        script_path = dst_dir.rstrip('/') + ".link.sh"
+        with sftp_cli.open(script_path, 'wb') as w_f:
+            w_f.write(("set -e\n" + "\n".join(lines) + "\n").encode())
+        code, _ = self.exec_command(
+            ssh_cli,
+            f"sh {shlex.quote(script_path)}; code=$?; rm -f {shlex.quote(script_path)}; exit $code")
+        return code == 0
+
+    def _expire_publications(self, ssh_cli, dst_dir, names, latest):
+        publications = sorted(name for name in names if transfer.PUBLICATION_PATTERN.fullmatch(name))
+        expired = [os.path.join(dst_dir, name) for name in publications[:-self.keep_publications]
+                   if name != latest] if self.keep_publications > 0 else []
+        for batch in transfer.quote_paths(expired):
+            self.exec_command(ssh_cli, "rm -rf " + " ".join(batch))
+        if len(expired) > 0:
+            print(f"expired {len(expired)} old publications under {dst_dir}")
+
+    def _publish(self, ssh_cli, sftp_cli, local_dir, dst_dir, is_stream, is_zstd, is_sign):
+        all_files = self._get_files_from_dir(local_dir=local_dir, is_sign=is_sign)
+        local_manifest = transfer.Manifest.from_local(local_dir, all_files)
+        self.make_dirs(ssh_cli, [dst_dir])
+        names = sftp_cli.listdir(dst_dir)
+        latest = self._get_latest(sftp_cli, dst_dir)
+
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if stamp in names:
+            stamp = f"{stamp}-{sum(1 for name in names if name.startswith(stamp))}"
+        # the staging directories of aborted runs are never published
+        stale = [os.path.join(dst_dir, name) for name in names
+                 if name.startswith('.') and name.endswith(".staging")]
+        for batch in transfer.quote_paths(stale):
+            self.exec_command(ssh_cli, "rm -rf " + " ".join(batch))
+        staging_dir = os.path.join(dst_dir, f".{stamp}.staging")
+        self.make_dirs(ssh_cli, [staging_dir])
+
+        # the files that match the previous publication are hardlinked to it
+        linked = []
+        if latest is not None:
+            latest_dir = os.path.join(dst_dir, latest)
+            latest_manifest = self._read_manifest(sftp_cli, latest_dir)
+            diff = local_manifest.diff(latest_manifest)
+            # the subtrees with the same hash are not compared file by file
+            differ = set(diff.added) | set(diff.changed)
+            linked = [rel_path for rel_path in local_manifest.files if rel_path not in differ]
+            if len(linked) > 0 and not self._link_files(
+                    ssh_cli, sftp_cli, latest_dir, staging_dir, linked):
+                # an upload must never write into a linked file, so start over
+                self._clear_dst(ssh_cli, staging_dir)
+                linked = []
+        linked_set = set(linked)
+        changed = [rel_path for rel_path in local_manifest.files if rel_path not in linked_set]
+        print(f"publish {stamp}: {len(linked)} files linked to {latest}, "
+              f"{len(changed)} of {len(all_files)} files to upload")
+
+        if is_stream:
+            report = self._put_stream(ssh_cli, local_dir, staging_dir, changed, is_zstd)
+        else:
+            report = self._upload(
+                ssh_cli,
+                [(os.path.join(local_dir, rel_path), os.path.join(staging_dir, rel_path))
+                 for rel_path in changed])
+        if len(report.failed) > 0:
+            print(f"{staging_dir} is not published, {len(report.failed)} files put faild")
+            return report
+        if is_sign and not self._sign(ssh_cli, local_dir, staging_dir, {
+                rel_path: info['sha256'] for rel_path, info in local_manifest.files.items()}):
+            print(f"{staging_dir} is not published, the checksum files put faild")
+            return report
+
+        self._write_manifest(sftp_cli, staging_dir, local_manifest)
+        sftp_cli.posix_rename(staging_dir, os.path.join(dst_dir, stamp))
+        # rename over the old link is atomic, the site never misses latest
+        latest_path = os.path.join(dst_dir, transfer.LATEST_NAME)
+        tmp_arg = shlex.quote(latest_path + ".tmp")
+        self.exec_command(ssh_cli, f"rm -f {tmp_arg} && ln -s {shlex.quote(stamp)} {tmp_arg}")
+        sftp_cli.posix_rename(latest_path + ".tmp", latest_path)
+        print(f"published {os.path.join(dst_dir, stamp)} as {latest_path}")
+        self._expire_publications(ssh_cli, dst_dir, names + [stamp], stamp)
+        return report
+
+    def publish_to_remote(self, local_dir, dst_dir, is_stream=False, is_zstd=False, is_sign=False):
+        '''
+        publish local directory as a new dated directory under dst_dir and
+        point dst_dir/latest to it, return the transfer report. The files that
+        match the previous publication are hardlinked to it on the remote
+        instead of uploaded, and the old publications beyond keep_publications
+        are removed
+        '''
+        local_dir = os.path.abspath(local_dir)
+        ssh_cli, sftp_cli = self.get_ssh_client()
+        if ssh_cli is None:
+            return None
+        try:
+            return self._publish(ssh_cli, sftp_cli, local_dir, dst_dir, is_stream, is_zstd, is_sign)
+        finally:
+            sftp_cli.close()
+            ssh_cli.close()
 
-        sftp_cli.close()
-        ssh_cli.close()
+    def put_file_to_remote(self, local_path, dst_dir, is_delete_dst=False, is_sign=False):
+        '''
+        put local file to destination, return the transfer report, with
+        is_sign its checksum file is made from the data sent
+        '''
+        ssh_cli, sftp_cli = self.get_ssh_client()
+        if ssh_cli is None:
+            return None
+        try:
+            if is_delete_dst:
+                self._clear_dst(ssh_cli, dst_dir)
+            remote_file = os.path.join(dst_dir, os.path.basename(local_path))
+            report = self._upload(ssh_cli, [(local_path, remote_file)])
+            if is_sign:
+                local_dir = os.path.dirname(os.path.abspath(local_path))
+                # the other files of the local directory are not in an index of one file
+                self._sign(ssh_cli, local_dir, dst_dir, self._get_report_sums(local_dir, report), False)
+            return report
+        finally:
+            sftp_cli.close()
+            ssh_cli.close()
 
 
 class Result:
@@ -0,0 +1,311 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import sys
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+from http import HTTPStatus
+
+from app import util
+
+# the directory under the share dir that keeps the queued forge mutations
+OUTBOX_DIR = "forge_outbox"
+# the token of the detached flusher is passed by this environment variable,
+# so it never shows up in the process list
+TOKEN_ENV = "EMBEDDED_CI_OUTBOX_TOKEN"
+
+_outboxes = []
+_outboxes_lock = threading.Lock()
+
+def get_spool_dir(forge, share_dir = None):
+    '''
+    return the spool directory of the forge, the clients of the same repo and
+    token share it, so a queue left by one job is flushed by the next one
+    '''
+    # no token is hashed as the empty one the flusher gets from its env
+    key = f"{forge.api_url_pre}|{forge.owner}|{forge.repo}|{forge.token or ''}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    if share_dir is None:
+        share_dir = os.path.join(tempfile.gettempdir(), f"embedded-ci-{os.getuid()}")
+    return os.path.join(share_dir, OUTBOX_DIR, digest)
+
+def close_all():
+    '''
+    close all the outboxes opened by the current process
+    '''
+    with _outboxes_lock:
+        outboxes = list(_outboxes)
+        _outboxes.clear()
+    for outbox in outboxes:
+        outbox.close()
+
+class Outbox:
+    '''
+    A write-behind queue of the forge mutations. The comments, labels and
+    issues are appended to a spool directory and sent by a background thread,
+    so the pipeline never waits on the forge. The label changes of a pull
+    request are coalesced into their net effect before sending, the failed
+    mutations are retried, and the ones still queued when the command exits
+    are handed to a detached flusher
+    '''
+    def __init__(self, forge, share_dir = None):
+        self.forge = forge
+        self.share_dir = share_dir
+        self.spool_dir = get_spool_dir(forge, share_dir)
+        outbox_conf = util.get_common_conf().get('outbox') or {}
+        self.max_attempts = int(outbox_conf.get('max_attempts', 5))
+        self.drain_timeout = float(outbox_conf.get('drain_timeout', 10))
+        self.max_backoff = float(outbox_conf.get('max_backoff', 60))
+        self._seq = 0
+        # the mutations sent or dropped so far, a flush that changed it made progress
+        self._done = 0
+        self._event = threading.Event()
+        self._closing = False
+        self._drain_deadline = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def comment_pr(self, pr_num, comment):
+        '''
+        queue a comment to pull request
+        '''
+        self._put({'op': 'comment', 'pr_num': str(pr_num), 'body': comment})
+        return True
+
+    def add_tags_of_pr(self, pr_num, *tags):
+        '''
+        queue adding tags to pull request
+        '''
+        self._put({'op': 'labels', 'pr_num': str(pr_num), 'add': list(tags), 'delete': []})
+        return True
+
+    def delete_tags_of_pr(self, pr_num, *tags):
+        '''
+        queue deleting tags of pull request
+        '''
+        self._put({'op': 'labels', 'pr_num': str(pr_num), 'add': [], 'delete': list(tags)})
+        return True
+
+    def add_issue_to_repo(self, title, body):
+        '''
+        queue an issue to repo
+        '''
+        self._put({'op': 'issue', 'title': title, 'body': body})
+        return True
+
+    def _put(self, entry):
+        entry['attempts'] = 0
+        # the name keeps the order of the mutations across processes
+        self._seq = self._seq + 1
+        name = f"{time.time_ns():020d}-{os.getpid()}-{self._seq:06d}.json"
+        self._write_entry(name, entry)
+        self._start()
+        self._event.set()
+
+    def _write_entry(self, name, entry):
+        tmp_path = os.path.join(self.spool_dir, f".{name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as w_f:
+            w_f.write(json.dumps(entry, ensure_ascii=False))
+        os.replace(tmp_path, os.path.join(self.spool_dir, name))
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        with _outboxes_lock:
+            _outboxes.append(self)
+
+    def _run(self):
+        backoff = 1
+        while True:
+            self._event.clear()
+            done = self._done
+            try:
+                pending = self.flush()
+            except Exception as e_p:
+                # the thread must outlive any error, the entries stay queued
+                print(f"[WARN]: flush forge outbox faild: {e_p}")
+                pending = len(self._list_entries())
+            if self._closing:
+                # the mutations queued while close waited on a flush are
+                # flushed too, until the queue is empty or the time is up
+                remaining = self._drain_deadline - time.monotonic()
+                if pending == 0 or remaining <= 0:
+                    return
+                if self._done == done:
+                    time.sleep(min(backoff, remaining))
+                    backoff = min(backoff * 2, self.max_backoff)
+                continue
+            if pending == 0:
+                backoff = 1
+                self._event.wait()
+            else:
+                self._event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _list_entries(self):
+        try:
+            return sorted(name for name in os.listdir(self.spool_dir)
+                          if name.endswith(".json") and not name.startswith("."))
+        except FileNotFoundError:
+            return []
+
+    def _load_entries(self):
+        entries = []
+        for name in self._list_entries():
+            try:
+                with open(os.path.join(self.spool_dir, name), 'r', encoding='utf-8') as r_f:
+                    entries.append((name, json.loads(r_f.read())))
+            except (OSError, ValueError):
+                # written by a process that died, or flushed by another one
+                continue
+        return entries
+
+    def _remove_entry(self, name):
+        try:
+            os.remove(os.path.join(self.spool_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def _retry_entry(self, name, entry):
+        entry['attempts'] = entry.get('attempts', 0) + 1
+        if entry['attempts'] < self.max_attempts:
+            self._write_entry(name, entry)
+            return
+        dead_dir = os.path.join(self.spool_dir, "dead")
+        os.makedirs(dead_dir, exist_ok=True)
+        with open(os.path.join(dead_dir, name), 'w', encoding='utf-8') as w_f:
+            w_f.write(json.dumps(entry, ensure_ascii=False))
+        self._remove_entry(name)
+        print(f"[WARN]: give up {entry['op']} after {entry['attempts']} attempts, "
+              f"it is kept in {dead_dir}")
+
+    def _send(self, func, *args, **kwargs):
+        '''
+        send a mutation, return True when it is done with, that is sent or
+        rejected by the forge for good, e.g. deleting a label the pull
+        request does not have
+        '''
+        self.forge.last_status = None
+        try:
+            is_ok = func(*args, **kwargs)
+        except Exception as e_p:
+            # the connection errors are already retried by the http session
+            print(f"[WARN]: {func.__name__} faild: {e_p}")
+            is_ok = False
+        status = getattr(self.forge, 'last_status', None)
+        if not is_ok and status is not None and 400 <= status < 500 and \
+                status != HTTPStatus.TOO_MANY_REQUESTS:
+            print(f"[WARN]: {func.__name__} is rejected with {status}, it is dropped")
+            is_ok = True
+        if is_ok:
+            self._done = self._done + 1
+        return is_ok
+
+    def flush(self):
+        '''
+        send the queued mutations, return the number of mutations left
+        '''
+        with open(os.path.join(self.spool_dir, ".lock"), 'a', encoding='utf-8') as l_f:
+            fcntl.flock(l_f.fileno(), fcntl.LOCK_EX)
+            entries = self._load_entries()
+            label_entries = {}
+            blocked_prs = set()
+            for name, entry in entries:
+                if entry['op'] == 'labels':
+                    label_entries.setdefault(entry['pr_num'], []).append((name, entry))
+                elif entry['op'] == 'comment':
+                    # a failed comment holds back the later ones to keep the order
+                    if entry['pr_num'] in blocked_prs:
+                        continue
+                    if self._send(
+                            self.forge.comment_pr, pr_num=entry['pr_num'], comment=entry['body']):
+                        self._remove_entry(name)
+                    else:
+                        blocked_prs.add(entry['pr_num'])
+                        self._retry_entry(name, entry)
+                elif entry['op'] == 'issue':
+                    if self._send(
+                            self.forge.add_issue_to_repo, title=entry['title'], body=entry['body']):
+                        self._remove_entry(name)
+                    else:
+                        self._retry_entry(name, entry)
+            for pr_num, pr_entries in label_entries.items():
+                self._flush_labels(pr_num, pr_entries)
+            return len(self._list_entries())
+
+    def _flush_labels(self, pr_num, pr_entries):
+        # the last change of a label wins, e.g. delete(processing) after
+        # add(processing) only deletes it
+        net = {}
+        for _, entry in pr_entries:
+            for label in entry['delete']:
+                net[label] = False
+            for label in entry['add']:
+                net[label] = True
+        delete_list = [label for label, is_add in net.items() if not is_add]
+        add_list = [label for label, is_add in net.items() if is_add]
+        left = {'op': 'labels', 'pr_num': pr_num, 'add': [], 'delete': [],
+                'attempts': max(entry.get('attempts', 0) for _, entry in pr_entries)}
+        if len(delete_list) > 0 and not self._send(
+                self.forge.delete_tags_of_pr, pr_num, *delete_list):
+            left['delete'] = delete_list
+        if len(add_list) > 0 and not self._send(
+                self.forge.add_tags_of_pr, pr_num, *add_list):
+            left['add'] = add_list
+
+        # the coalesced change that is left replaces the queued ones
+        first_name = pr_entries[0][0]
+        for name, _ in pr_entries[1:]:
+            self._remove_entry(name)
+        if len(left['add']) > 0 or len(left['delete']) > 0:
+            self._retry_entry(first_name, left)
+        else:
+            self._remove_entry(first_name)
+
+    def close(self):
+        '''
+        wait up to drain_timeout for the queue, then hand the mutations left
+        to a detached flusher
+        '''
+        if self._thread is None:
+            return
+        self._drain_deadline = time.monotonic() + self.drain_timeout
+        self._closing = True
+        self._event.set()
+        self._thread.join(self.drain_timeout)
+        if len(self._list_entries()) > 0:
+            self._spawn_flusher()
+
+    def _spawn_flusher(self):
+        cmd = [sys.executable, "-u", os.path.join(util.get_top_path(), "main.py"), "outbox",
+               "-f", type(self.forge).__name__,
+               "-o", self.forge.owner,
+               "-p", self.forge.repo]
+        if self.share_dir is not None:
+            cmd.extend(["-s", self.share_dir])
+        env = dict(os.environ)
+        env[TOKEN_ENV] = self.forge.token or ""
+        # the warm server would run the flusher in a worker bound to this client
+        env.pop("EMBEDDED_CI_SOCK", None)
+        log_path = os.path.join(self.spool_dir, "flush.log")
+        util.spawn_detached(cmd, log_path=log_path, env=env)
+        print(f"the forge mutations left are flushed in background, see {log_path}")
+
@@ -0,0 +1,65 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+from argparse import _SubParsersAction
+
+from app import util
+from app.command import Command
+from app.build import Bench, BenchParam
+
+class Benchmark(Command):
+    '''
+    This class runs the benchmark which is specified by the passed in target,
+    it is used to guard the performance of embedded-ci against regressions
+    '''
+    def __init__(self):
+
+        super().__init__(
+            "bench",
+            "run a benchmark",
+            "This class runs the benchmark which is specified by the passed in target")
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-target', '--target', dest="target", default="startup")
+        parser_addr.add_argument('-c', '--command', dest="commands", action="append", default=None)
+        parser_addr.add_argument('-r', '--rounds', dest="rounds", default=5)
+        parser_addr.add_argument('-max', '--max_ms', dest="max_ms", default=None)
+        parser_addr.add_argument('-w', '--work_dir', dest="work_dir", default=None)
+        parser_addr.add_argument('-out', '--output', dest="output", default=None)
+        parser_addr.add_argument('-size', '--size', dest="sizes", action="append", default=None,
+            help='''
+            the number of commits of a synthetic pull request, for the forge target,
+            the size of the synthetic artifact tree in MB, for the checksum target
+            ''')
+        parser_addr.add_argument('-latency', '--latency_ms', dest="latency_ms", default=0)
+        parser_addr.add_argument('-throttle', '--throttle_every', dest="throttle_every", default=0,
+            help='''
+            the forge stub answers every n-th request with 429, 0 means never
+            ''')
+
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+
+        #invoke process class
+        task_path = util.get_top_path() + f"/app/plugins/bench/tasks/{args.target}.py"
+        cls:Bench = util.get_spec_ext(task_path, "Run")
+        return cls.bench(param=BenchParam(
+            commands=args.commands,
+            rounds=int(args.rounds),
+            max_ms=float(args.max_ms) if args.max_ms is not None else None,
+            work_dir=args.work_dir,
+            output=args.output,
+            sizes=[int(size) for size in args.sizes] if args.sizes is not None else None,
+            latency_ms=float(args.latency_ms),
+            throttle_every=int(args.throttle_every)))
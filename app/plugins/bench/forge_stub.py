@@ -0,0 +1,302 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# the path prefix of the gitcode v5 api, the clients are pointed to
+# http://127.0.0.1:<port>/api/v5/repos
+API_PREFIX = "/api/v5/repos"
+
+def _get_sha(pr_num, index):
+    return hashlib.sha1(f"{pr_num}-{index}".encode()).hexdigest()
+
+def _get_filename(index):
+    # one of every ten commits changes the docs, like a real pull request
+    if index % 10 == 9:
+        return f"docs/page{index}.rst"
+    return f"src/module{index % 50}/file{index}.c"
+
+class ForgeStub:
+    '''
+    A local stand-in of the gitcode v5 api used by app.lib and create_release.
+    The number of a pull request is also its number of commits, and every
+    commit changes one file. The latency of every request, the max page size
+    and the 429 responses are configurable, and the requests and bytes are
+    counted, so the forge code paths can be measured without gitcode.com
+    '''
+    def __init__(self, latency_ms = 0, max_per_page = 100, throttle_every = 0):
+        self.latency_ms = latency_ms
+        self.max_per_page = max_per_page
+        self.throttle_every = throttle_every
+        self.stats = {}
+        self.comments = []
+        self.labels = {}
+        self.issues = []
+        self.releases = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.reset()
+
+    @property
+    def api_url(self):
+        '''
+        return the api url prefix of the stub
+        '''
+        return f"http://127.0.0.1:{self._server.server_port}{API_PREFIX}"
+
+    def start(self):
+        '''
+        start the stub on a random local port
+        '''
+        stub = self
+
+        class _Handler(_StubHandler):
+            forge = stub
+
+        self._server = _StubServer(('127.0.0.1', 0), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        stop the stub
+        '''
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset(self):
+        '''
+        clear the counters
+        '''
+        with self._lock:
+            self.stats = {
+                'requests': 0,
+                'throttled': 0,
+                'not_modified': 0,
+                'bytes_in': 0,
+                'bytes_out': 0,
+                'endpoints': {}}
+
+    def count(self, endpoint, bytes_in):
+        '''
+        count a request, return True if it should be answered with 429
+        '''
+        with self._lock:
+            self.stats['requests'] = self.stats['requests'] + 1
+            self.stats['bytes_in'] = self.stats['bytes_in'] + bytes_in
+            endpoints = self.stats['endpoints']
+            endpoints[endpoint] = endpoints.get(endpoint, 0) + 1
+            if self.throttle_every > 0 and self.stats['requests'] % self.throttle_every == 0:
+                self.stats['throttled'] = self.stats['throttled'] + 1
+                return True
+        return False
+
+    def count_out(self, size, is_not_modified = False):
+        '''
+        count the bytes of a response
+        '''
+        with self._lock:
+            self.stats['bytes_out'] = self.stats['bytes_out'] + size
+            if is_not_modified:
+                self.stats['not_modified'] = self.stats['not_modified'] + 1
+
+    def get_pr_commits(self, pr_num):
+        '''
+        return the synthetic commits of pull request
+        '''
+        return [{
+            'sha': _get_sha(pr_num, index),
+            'commit': {'message': f"module{index % 50}: change {index}\n\nsynthetic commit"},
+            'parents': [{'sha': _get_sha(pr_num, index - 1)}] if index > 0 else []}
+            for index in range(pr_num)]
+
+    def get_pr_files(self, pr_num):
+        '''
+        return the synthetic changed files of pull request
+        '''
+        return [{
+            'filename': _get_filename(index),
+            'status': "modified",
+            'additions': 1,
+            'deletions': 0,
+            'patch': {
+                'diff': f"@@ -1 +1 @@\n-old {index}\n+new {index}\n",
+                'new_file': False,
+                'renamed_file': False,
+                'deleted_file': False}}
+            for index in range(pr_num)]
+
+    def get_commit(self, sha):
+        '''
+        return the info of a commit, every commit changes one file
+        '''
+        index = int(sha, 16) % 1000
+        return {
+            'sha': sha,
+            'commit': {'message': f"change {index}"},
+            'files': [{'filename': _get_filename(index), 'status': "modified"}]}
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the clients drop their keep-alive connections when they exit
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send the headers and the body in one segment, like a real server
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    forge:ForgeStub = None
+
+    routes = [
+        ("GET", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<pr>\d+)/commits", "pr_commits"),
+        ("GET", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<pr>\d+)/files", "pr_files"),
+        ("GET", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/commits/(?P<sha>[^/]+)", "commit"),
+        ("POST", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<pr>\d+)/comments", "comment"),
+        ("POST", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<pr>\d+)/labels", "add_labels"),
+        ("DELETE", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<pr>\d+)/labels/(?P<names>[^/]+)",
+         "delete_labels"),
+        ("POST", r"/(?P<owner>[^/]+)/issues", "issue"),
+        ("GET", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/(?P<tag>[^/]+)/upload_url",
+         "upload_url"),
+        ("GET", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/(?P<tag>[^/]+)", "get_release"),
+        ("PATCH", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/(?P<tag>[^/]+)", "update_release"),
+        ("POST", r"/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases", "create_release"),
+        ("PUT", r"/upload/(?P<tag>[^/]+)/(?P<name>[^/]+)", "upload"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        split = urlsplit(self.path)
+        query = {key: value[-1] for key, value in parse_qs(split.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+        path = split.path
+        if path.startswith(API_PREFIX):
+            path = path[len(API_PREFIX):]
+
+        for method, pattern, endpoint in self.routes:
+            match = re.fullmatch(pattern, path)
+            if method == self.command and match is not None:
+                break
+        else:
+            endpoint = None
+            match = None
+        if self.forge.count(endpoint or "unknown", len(self.path) + length):
+            self._reply(429, {'message': "rate limit exceeded"}, {'Retry-After': "0"})
+            return
+        if self.forge.latency_ms > 0:
+            time.sleep(self.forge.latency_ms / 1000)
+        if endpoint is None:
+            self._reply(404, {'message': "not found"})
+            return
+        getattr(self, f"_do_{endpoint}")(match.groupdict(), query, body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def _reply(self, code, obj, headers = None):
+        data = json.dumps(obj).encode() if code != 204 else b''
+        etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        if code == 200 and self.command == "GET" and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+            self.forge.count_out(0, is_not_modified=True)
+            return
+        self.send_response(code)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(data)))
+        if code == 200 and self.command == "GET":
+            self.send_header('ETag', etag)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.forge.count_out(len(data))
+
+    def _get_page(self, items, query):
+        per_page = min(int(query.get('per_page', 20)), self.forge.max_per_page)
+        page = max(int(query.get('page', 1)), 1)
+        return items[(page - 1) * per_page: page * per_page]
+
+    def _do_pr_commits(self, match, query, _):
+        self._reply(200, self._get_page(self.forge.get_pr_commits(int(match['pr'])), query))
+
+    def _do_pr_files(self, match, query, _):
+        self._reply(200, self._get_page(self.forge.get_pr_files(int(match['pr'])), query))
+
+    def _do_commit(self, match, _, __):
+        if not re.fullmatch(r"[0-9a-f]{40}", match['sha']):
+            self._reply(404, {'message': "commit not found"})
+            return
+        self._reply(200, self.forge.get_commit(match['sha']))
+
+    def _do_comment(self, match, _, body):
+        self.forge.comments.append((match['pr'], body.decode(errors="replace")))
+        self._reply(201, {'id': len(self.forge.comments)})
+
+    def _do_add_labels(self, match, _, body):
+        labels = self.forge.labels.setdefault(match['pr'], set())
+        labels.update(json.loads(body or b'[]'))
+        self._reply(201, [{'name': label} for label in sorted(labels)])
+
+    def _do_delete_labels(self, match, _, __):
+        labels = self.forge.labels.setdefault(match['pr'], set())
+        labels.difference_update(match['names'].split(','))
+        self._reply(204, {})
+
+    def _do_issue(self, match, _, body):
+        self.forge.issues.append((match['owner'], body.decode(errors="replace")))
+        self._reply(201, {'number': str(len(self.forge.issues))})
+
+    def _do_get_release(self, match, _, __):
+        if match['tag'] not in self.forge.releases:
+            self._reply(404, {'message': "release not found"})
+            return
+        self._reply(200, self.forge.releases[match['tag']])
+
+    def _do_create_release(self, _, __, body):
+        release = json.loads(body or b'{}')
+        self.forge.releases[release.get('tag_name', "")] = release
+        self._reply(201, release)
+
+    def _do_update_release(self, match, _, body):
+        release = self.forge.releases.setdefault(match['tag'], {'tag_name': match['tag']})
+        release.update(json.loads(body or b'{}'))
+        self._reply(200, release)
+
+    def _do_upload_url(self, match, query, _):
+        url = f"http://127.0.0.1:{self.server.server_port}/upload/{match['tag']}/{query.get('file_name')}"
+        self._reply(200, {'url': url, 'headers': {}})
+
+    def _do_upload(self, _, __, ___):
+        self._reply(200, {})
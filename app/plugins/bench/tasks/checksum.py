@@ -0,0 +1,149 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import statistics
+
+from app import checksum
+from app.build import Bench
+
+# the size of the synthetic artifact tree in MB
+TREE_MB = 512
+
+def legacy_add_sum_to_local_dir(local_dir):
+    '''
+    the implementation replaced by app.checksum, kept as the baseline
+    '''
+    file_list = os.listdir(local_dir)
+    for file_name in file_list:
+        file_path = os.path.join(local_dir, file_name)
+        if os.path.isdir(file_path):
+            legacy_add_sum_to_local_dir(file_path)
+        else:
+            sha256 = hashlib.sha256()
+            with open(file_path, 'rb') as r_f:
+                while True:
+                    data = r_f.read(1024)
+                    if not data:
+                        break
+                    sha256.update(data)
+                with open(f'{file_path}.sha256sum', 'w', encoding="utf-8") as w_f:
+                    w_f.write(f"{str(sha256.hexdigest())} {file_name}")
+
+def make_tree(tree_dir, total_mb):
+    '''
+    write a tree shaped like a board output: a few images take half of the
+    size, some packages a quarter, and many small files the rest
+    '''
+    block = os.urandom(1024 * 1024)
+    def write(path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as w_f:
+            while size > 0:
+                w_f.write(block[:min(size, len(block))])
+                size = size - len(block)
+    total = total_mb * 1024 * 1024
+    for index in range(4):
+        write(os.path.join(tree_dir, f"openeuler-image-{index}.rootfs.cpio.gz"), total // 8)
+    for index in range(32):
+        write(os.path.join(tree_dir, "sdk", f"package{index}.tar.bz2"), total // 128)
+    small_size = 16 * 1024
+    for index in range(max(1, total // 4 // small_size)):
+        write(os.path.join(tree_dir, "source_list", f"d{index % 64}", f"recipe{index}.yaml"), small_size)
+
+def remove_sums(tree_dir):
+    '''
+    remove the checksum files of the last round
+    '''
+    for root, _, files in os.walk(tree_dir):
+        for name in files:
+            if name.endswith(checksum.SUM_SUFFIX):
+                os.remove(os.path.join(root, name))
+
+def read_sums(tree_dir):
+    '''
+    return the content of every checksum file keyed by its path
+    '''
+    sums = {}
+    for root, _, files in os.walk(tree_dir):
+        for name in files:
+            if name.endswith(checksum.SUM_SUFFIX):
+                with open(os.path.join(root, name), 'r', encoding="utf-8") as r_f:
+                    sums[os.path.relpath(os.path.join(root, name), tree_dir)] = r_f.read()
+    return sums
+
+class Run(Bench):
+    '''
+    measure app.checksum against the 1024-byte serial implementation it
+    replaced, on a synthetic artifact tree, without and with the checksum
+    cache of the round before. The legacy rounds warm the page cache, so
+    the hashing is measured rather than the disk
+    '''
+    def do_bench(self, param):
+        total_mb = param.sizes[0] if param.sizes else TREE_MB
+        work_dir = tempfile.mkdtemp(prefix="checksum-bench-", dir=param.work_dir)
+        tree_dir = os.path.join(work_dir, "output")
+        results = []
+        try:
+            make_tree(tree_dir, total_mb)
+            file_count = len(list(checksum.iter_files(tree_dir)))
+            # the cached run keeps the checksum cache of the round before
+            impls = [
+                ("legacy", legacy_add_sum_to_local_dir, False),
+                ("checksum", checksum.add_sum_to_local_dir, False),
+                ("cached", checksum.add_sum_to_local_dir, True)]
+            expected = None
+            for name, func, is_cached in impls:
+                wall_list = []
+                for _ in range(max(param.rounds, 1)):
+                    remove_sums(tree_dir)
+                    if not is_cached and os.path.exists(checksum.get_cache_path(tree_dir)):
+                        os.remove(checksum.get_cache_path(tree_dir))
+                    start = time.perf_counter()
+                    func(tree_dir)
+                    wall_list.append((time.perf_counter() - start) * 1000)
+                sums = read_sums(tree_dir)
+                if expected is None:
+                    expected = sums
+                elif sums != expected:
+                    raise self.BenchError(f"the checksum files of {name} differ from legacy")
+                wall_ms = statistics.median(wall_list)
+                results.append({
+                    'impl': name,
+                    'files': file_count,
+                    'size_mb': total_mb,
+                    'wall_ms': round(wall_ms, 2),
+                    'speed': round(total_mb / wall_ms * 1000, 2)})
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        base_ms = results[0]['wall_ms']
+        print("=================== checksum benchmark ===================")
+        print(f"{'impl':<12}{'files':>8}{'MB':>8}{'wall(ms)':>12}{'MB/s':>10}{'speedup':>10}")
+        for res in results:
+            res['speedup'] = round(base_ms / res['wall_ms'], 2) if res['wall_ms'] > 0 else None
+            print(f"{res['impl']:<12}{res['files']:>8}{res['size_mb']:>8}{res['wall_ms']:>12}"
+                  f"{res['speed']:>10}{str(res['speedup']):>10}")
+        print("==========================================================")
+
+        if param.output is not None:
+            with open(param.output, 'w', encoding='utf-8') as w_f:
+                w_f.write(json.dumps(results, indent=2))
+
+        if param.max_ms is not None and results[1]['wall_ms'] > param.max_ms:
+            raise self.BenchError(f"checksum took {results[1]['wall_ms']}ms, over {param.max_ms}ms")
+        return results
@@ -0,0 +1,215 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+from app import util
+from app.build import Bench
+from app.lib import FORGE_CACHE_DIR
+from app.outbox import OUTBOX_DIR
+from app.plugins.bench.forge_stub import ForgeStub
+
+COMMANDS = ["pre", "pr_check", "gate", "comment", "create_release"]
+SIZES = [1, 50, 1000]
+OWNER = "bench"
+REPO = "bench-repo"
+
+# the gate clones the repo and builds it, the probe only runs the forge part
+# of Gate.exec: the build link, the labels, the commits and files of the pull
+# request, the commit scope check and the result
+GATE_PROBE = '''
+import sys
+from app import outbox
+from app.lib import Gitcode
+from app.build import BuildRes
+from app.plugins.gate.gate import Gate, Code
+owner, repo, pr_num, share_dir = sys.argv[1:5]
+gate = Gate()
+gate.repo = repo
+gate.gitcode = Gitcode(owner=owner, repo=repo, token="bench", share_dir=share_dir)
+gate.outbox = outbox.Outbox(forge=gate.gitcode, share_dir=share_dir)
+try:
+    gate.send_build_link(pr_num=pr_num, is_test=True)
+    gate.outbox.delete_tags_of_pr(pr_num, "ci_successful", "ci_failed")
+    gate.outbox.add_tags_of_pr(pr_num, "ci_processing")
+    commit_list = gate.gitcode.list_pr_commits(pr_num=pr_num)
+    commit_hash_list = gate._get_hash_from_commit(commit_list=commit_list)
+    commit_files_list = gate.gitcode.filter_delete_commit_files(gate.gitcode.list_pr_files(pr_num))
+    gate.is_docs_build(commit_files_list)
+    scope_res = Code(None, gate.gitcode).check_commit_scope(commit_hash_list)
+    gate.send_result(pr_num, [{"name": "check_commit_scope", "result": scope_res}], [],
+                     BuildRes(archs=[]), True)
+finally:
+    outbox.close_all()
+'''
+
+class Run(Bench):
+    '''
+    measure the wall time, request count and bytes of the forge-heavy commands
+    against a local forge stub, on synthetic pull requests of 1, 50 and 1000
+    commits. The first round runs with an empty forge cache, the later rounds
+    with the cache of the round before, so both the cold and the warm cache
+    are measured
+    '''
+    def do_bench(self, param):
+        commands = param.commands or COMMANDS
+        sizes = param.sizes or SIZES
+        stub = ForgeStub(
+            latency_ms=param.latency_ms,
+            throttle_every=param.throttle_every).start()
+        work_dir = tempfile.mkdtemp(prefix="forge-bench-", dir=param.work_dir)
+        env = dict(os.environ)
+        env.update({
+            'EMBEDDED_CI_GITCODE_API': stub.api_url,
+            'JOB_NAME': "forge-bench",
+            'BUILD_NUMBER': "1",
+            'BUILD_URL': "http://127.0.0.1/job/forge-bench/1/",
+            'PYTHONDONTWRITEBYTECODE': "1"})
+        # the commands must run here, not in a warm server bound to the stub
+        env.pop('EMBEDDED_CI_SOCK', None)
+
+        results = []
+        try:
+            for command in commands:
+                for size in sizes:
+                    results.append(self._bench_one(
+                        stub, env, command, size, param.rounds, os.path.join(work_dir, f"{command}-{size}")))
+        finally:
+            stub.stop()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        print("===================================== forge benchmark =====================================")
+        print(f"{'command':<16}{'commits':>8}{'cold(ms)':>10}{'warm(ms)':>10}"
+              f"{'requests':>10}{'warm req':>10}{'304':>6}{'429':>6}{'bytes out':>12}")
+        for res in results:
+            print(f"{res['command']:<16}{res['commits']:>8}{res['cold_ms']:>10}{str(res['warm_ms']):>10}"
+                  f"{res['requests']:>10}{str(res['warm_requests']):>10}{res['not_modified']:>6}"
+                  f"{res['throttled']:>6}{res['bytes_out']:>12}")
+        print("===========================================================================================")
+
+        if param.output is not None:
+            with open(param.output, 'w', encoding='utf-8') as w_f:
+                w_f.write(json.dumps(results, indent=2))
+
+        if param.max_ms is not None:
+            slow_list = [f"{res['command']}({res['commits']})" for res in results
+                         if res['cold_ms'] > param.max_ms]
+            if len(slow_list) > 0:
+                raise self.BenchError(f"{', '.join(slow_list)} took over {param.max_ms}ms")
+        return results
+
+    def _bench_one(self, stub:ForgeStub, env, command, size, rounds, case_dir):
+        wall_list = []
+        stats_list = []
+        pre_share_dir = None
+        for index in range(max(rounds, 1)):
+            # every round gets a share dir of its own with only the forge cache
+            # of the round before, the gate state left in it would make pre stop
+            # the jenkins job of the round before
+            share_dir = os.path.join(case_dir, f"share{index}")
+            os.makedirs(share_dir, exist_ok=True)
+            if pre_share_dir is not None and os.path.isdir(os.path.join(pre_share_dir, FORGE_CACHE_DIR)):
+                shutil.copytree(
+                    os.path.join(pre_share_dir, FORGE_CACHE_DIR), os.path.join(share_dir, FORGE_CACHE_DIR))
+            pre_share_dir = share_dir
+            cmd = self._get_cmd(command, size, case_dir, share_dir)
+            stub.reset()
+            start = time.perf_counter()
+            res = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=util.get_top_path(),
+                env=env,
+                check=False,
+                encoding="utf-8")
+            wall_list.append((time.perf_counter() - start) * 1000)
+            if res.returncode != 0:
+                raise self.BenchError(f"{command} with {size} commits faild:\n{res.stdout}")
+            # the mutations left to the detached flusher count for this round
+            self._wait_outbox(share_dir)
+            stats_list.append(dict(stub.stats))
+
+        cold = stats_list[0]
+        warm = stats_list[1:]
+        return {
+            'command': command,
+            'commits': size,
+            'cold_ms': round(wall_list[0], 2),
+            'warm_ms': round(statistics.median(wall_list[1:]), 2) if len(warm) > 0 else None,
+            'requests': cold['requests'],
+            'warm_requests': warm[-1]['requests'] if len(warm) > 0 else None,
+            'not_modified': warm[-1]['not_modified'] if len(warm) > 0 else 0,
+            'throttled': cold['throttled'],
+            'bytes_in': cold['bytes_in'],
+            'bytes_out': cold['bytes_out'],
+            'endpoints': cold['endpoints']}
+
+    @staticmethod
+    def _wait_outbox(share_dir, timeout = 120):
+        outbox_dir = os.path.join(share_dir, OUTBOX_DIR)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            left = glob.glob(os.path.join(outbox_dir, "*", "*.json"))
+            if len(left) == 0:
+                return
+            time.sleep(0.1)
+        raise Bench.BenchError(f"the forge outbox of {share_dir} is not flushed in {timeout}s")
+
+    @staticmethod
+    def _get_cmd(command, size, case_dir, share_dir):
+        main_py = os.path.join(util.get_top_path(), "main.py")
+        common = ["-o", OWNER, "-p", REPO, "-gt", "bench"]
+        if command == "pre":
+            return [sys.executable, main_py, "pre", *common, "-pr", str(size), "-s", share_dir,
+                    "-juser", "bench", "-jpwd", "bench"]
+        if command == "pr_check":
+            return [sys.executable, main_py, "pr_check", *common, "-pr", str(size), "-s", share_dir]
+        if command == "gate":
+            return [sys.executable, "-c", GATE_PROBE, OWNER, REPO, str(size), share_dir]
+        if command == "comment":
+            checks = [util.base64_encode(json.dumps({
+                'name': f"check{index}",
+                'action': "build",
+                'result': "success" if index % 7 else "failed",
+                'log_path': f"check{index}.log"})) for index in range(min(size, 50))]
+            cmd = [sys.executable, main_py, "comment", "-m", "gate", *common,
+                   "-pr", str(size), "-s", share_dir, "-dt", "61000"]
+            for check in checks:
+                cmd.extend(["-chk", check])
+            return cmd
+        if command == "create_release":
+            # the release uploads one small artifact for every commit
+            file_dir = os.path.join(case_dir, "files")
+            if not os.path.exists(file_dir):
+                os.makedirs(file_dir)
+                for index in range(size):
+                    with open(os.path.join(file_dir, f"artifact{index}.bin"), 'wb') as w_f:
+                        w_f.write(os.urandom(1024))
+            yaml_path = os.path.join(case_dir, "release.yaml")
+            util.write_yaml(yaml_path, {
+                'owner': OWNER,
+                'repo': REPO,
+                'tag_name': f"v{size}",
+                'name': f"bench release {size}",
+                'body': "synthetic release"})
+            return [sys.executable, main_py, "create_release", "-gt", "bench",
+                    "-y", yaml_path, "-f", file_dir]
+        raise ValueError(f"unknown command {command}")
@@ -0,0 +1,92 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+
+from app import util
+from app.app import App
+from app.build import Bench
+
+# third-party modules that are expensive to import, a command should only
+# load the ones it really uses
+HEAVY_MODULES = ["requests", "paramiko", "jenkins", "git", "json2table", "ruamel.yaml"]
+
+# the probe runs in a fresh interpreter, it resolves one command the same way
+# as `main.py <command>` does and reports the load time and heavy imports
+PROBE = f'''
+import sys, time, json
+start = time.perf_counter()
+from app.app import App
+app = App()
+app.get_command(sys.argv[1])
+cost = (time.perf_counter() - start) * 1000
+heavy = [mod for mod in {HEAVY_MODULES!r} if mod in sys.modules]
+print(json.dumps({{"load_ms": cost, "heavy": heavy}}))
+'''
+
+class Run(Bench):
+    '''
+    measure the startup time of every subcommand in a fresh interpreter
+    '''
+    def do_bench(self, param):
+        commands = param.commands
+        if commands is None:
+            commands = list(App().plugins)
+
+        results = []
+        for command in commands:
+            load_list = []
+            wall_list = []
+            heavy = []
+            for _ in range(param.rounds):
+                start = time.perf_counter()
+                res = subprocess.run(
+                    [sys.executable, "-c", PROBE, command],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    cwd=util.get_top_path(),
+                    env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+                    check=False,
+                    encoding="utf-8")
+                wall_list.append((time.perf_counter() - start) * 1000)
+                if res.returncode != 0:
+                    raise self.BenchError(f"load {command} faild:\n{res.stderr}")
+                probe = json.loads(res.stdout.strip().split('\n')[-1])
+                load_list.append(probe['load_ms'])
+                heavy = probe['heavy']
+            results.append({
+                'command': command,
+                'load_ms': round(statistics.median(load_list), 2),
+                'wall_ms': round(statistics.median(wall_list), 2),
+                'heavy': heavy})
+
+        print("==================== startup benchmark ====================")
+        print(f"{'command':<16}{'load(ms)':>10}{'wall(ms)':>10}  heavy imports")
+        for res in results:
+            print(f"{res['command']:<16}{res['load_ms']:>10}{res['wall_ms']:>10}  {','.join(res['heavy'])}")
+        print("===========================================================")
+
+        if param.output is not None:
+            with open(param.output, 'w', encoding='utf-8') as w_f:
+                w_f.write(json.dumps(results, indent=2))
+
+        if param.max_ms is not None:
+            slow_list = [res['command'] for res in results if res['load_ms'] > param.max_ms]
+            if len(slow_list) > 0:
+                raise self.BenchError(
+                    f"startup of {', '.join(slow_list)} is over {param.max_ms}ms")
+        return results
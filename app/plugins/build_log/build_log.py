@@ -0,0 +1,47 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import re
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app.buildlog import read_lines
+
+class BuildLog(Command):
+    '''
+    show the lines of the full bitbake log of a board
+    '''
+    def __init__(self):
+        super().__init__(
+            "build log",
+            "show the lines of the full bitbake log of a board",
+            """
+            show the lines of a zstd bitbake log written by cron, ci, the gate
+            or build_platform, from line -s on, -n lines of it, and only the
+            lines that match -g when it is given
+            """)
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-f', '--file', dest="file")
+        parser_addr.add_argument('-s', '--start', dest="start", type=int, default=0)
+        parser_addr.add_argument('-n', '--count', dest="count", type=int, default=None)
+        parser_addr.add_argument('-g', '--grep', dest="grep", default=None)
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        pattern = re.compile(args.grep) if args.grep is not None else None
+        for line_no, line in enumerate(read_lines(args.file, args.start, args.count), args.start):
+            if pattern is None:
+                print(line)
+            elif pattern.search(line) is not None:
+                print(f"{line_no}: {line}")
@@ -46,7 +46,12 @@ class BuildPlatform(Command):
         parser_addr.add_argument('-d', '--directory', dest="directory", default="build")
         parser_addr.add_argument('-s_in', '--sstate_cache_in', dest="sstate_cache_in", default=None)
         parser_addr.add_argument('-s_out', '--sstate_cache_out', dest="sstate_cache_out", default=None)
+        # copy only the objects the images need from the index cron writes next to sstate_cache_in
+        parser_addr.add_argument('-s_pre', '--sstate_prefetch', dest="sstate_prefetch", action="store_true")
         parser_addr.add_argument('-oe', '--oebuild_extra', dest="oebuild_extra", default=None)
+        # the sstate metrics of the build are recorded under the share dir for the branch
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
+        parser_addr.add_argument('-b', '--branch', dest="branch", default=None)
 
         return parser_addr
 
@@ -79,4 +84,7 @@ class BuildPlatform(Command):
             datetime=args.datetime,
             sstate_cache_in=args.sstate_cache_in,
             sstate_cache_out=args.sstate_cache_out,
-            oebuild_extra=args.oebuild_extra))
+            sstate_prefetch=args.sstate_prefetch,
+            oebuild_extra=args.oebuild_extra,
+            share_dir=args.share_dir,
+            branch=args.branch))
@@ -16,11 +16,17 @@ import subprocess
 
 from app.build import Build
 from app import util
+from app import trash
+from app.buildlog import BuildLog, get_log_path
+from app.sstate import SstateMetrics, find_index, get_task_sigs, prefetch
 
 
 NATIVE_SDK_DIR = "/opt/buildtools/nativesdk"
 GCC_DIR = "/usr1/openeuler/gcc"
 PRE_SOURCE_DIR = "/usr1/src"
+# the local sstate mirror of the objects prefetched from the index, it is
+# kept between the builds of the workspace
+SSTATE_PREFETCH_DIR = "sstate-prefetch"
 
 
 class Run(Build):
@@ -38,7 +44,7 @@ class Run(Build):
             # check if oebuild_workspace if oebuild workspace
             list_dir = os.listdir(oebuild_workspace)
             if ".oebuild" not in list_dir or "src" not in list_dir:
-                shutil.rmtree(oebuild_workspace)
+                trash.remove(oebuild_workspace)
                 check_init = True
         else:
             check_init = True
@@ -63,7 +69,7 @@ class Run(Build):
         # if exists build dir,delete it
         build_dir = os.path.join(oebuild_workspace, 'build', param.directory)
         if os.path.exists(build_dir):
-            shutil.rmtree(build_dir)
+            trash.remove(build_dir, top_dir=param.workspace)
         generate_cmd = f"oebuild generate\
             -p {param.platform}\
             -n {NATIVE_SDK_DIR}\
@@ -73,9 +79,22 @@ class Run(Build):
         if param.features is not None:
             for feature in [i.strip() for i in str(param.features).split(';')]:
                 generate_cmd = generate_cmd + f" -f {feature}"
+        # with an index the sstate mirror is a local dir of only what the images need
+        sstate_mirror = param.sstate_cache_in
+        index_path = None
+        if param.sstate_cache_in is not None and param.sstate_prefetch \
+            and os.path.isdir(param.sstate_cache_in):
+            index_path = find_index(param.sstate_cache_in)
+            if index_path is None:
+                print(f"[WARN]:no sstate index for {param.sstate_cache_in}, it is used as it is")
+            else:
+                sstate_mirror = os.path.join(param.workspace, SSTATE_PREFETCH_DIR)
+                if os.path.islink(sstate_mirror):
+                    os.remove(sstate_mirror)
+                os.makedirs(sstate_mirror, exist_ok=True)
         if param.sstate_cache_in is not None:
             if os.path.isdir(param.sstate_cache_in):
-                generate_cmd = generate_cmd + f" -s {param.sstate_cache_in}"
+                generate_cmd = generate_cmd + f" -s {sstate_mirror}"
             else:
                 print("[WARN]:Parameter sstate_cache_in was not successfully applied ")
         if param.sstate_cache_out is not None:
@@ -118,14 +137,19 @@ class Run(Build):
 
         print("======================== oebuild bitbake ==========================")
         image_list = [i.strip() for i in str(param.images).split(';')]
+        if index_path is not None:
+            self._prefetch_sstate(index_path, build_dir, image_list, sstate_mirror, param.sstate_cache_in)
         # run `oebuild bitbake openeuler-image`
         for image in image_list:
             print(f"==================== bitbake {param.directory}->{image} ======================")
+            metrics = SstateMetrics("build", param.branch, param.directory, image)
             with subprocess.Popen(
                         f"oebuild bitbake {image} -k",
                         shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                         cwd=build_dir,
-                        encoding="utf-8") as s_p:
+                        encoding="utf-8") as s_p, \
+                    BuildLog(get_log_path(os.path.join(build_dir, "logs"), param.directory, image)) \
+                        as build_log:
                 if s_p.returncode is not None and s_p.returncode != 0:
                     err_msg = ''
                     if s_p.stderr is not None:
@@ -137,16 +161,30 @@ class Run(Build):
                     res = s_p.poll()
                     if s_p.stdout is not None:
                         for line in s_p.stdout:
-                            print(line.strip('\n'))
+                            line = line.strip('\n')
+                            metrics.feed(line)
+                            build_log.feed(line)
                     if s_p.stderr is not None:
                         for line in s_p.stderr:
-                            print(line.strip('\n'))
+                            build_log.feed(line.strip('\n'))
                 s_p.wait()
+                build_log.close(res != 0)
+                metrics.save(res == 0, param.share_dir)
                 if res != 0:
                     raise self.BuildError("Build Error")
             print(f"============== bitbake {param.directory}->{image} successful =================")
         print("=========================oebuild finished==========================")
 
+    @staticmethod
+    def _prefetch_sstate(index_path, build_dir, image_list, sstate_mirror, sstate_cache_in):
+        try:
+            prefetch(index_path, get_task_sigs(build_dir, image_list), sstate_mirror)
+        except (ValueError, OSError) as e_p:
+            # the whole cache behind the same path, as without the index
+            print(f"[WARN]:sstate prefetch faild, use {sstate_cache_in} as it is: {e_p}")
+            shutil.rmtree(sstate_mirror)
+            os.symlink(os.path.abspath(sstate_cache_in), sstate_mirror)
+
     def _add_content_to_file(self, file_path, context):
         with open(file_path, 'r', encoding='utf-8') as r_f:
             data = r_f.read()
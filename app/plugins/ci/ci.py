@@ -12,16 +12,18 @@ See the Mulan PSL v2 for more details.
 from argparse import _SubParsersAction
 import os
 import subprocess
-import shutil
-import hashlib
 from io import StringIO
 import time
 
 import yaml
 
 from app import util
+from app import trash
 from app.command import Command
 from app.lib import Remote, Gitcode
+from app.scheduler import BoardScheduler
+from app.sstate import SstateMetrics
+from app.fingerprint import FingerprintStore, get_fingerprint, get_git_head, get_manifest_revisions
 from app import const
 
 GITCODE_YOCTO = "yocto-meta-openeuler"
@@ -43,6 +45,8 @@ class CI(Command):
         self.branch = None
         self.remote = None
         self.gitcode = None
+        self.share_dir = None
+        self.is_publish = False
 
         super().__init__(
             "ci", 
@@ -63,6 +67,13 @@ Periodically build the corresponding release image according to the relevant con
         parser_addr.add_argument('-gt', '--git_token', dest="git_token")
         parser_addr.add_argument('-sf', '--send_faild', dest = "is_send_faild", action = "store_true")
         parser_addr.add_argument('-dm', '--delete_tmp', dest = "is_delete_tmp", action = "store_true")
+        # the fingerprints of the last successful builds are kept under the share dir,
+        # the boards whose inputs did not change are skipped without -force
+        parser_addr.add_argument('-s', '--share_dir', dest = "share_dir", default=None)
+        parser_addr.add_argument('-force', '--force', dest = "is_force", action = "store_true")
+        # publish the outputs as dst_dir/<arch>/<board>/<date> and point latest to it,
+        # otherwise they replace the files of dst_dir/<arch>/<board>
+        parser_addr.add_argument('-publish', '--publish', dest = "is_publish", action = "store_true")
 
         return parser_addr
 
@@ -84,15 +95,21 @@ Periodically build the corresponding release image according to the relevant con
         self.exec(
             dst_dir=args.remote_dst_dir,
             is_delete_tmp=args.is_delete_tmp,
-            is_send_faild=args.is_send_faild)
+            is_send_faild=args.is_send_faild,
+            share_dir=args.share_dir,
+            is_force=args.is_force,
+            is_publish=args.is_publish)
 
-    def exec(self, dst_dir, is_delete_tmp, is_send_faild):
+    def exec(self, dst_dir, is_delete_tmp, is_send_faild, share_dir=None, is_force=False,
+             is_publish=False):
         '''
         the exec will be called by gate
         '''
+        self.share_dir = share_dir
+        self.is_publish = is_publish
         # first run oebuild init
         if os.path.exists(self.workspace):
-            shutil.rmtree(self.workspace)
+            trash.remove(self.workspace)
 
         os.chdir(os.path.dirname(self.workspace))
         cmd = f"oebuild init -b {self.branch} {os.path.basename(self.workspace)}"
@@ -123,12 +140,40 @@ Periodically build the corresponding release image according to the relevant con
             ci_conf_path = build_path_in_ci
         ci_conf = util.parse_yaml(ci_conf_path)
 
-        build_faild_list = []
+        # the layers are cloned at the versions of the manifest
+        yocto_dir = os.path.join(workspace_src_dir, GITCODE_YOCTO)
+        yocto_head = get_git_head(yocto_dir)
+        revisions = get_manifest_revisions(yocto_dir)
+        fingerprint_store = FingerprintStore("ci", self.branch, share_dir)
+        fingerprints = {}
+
+        # the boards are generated one by one and built at once, see BoardScheduler
+        scheduler = BoardScheduler(
+            log_dir=os.path.join(self.workspace, "logs"),
+            disk_dir=self.workspace)
         # third run oebuild generate
         for arch in ci_conf['build_list']:
             # set gcc toolchain directory
             toolchain_dir = os.path.join(GCC_DIR, arch['toolchain'])
             for board in arch['board']:
+                fingerprint = get_fingerprint({
+                    'yocto': yocto_head,
+                    'layers': revisions,
+                    'arch': arch['arch'],
+                    'toolchain': arch['toolchain'],
+                    'board': board,
+                    'dst_dir': dst_dir})
+                last_build = fingerprint_store.get_unchanged(board['directory'], fingerprint)
+                if last_build is not None and not is_force:
+                    print(f"skip {board['directory']}, its inputs did not change since the build of "
+                          f"{last_build['time']} ({fingerprint[:12]}), its publication is reused")
+                    continue
+                fingerprints[board['directory']] = fingerprint
+                # the board has no last successful build from here on, a failed
+                # or broken build changes its sstate and output
+                fingerprint_store.entries.pop(board['directory'], None)
+                fingerprint_store.save()
+
                 features = None
                 if "feature" in board and board['feature'] is not None and len(board['feature']) > 0:
                     features = ""
@@ -150,7 +195,6 @@ Periodically build the corresponding release image according to the relevant con
                 print(result)
 
                 # download layer with manifest
-                yocto_dir = os.path.join(workspace_src_dir, GITCODE_YOCTO)
                 compile_path = os.path.join(
                     self.workspace,
                     'build',
@@ -185,57 +229,16 @@ Periodically build the corresponding release image according to the relevant con
                 compile_conf['local_conf'] = local_conf
                 util.write_yaml(compile_path, compile_conf)
 
-                # run `oebuild bitbake openeuler-image`
-                print(f"========================={board['directory']}==========================")
-                for bitbake in board['bitbake']:
-                    with subprocess.Popen(f"oebuild bitbake {bitbake['target']}",
-                                    shell=True,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT,
-                                    cwd=os.path.join(self.workspace, 'build', board['directory']),
-                                    encoding="utf-8") as s_p:
-                        last_line = ""
-                        for line in s_p.stdout:
-                            line = line.strip('\n')
-                            last_line = line
-                            print(line)
-                        s_p.wait()
-                        if last_line.find("returning a non-zero exit code.") != -1:
-                            print(f"build {board['directory']}->{bitbake['target']} faild")
-                            build_faild = {
-                                'arch': arch['arch'],
-                                'directory': board['directory'],
-                                'generate': generate_cmd,
-                                'bitbake': bitbake['target']
-                            }
-                            build_faild_list.append(build_faild)
-                            continue
-                        # upload output
-                        print(f"build {board['directory']}->{bitbake['target']} successful")
-
-                # because tmp directory use large space so support a param to delete it
-                # when build finished
-                tmp_dir = os.path.join(self.workspace, 'build', board['directory'], 'tmp')
-                if is_delete_tmp and os.path.exists(tmp_dir):
-                    shutil.rmtree(tmp_dir)
-
-                output_dir = os.path.join(self.workspace, 'build', board['directory'], 'output')
-                if not os.path.exists(output_dir):
-                    continue
-                os.chdir(output_dir)
-                # add sha256sum to every output file
-                self._add_sum_to_local_dir(local_dir=output_dir)
-
-                # put local_file to remote_dir
-                put_dst_dir = os.path.join(dst_dir, arch['arch'], board['directory'])
-                print("put local build files to remote path")
-                dir_list = os.listdir(output_dir)
-                for timestamp_dir in dir_list:
-                    local_dir = os.path.join(output_dir, timestamp_dir)
-                    self.remote.put_to_remote(
-                        local_dir=local_dir,
-                        dst_dir=put_dst_dir,
-                        is_delete_dst=True)
+                scheduler.add(
+                    board['directory'], self._build_board, arch, board, generate_cmd, dst_dir,
+                    is_delete_tmp)
+
+        build_faild_list = []
+        for job in scheduler.run():
+            build_faild_list.extend(job.result)
+            if len(job.result) == 0:
+                fingerprint_store.put(job.name, fingerprints[job.name])
+        fingerprint_store.save()
 
         # send build faild msg to issue
         if is_send_faild:
@@ -255,6 +258,76 @@ Periodically build the corresponding release image according to the relevant con
             raise ValueError("build project bas error")
         print("========================================================")
 
+    def _build_board(self, job, arch, board, generate_cmd, dst_dir, is_delete_tmp):
+        build_dir = os.path.join(self.workspace, 'build', board['directory'])
+        job.set_compile_threads(os.path.join(build_dir, 'compile.yaml'))
+        build_faild_list = []
+        # run `oebuild bitbake openeuler-image`
+        job.write(f"========================={board['directory']}==========================")
+        for bitbake in board['bitbake']:
+            metrics = SstateMetrics("ci", self.branch, board['directory'], bitbake['target'])
+            with subprocess.Popen(f"oebuild bitbake {bitbake['target']}",
+                            shell=True,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT,
+                            cwd=build_dir,
+                            encoding="utf-8") as s_p, job.open_build_log(bitbake['target']) as build_log:
+                last_line = ""
+                for line in s_p.stdout:
+                    line = line.strip('\n')
+                    last_line = line
+                    metrics.feed(line)
+                    build_log.feed(line)
+                s_p.wait()
+                is_faild = last_line.find("returning a non-zero exit code.") != -1
+                build_log.close(is_faild)
+                metrics.save(not is_faild, self.share_dir)
+                if is_faild:
+                    job.write(f"build {board['directory']}->{bitbake['target']} faild")
+                    build_faild = {
+                        'arch': arch['arch'],
+                        'directory': board['directory'],
+                        'generate': generate_cmd,
+                        'bitbake': bitbake['target']
+                    }
+                    build_faild_list.append(build_faild)
+                    continue
+                # upload output
+                job.write(f"build {board['directory']}->{bitbake['target']} successful")
+
+        # because tmp directory use large space so support a param to delete it
+        # when build finished
+        tmp_dir = os.path.join(build_dir, 'tmp')
+        if is_delete_tmp and os.path.exists(tmp_dir):
+            trash.remove(tmp_dir, is_sync=True)
+
+        output_dir = os.path.join(build_dir, 'output')
+        if not os.path.exists(output_dir):
+            return build_faild_list
+
+        # put local_file to remote_dir, or publish it to remote_dir/latest
+        # where the unchanged files are hardlinked to the previous
+        # publication, the sha256sum of every output file is made from the
+        # data sent
+        put_dst_dir = os.path.join(dst_dir, arch['arch'], board['directory'])
+        job.write("put local build files to remote path")
+        dir_list = os.listdir(output_dir)
+        for timestamp_dir in dir_list:
+            local_dir = os.path.join(output_dir, timestamp_dir)
+            if self.is_publish:
+                self.remote.publish_to_remote(
+                    local_dir=local_dir,
+                    dst_dir=put_dst_dir,
+                    is_sign=True)
+            else:
+                self.remote.put_to_remote(
+                    local_dir=local_dir,
+                    dst_dir=put_dst_dir,
+                    is_delete_dst=True,
+                    is_delta=True,
+                    is_sign=True)
+        return build_faild_list
+
     def _generate_upload_manifest(self, dst_dir):
         print("=================generate manifest========================")
         source_list_dir = "source_list"
@@ -271,29 +344,13 @@ Periodically build the corresponding release image according to the relevant con
         print("=================generate manifest========================")
 
         local_dir = os.path.join(self.workspace, source_list_dir)
-        self._add_sum_to_local_dir(local_dir = local_dir)
         put_dst_dir = os.path.join(dst_dir, source_list_dir)
         self.remote.put_to_remote(
             local_dir=local_dir,
             dst_dir=put_dst_dir,
-            is_delete_dst=True)
-
-    def _add_sum_to_local_dir(self, local_dir):
-        file_list = os.listdir(local_dir)
-        for file_name in file_list:
-            file_path = os.path.join(local_dir, file_name)
-            if os.path.isdir(file_path):
-                self._add_sum_to_local_dir(file_path)
-            else:
-                sha256 = hashlib.sha256()
-                with open(file_path, 'rb') as r_f:
-                    while True:
-                        data = r_f.read(1024)
-                        if not data:
-                            break
-                        sha256.update(data)
-                    with open(f'{file_path}.sha256sum', 'w', encoding="utf-8") as w_f:
-                        w_f.write(f"{str(sha256.hexdigest())} {file_name}")
+            is_delete_dst=True,
+            is_delta=True,
+            is_sign=True)
 
     def send_issue_with_build_faild(self, build_faild_list):
         '''
@@ -40,6 +40,7 @@ class CodeCheck(Command):
         parser_addr.add_argument('-gt', '--git_token', dest="git_token", default=None)
         parser_addr.add_argument('-pr', '--pr_num', dest="pr_num", default=None)
         parser_addr.add_argument('-dfs', '--diff_files', dest="diff_files", default=None)
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
 
         return parser_addr
 
@@ -47,7 +48,7 @@ class CodeCheck(Command):
         args = self.parser.parse_args(unknow)
         self.pr_num = args.pr_num
         self.repo = args.repo
-        self.gitcode = Gitcode(owner=args.owner, repo=args.repo, token=args.git_token)
+        self.gitcode = Gitcode(owner=args.owner, repo=args.repo, token=args.git_token, share_dir=args.share_dir)
 
         #check build_code
         if args.check_code is not None and not os.path.isdir(args.check_code):
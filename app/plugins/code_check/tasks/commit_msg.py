@@ -11,7 +11,6 @@ See the Mulan PSL v2 for more details.
 '''
 import os
 import subprocess
-import json
 
 from app import util
 from app.build import Check
@@ -22,7 +21,7 @@ class Run(Check):
     '''
     def do_check(self, param):
         gitcode = param.gitcode
-        commit_hash_list = json.loads(gitcode.get_pr_commits(param.pr_num))
+        commit_hash_list = gitcode.list_pr_commits(param.pr_num)
 
         os.chdir(param.check_code)
         #select config to use
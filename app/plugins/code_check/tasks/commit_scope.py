@@ -20,16 +20,18 @@ class Run(Check):
     def do_check(self, param):
         gitcode = param.gitcode
         #get commits in a pr
-        commit_hash_list = json.loads(gitcode.get_pr_commits(param.pr_num))
+        commit_hash_list = gitcode.list_pr_commits(param.pr_num)
         if len(commit_hash_list) == 0:
             print("In a pull request, no files have been deleted, added, or modified. \
                     Please commit something.")
             raise ValueError("no commit files")
 
         check_success = True
-        for commit in commit_hash_list:
+        # fetch the info of all commits concurrently, the order is kept
+        commit_info_list = gitcode.get_commits_info([commit["sha"] for commit in commit_hash_list])
+        for commit, commit_info_data in zip(commit_hash_list, commit_info_list):
             #get all filename in a commit
-            commit_info = json.loads(gitcode.get_a_commit_info(commit["sha"]))
+            commit_info = json.loads(commit_info_data)
             filename_list = [commit_files["filename"] for commit_files in commit_info["files"]]
             if len(filename_list) == 0:
                 print("In a pull request, no files have been deleted, added, or modified. \
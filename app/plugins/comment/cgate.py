@@ -13,6 +13,7 @@ import os
 
 from app.plugins.comment.interface import CommendParam
 from app.lib import Gitcode, Result
+from app.outbox import Outbox
 from app.const import PROCESS_LABEL, SUCCESS_LABEL, FAILED_LABEL
 from app import util
 
@@ -31,12 +32,16 @@ class CGate:
             repo: str,
             owner: str,
             git_token: str,
-            duration: str):
+            duration: str,
+            share_dir: str = None):
         '''
         gate run body
         '''
         if git_token != "":
-            gitcode = Gitcode(owner=owner,repo=repo,token=git_token)
+            # the mutations are sent in background by the outbox
+            gitcode = Outbox(
+                forge=Gitcode(owner=owner,repo=repo,token=git_token,share_dir=share_dir),
+                share_dir=share_dir)
         else:
             gitcode = None
 
@@ -55,7 +60,7 @@ class CGate:
                               final_res=final_res,
                               duration=duration)
 
-    def send_check_table(self, check_list:list, pr_num, gitcode:Gitcode, final_res:bool, duration:str): 
+    def send_check_table(self, check_list:list, pr_num, gitcode:Outbox, final_res:bool, duration:str): 
         '''
         xxx
         '''
@@ -86,10 +91,10 @@ class CGate:
         html = util.json_to_html(json_data={caption: table}, direc="TOP_TO_BOTTOM")
         gitcode.comment_pr(pr_num=pr_num, comment=html)
 
-    def _set_success_label(self, pr_num, gitcode: Gitcode):
+    def _set_success_label(self, pr_num, gitcode: Outbox):
         gitcode.delete_tags_of_pr(pr_num, PROCESS_LABEL, FAILED_LABEL)
         gitcode.add_tags_of_pr(pr_num, SUCCESS_LABEL)
 
-    def _set_failed_label(self, pr_num, gitcode: Gitcode):
+    def _set_failed_label(self, pr_num, gitcode: Outbox):
         gitcode.delete_tags_of_pr(pr_num, PROCESS_LABEL, SUCCESS_LABEL)
         gitcode.add_tags_of_pr(pr_num, FAILED_LABEL)
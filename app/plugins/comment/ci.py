@@ -13,6 +13,7 @@ import os
 import time
 
 from app.lib import Gitcode, Result
+from app.outbox import Outbox
 from app.plugins.comment.interface import CommendParam
 from app import util
 
@@ -30,14 +31,18 @@ class CCI:
             repo: str,
             owner: str,
             git_token: str,
-            branch: str):
+            branch: str,
+            share_dir: str = None):
         '''
         asfdads
         '''
         if len(check_list) <= 0:
             pass
         if git_token != "":
-            gitcode = Gitcode(owner=owner,repo=repo,token=git_token)
+            # the mutations are sent in background by the outbox
+            gitcode = Outbox(
+                forge=Gitcode(owner=owner,repo=repo,token=git_token,share_dir=share_dir),
+                share_dir=share_dir)
         else:
             gitcode = None
 
@@ -49,7 +54,7 @@ class CCI:
         if not final_res:
             self.send_faild_issue(check_list=check_list, gitcode=gitcode, branch=branch)
 
-    def send_faild_issue(self, check_list: list, gitcode: Gitcode, branch: str):
+    def send_faild_issue(self, check_list: list, gitcode: Outbox, branch: str):
         '''
         xxx
         '''
@@ -41,6 +41,7 @@ class Comment(Command):
         parser_addr.add_argument('-pr', '--pr_num', dest="pr_num")
         parser_addr.add_argument('-b', '--branch', dest="branch")
         parser_addr.add_argument('-chk', '--checks', dest='checks', action='append')
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
 
         return parser_addr
 
@@ -63,6 +64,7 @@ class Comment(Command):
                     repo=args.repo,
                     owner=args.owner,
                     git_token=args.git_token,
+                    share_dir=args.share_dir,
                     duration = duration_str)
         if args.method == "ci":
             cls = CCI()
@@ -70,6 +72,7 @@ class Comment(Command):
                     repo=args.repo,
                     owner=args.owner,
                     git_token=args.git_token,
+                    share_dir=args.share_dir,
                     branch=args.branch)
         if args.method == "release":
             cls = Release()
@@ -77,7 +80,8 @@ class Comment(Command):
                     pr_num=args.pr_num,
                     repo=args.repo,
                     owner=args.owner,
-                    git_token=args.git_token)
+                    git_token=args.git_token,
+                    share_dir=args.share_dir)
 
     def format_time(self, duration_time)->str:
         '''
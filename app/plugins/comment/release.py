@@ -13,6 +13,7 @@ import os
 
 from app.plugins.comment.interface import CommendParam
 from app.lib import Gitcode, Result
+from app.outbox import Outbox
 from app.const import RELEASE_SUCCESS, RELEASE_FAILED
 from app import util
 
@@ -30,12 +31,16 @@ class Release:
             pr_num: int,
             repo: str,
             owner: str,
-            git_token: str):
+            git_token: str,
+            share_dir: str = None):
         '''
         gate run body
         '''
         if git_token != "":
-            gitcode = Gitcode(owner=owner,repo=repo,token=git_token)
+            # the mutations are sent in background by the outbox
+            gitcode = Outbox(
+                forge=Gitcode(owner=owner,repo=repo,token=git_token,share_dir=share_dir),
+                share_dir=share_dir)
         else:
             gitcode = None
 
@@ -53,7 +58,7 @@ class Release:
                               gitcode=gitcode,
                               final_res=final_res)
 
-    def send_check_table(self, check_list:list, pr_num, gitcode:Gitcode, final_res:bool):
+    def send_check_table(self, check_list:list, pr_num, gitcode:Outbox, final_res:bool):
         '''
         发送检查结果表格
         '''
@@ -81,10 +86,10 @@ class Release:
         html = util.json_to_html(json_data={caption: table}, direc="TOP_TO_BOTTOM")
         gitcode.comment_pr(pr_num=pr_num, comment=html)
 
-    def _set_success_label(self, pr_num, gitcode: Gitcode):
+    def _set_success_label(self, pr_num, gitcode: Outbox):
         gitcode.delete_tags_of_pr(pr_num, RELEASE_FAILED)
         gitcode.add_tags_of_pr(pr_num, RELEASE_SUCCESS)
 
-    def _set_failed_label(self, pr_num, gitcode: Gitcode):
+    def _set_failed_label(self, pr_num, gitcode: Outbox):
         gitcode.delete_tags_of_pr(pr_num, RELEASE_SUCCESS)
         gitcode.add_tags_of_pr(pr_num, RELEASE_FAILED)
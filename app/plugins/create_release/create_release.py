@@ -29,6 +29,12 @@ except ImportError:
 from app.command import Command
 
 API_BASE = "https://api.gitcode.com/api/v5/repos"
+# the same variable as app.lib.Gitcode, it points the requests to a local stub
+API_BASE_ENV = "EMBEDDED_CI_GITCODE_API"
+
+
+def get_api_base():
+    return os.environ.get(API_BASE_ENV, "").rstrip('/') or API_BASE
 
 
 class CreateRelease(Command):
@@ -92,7 +98,7 @@ def read_yaml(yaml_dir: pathlib.Path):
 
 
 def create_release(access_token, json_data):
-    create_url = f'{API_BASE}/{json_data["owner"]}/{json_data["repo"]}/releases'
+    create_url = f'{get_api_base()}/{json_data["owner"]}/{json_data["repo"]}/releases'
     params = {"access_token": access_token}
     headers = {"Content-Type": "application/json"}
     res = requests.post(create_url, headers=headers, json=json_data, params=params)
@@ -106,7 +112,7 @@ def update_release(access_token, json_data):
         sys.exit(1)
     owner = json_data["owner"]
     repo = json_data["repo"]
-    update_url = f'{API_BASE}/{owner}/{repo}/releases/{tag}'
+    update_url = f'{get_api_base()}/{owner}/{repo}/releases/{tag}'
     params = {"access_token": access_token}
     body = {
         "name": json_data.get("name", ""),
@@ -123,7 +129,7 @@ def get_release_by_tag(access_token, json_data):
         logging.error(f'get release by tag failed: tag is empty')
         sys.exit(1)
     owner = json_data["owner"]
-    url = f'{API_BASE}/{owner}/{repo}/releases/{tag}'
+    url = f'{get_api_base()}/{owner}/{repo}/releases/{tag}'
     params = {"access_token": access_token}
     res = requests.get(url, params=params)
     if res.status_code != 200:
@@ -132,7 +138,7 @@ def get_release_by_tag(access_token, json_data):
     return res.json()
 
 def get_upload_url(access_token, owner, repo, tag, file_name):
-    url = f'{API_BASE}/{owner}/{repo}/releases/{tag}/upload_url'
+    url = f'{get_api_base()}/{owner}/{repo}/releases/{tag}/upload_url'
     params = {"access_token": access_token, "file_name": file_name}
     res = requests.get(url, params=params)
     if res.status_code != 200:
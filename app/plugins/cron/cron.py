@@ -14,16 +14,19 @@ import os
 import subprocess
 import logging
 from argparse import _SubParsersAction
-import shutil
 import time
 from io import StringIO
 
 import yaml
 
 from app import util
+from app import trash
 from app.command import Command
 from app import const
 from app.lib import Gitee
+from app.scheduler import BoardScheduler
+from app.fingerprint import FingerprintStore, get_fingerprint, get_remote_revisions
+from app.sstate import SstateGc, SstateMetrics, SSTATE_DIR_NAME, get_sstate_dirs, write_index
 
 log = logging.getLogger()
 
@@ -34,6 +37,7 @@ class Cron(Command):
     def __init__(self):
         self.gitee = None
         self.branch = None
+        self.share_dir = None
         super().__init__(
         "cron", 
         "this is a CI timed task", 
@@ -51,6 +55,10 @@ class Cron(Command):
         parser_addr.add_argument('-p', '--repo', dest = "repo")
         parser_addr.add_argument('-gt', '--gitee_token', dest = "gitee_token")
         parser_addr.add_argument('-sf', '--send_faild', dest = "is_send_faild", action = "store_true")
+        # keep the sstate-cache and trim it with sstate gc instead of deleting it
+        parser_addr.add_argument('-gc', '--sstate_gc', dest = "is_sstate_gc", action = "store_true")
+        # build the boards whose inputs did not change since their last successful build
+        parser_addr.add_argument('-force', '--force', dest = "is_force", action = "store_true")
 
         return parser_addr
 
@@ -62,6 +70,7 @@ class Cron(Command):
         workspace = os.path.join(cron_workspace, f"openeuler_{args.branch}")
 
         self.branch = args.branch
+        self.share_dir = args.share_dir
 
         if not os.path.exists(args.tmp_dir):
             os.makedirs(args.tmp_dir)
@@ -73,9 +82,12 @@ class Cron(Command):
                   branch = args.branch,
                   cron_tmp_dir = args.tmp_dir,
                   is_delete_tmp = args.is_delete_tmp,
-                  is_send_faild = args.is_send_faild)
+                  is_send_faild = args.is_send_faild,
+                  is_sstate_gc = args.is_sstate_gc,
+                  is_force = args.is_force)
 
-    def exec(self, workspace, branch, cron_tmp_dir, is_delete_tmp, is_send_faild):
+    def exec(self, workspace, branch, cron_tmp_dir, is_delete_tmp, is_send_faild,
+             is_sstate_gc=False, is_force=False):
         '''
         the exec will be called by gate
         '''
@@ -108,18 +120,44 @@ class Cron(Command):
         conf_dir = util.get_conf_path()
         cron_conf = util.parse_yaml(os.path.join(conf_dir, const.CRON_CONF))
 
-        err_list = []
-        build_faild_list = []
+        # the builds without a manifest float on the branches of the layers,
+        # the layers in src are only moved to their remote heads by the builds
+        revisions = get_remote_revisions(os.path.join(workspace, "src"))
+        if revisions is None:
+            print("[WARN]: get the remote heads of the layers faild, build all boards")
+            is_force = True
+        fingerprint_store = FingerprintStore("cron", branch, self.share_dir)
+        fingerprints = {}
+
+        # the boards are generated one by one and built at once, see BoardScheduler
+        scheduler = BoardScheduler(log_dir=os.path.join(workspace, "logs"), disk_dir=cron_tmp_dir)
         # third run oebuild generate
         for arch in cron_conf['build_list']:
             # set gcc toolchain directory
             toolchain_dir = os.path.join(const.GCC_DIR, arch['toolchain'])
             for board in arch['board']:
+                fingerprint = get_fingerprint({
+                    'layers': revisions,
+                    'arch': arch['arch'],
+                    'toolchain': arch['toolchain'],
+                    'board': board})
+                last_build = fingerprint_store.get_unchanged(board['directory'], fingerprint)
+                if last_build is not None and not is_force:
+                    print(f"skip {board['directory']}, its inputs did not change since the build of "
+                          f"{last_build['time']} ({fingerprint[:12]}), reuse it")
+                    continue
+                fingerprints[board['directory']] = fingerprint
+                # the board has no last successful build from here on, a failed
+                # or broken build changes its sstate and output
+                fingerprint_store.entries.pop(board['directory'], None)
+                fingerprint_store.save()
+
                 # delete build cache
                 print(f"delete {board['directory']} cache")
                 self._delete_build_cache(
                     build_dir=os.path.join(workspace, 'build',board['directory']),
-                    board_conf=board)
+                    board_conf=board,
+                    is_sstate_gc=is_sstate_gc)
 
                 features = None
                 if "feature" in board and board['feature'] is not None and len(board['feature']) > 0:
@@ -142,40 +180,25 @@ class Cron(Command):
                 if err_code != 0:
                     raise ValueError(result)
                 print(result)
+                scheduler.add(
+                    board['directory'], self._build_board, workspace, arch, board, generate_cmd,
+                    tmp_dir, is_delete_tmp)
 
-                # run `oebuild bitbake openeuler-image`
-                print(f"========================={board['directory']}==========================")
-                for bitbake in board['bitbake']:
-                    with subprocess.Popen(f"oebuild bitbake {bitbake['target']}",
-                                    shell=True,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT,
-                                    cwd=os.path.join(workspace, 'build', board['directory']),
-                                    encoding="utf-8") as s_p:
-                        last_line = ""
-                        for line in s_p.stdout:
-                            line = line.strip('\n')
-                            last_line = line
-                            print(line)
-                        s_p.wait()
-                        print("====================================================")
-                        if last_line.find("returning a non-zero exit code.") != -1:
-                            err_msg = rf"build {board['directory']}->{bitbake['target']} faild"
-                            err_list.append(err_msg)
-                            print(err_msg)
-                            build_faild = {
-                                'arch': arch['arch'],
-                                'directory': board['directory'],
-                                'generate': generate_cmd,
-                                'bitbake': bitbake['target']
-                            }
-                            build_faild_list.append(build_faild)
-                        else:
-                            print(f"bitbake {board['directory']}->{bitbake['target']} successful")
-                # because tmp directory use large space so support a param to delete it
-                # when build finished
-                if is_delete_tmp:
-                    shutil.rmtree(tmp_dir)
+        err_list = []
+        build_faild_list = []
+        for job in scheduler.run():
+            for build_faild in job.result:
+                err_list.append(rf"build {build_faild['directory']}->{build_faild['bitbake']} faild")
+                build_faild_list.append(build_faild)
+            if len(job.result) == 0:
+                fingerprint_store.put(job.name, fingerprints[job.name])
+        fingerprint_store.save()
+
+        # the objects of this run are the most recently used, they stay
+        if is_sstate_gc:
+            SstateGc().collect(get_sstate_dirs(workspace))
+        # the gate and ci builds prefetch the objects they need with the index
+        write_index(workspace, get_sstate_dirs(workspace))
 
         if len(err_list) > 0:
             for err_msg in err_list:
@@ -187,7 +210,49 @@ class Cron(Command):
         if is_send_faild:
             self.send_issue_with_build_faild(build_faild_list)
 
-    def _delete_build_cache(self, build_dir, board_conf):
+    def _build_board(self, job, workspace, arch, board, generate_cmd, tmp_dir, is_delete_tmp):
+        build_dir = os.path.join(workspace, 'build', board['directory'])
+        job.set_compile_threads(os.path.join(build_dir, 'compile.yaml'))
+        build_faild_list = []
+        # run `oebuild bitbake openeuler-image`
+        job.write(f"========================={board['directory']}==========================")
+        for bitbake in board['bitbake']:
+            metrics = SstateMetrics("cron", self.branch, board['directory'], bitbake['target'])
+            with subprocess.Popen(f"oebuild bitbake {bitbake['target']}",
+                            shell=True,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT,
+                            cwd=build_dir,
+                            encoding="utf-8") as s_p, job.open_build_log(bitbake['target']) as build_log:
+                last_line = ""
+                for line in s_p.stdout:
+                    line = line.strip('\n')
+                    last_line = line
+                    metrics.feed(line)
+                    build_log.feed(line)
+                s_p.wait()
+                is_faild = last_line.find("returning a non-zero exit code.") != -1
+                build_log.close(is_faild)
+                job.write("====================================================")
+                metrics.save(not is_faild, self.share_dir)
+                if is_faild:
+                    job.write(rf"build {board['directory']}->{bitbake['target']} faild")
+                    build_faild = {
+                        'arch': arch['arch'],
+                        'directory': board['directory'],
+                        'generate': generate_cmd,
+                        'bitbake': bitbake['target']
+                    }
+                    build_faild_list.append(build_faild)
+                else:
+                    job.write(f"bitbake {board['directory']}->{bitbake['target']} successful")
+        # because tmp directory use large space so support a param to delete it
+        # when build finished
+        if is_delete_tmp:
+            trash.remove(tmp_dir, is_sync=True)
+        return build_faild_list
+
+    def _delete_build_cache(self, build_dir, board_conf, is_sstate_gc=False):
         if not os.path.exists(build_dir):
             return
 
@@ -201,9 +266,11 @@ class Cron(Command):
 
         delete_split = delete_cache.split('|')
         for delete_name in delete_split:
+            if is_sstate_gc and delete_name.strip() == SSTATE_DIR_NAME:
+                continue
             delete_dir = os.path.join(build_dir, delete_name)
             if os.path.exists(delete_dir):
-                shutil.rmtree(delete_dir)
+                trash.remove(delete_dir, is_sync=True)
                 print(f"delete {delete_dir} successful")
 
     def send_issue_with_build_faild(self, build_faild_list):
@@ -0,0 +1,102 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import json
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app.lib import Remote
+from app import transfer, checksum
+
+class DiffManifest(Command):
+    '''
+    compare two trees by their merkle manifests, a tree is a local
+    directory, a manifest file or a remote directory put in delta mode or
+    published
+    '''
+    def __init__(self):
+        super().__init__(
+            "diff manifest",
+            "compare two trees by their manifests",
+            """
+            compare two trees by their manifests and print the files added(A),
+            removed(D) and modified(M) from -a to -b, the subtrees with the same
+            hash on both sides are skipped. With -o the manifest of the local
+            directory -b is written instead
+            """)
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-a', '--old', dest="old", default=None)
+        parser_addr.add_argument('-b', '--new', dest="new", default=None)
+        # -a or -b is a directory on the remote
+        parser_addr.add_argument('-ra', '--remote_old', dest="remote_old", action="store_true")
+        parser_addr.add_argument('-rb', '--remote_new', dest="remote_new", action="store_true")
+        parser_addr.add_argument('-i', '--remote_ip', dest="remote_ip", default=None)
+        parser_addr.add_argument('-p', '--remote_port', dest="remote_port", default="22")
+        parser_addr.add_argument('-u', '--remote_user', dest="remote_user", default=None)
+        parser_addr.add_argument('-w', '--remote_pwd', dest="remote_pwd", default=None)
+        parser_addr.add_argument('-k', '--remote_sshkey', dest="remote_sshkey", default=None)
+        parser_addr.add_argument('-o', '--output_manifest', dest="output_manifest", default=None)
+        parser_addr.add_argument('-out', '--output', dest="output", default=None)
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        if args.output_manifest is not None:
+            if args.new is None or not os.path.isdir(args.new):
+                raise ValueError("-o needs the local directory -b")
+            manifest = self._get_manifest(args, args.new, False)
+            with open(args.output_manifest, 'w', encoding="utf-8") as w_f:
+                w_f.write(manifest.dumps())
+            print(f"wrote the manifest of {len(manifest.files)} files to {args.output_manifest}")
+            return
+        if args.old is None or args.new is None:
+            raise ValueError("-a and -b are both needed")
+        old_manifest = self._get_manifest(args, args.old, args.remote_old)
+        new_manifest = self._get_manifest(args, args.new, args.remote_new)
+        diff = new_manifest.diff(old_manifest)
+        lines = [f"A {rel_path}" for rel_path in diff.added]
+        lines.extend(f"D {rel_path}" for rel_path in diff.removed)
+        lines.extend(f"M {rel_path}" for rel_path in diff.changed)
+        for line in sorted(lines, key=lambda line: line[2:]):
+            print(line)
+        print(f"{len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} modified, "
+              f"{diff.dirs_compared} of {len(new_manifest.dirs)} directories compared")
+        if args.output is not None:
+            with open(args.output, 'w', encoding="utf-8") as w_f:
+                w_f.write(json.dumps({
+                    'added': diff.added,
+                    'removed': diff.removed,
+                    'changed': diff.changed}, indent=2))
+
+    @staticmethod
+    def _get_manifest(args, path, is_remote):
+        if is_remote:
+            if args.remote_ip is None:
+                raise ValueError("a remote tree needs -i")
+            remote = Remote(args.remote_ip, args.remote_port, args.remote_user, args.remote_pwd,
+                            args.remote_sshkey)
+            manifest = remote.get_manifest(path)
+            if manifest is None:
+                raise IOError(f"connect to {args.remote_ip} faild")
+            return manifest
+        if os.path.isfile(path):
+            with open(path, 'r', encoding="utf-8") as r_f:
+                return transfer.Manifest.loads(r_f.read())
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"the {path} not exists")
+        # the checksum files and the manifest itself are not in a manifest
+        paths = [file_path for file_path, _ in checksum.iter_files(path)
+                 if not checksum.is_sum_file(file_path)
+                 and os.path.basename(file_path) != transfer.MANIFEST_NAME]
+        return transfer.Manifest.from_local(path, paths)
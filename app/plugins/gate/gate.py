@@ -21,6 +21,7 @@ import yaml
 
 from app.command import Command
 from app.lib import Gitcode, Jenkins, Result
+from app.outbox import Outbox
 from app import util
 from app.build import Build,BuildRes,BuildParam
 
@@ -31,6 +32,7 @@ class Gate(Command):
     def __init__(self):
         self.jenkins = None
         self.gitcode = None
+        self.outbox = None
         self.workspace = "/home/jenkins/agent"
         self.gate_share = None
         self.share_dir = None
@@ -64,7 +66,10 @@ class Gate(Command):
         self.branch = args.branch
         self.pr_num = args.pr_num
 
-        self.gitcode = Gitcode(owner=args.owner, repo=args.repo, token=args.git_token)
+        self.gitcode = Gitcode(owner=args.owner, repo=args.repo, token=args.git_token, share_dir=args.share_dir)
+        # the comments and labels are sent in background, so the gate never
+        # waits on the forge
+        self.outbox = Outbox(forge=self.gitcode, share_dir=args.share_dir)
         if not args.is_test:
             self.jenkins = Jenkins(jenkins_user=args.jenkins_user, jenkins_token=args.jenkins_pwd)
         self.repo = args.repo
@@ -80,7 +85,7 @@ class Gate(Command):
         if not is_test:
             build_url = os.path.join(os.environ['BUILD_URL'], 'console')
         comment = f"the gate is running, if you want to get message immediately, please click <a href='{build_url}'>here</a> for detail"
-        self.gitcode.comment_pr(pr_num=pr_num, comment=comment)
+        self.outbox.comment_pr(pr_num=pr_num, comment=comment)
 
     def exec(self,owner,pr_num,is_test):
         '''
@@ -97,12 +102,11 @@ class Gate(Command):
         # send user gate link when task is starting
         self.send_build_link(pr_num=pr_num, is_test=is_test)
         # delete ci_progress tag in gitcode
-        self.gitcode.delete_tags_of_pr(pr_num, "ci_successful", "ci_failed")
-        self.gitcode.add_tags_of_pr(pr_num, 'ci_processing')
+        self.outbox.delete_tags_of_pr(pr_num, "ci_successful", "ci_failed")
+        self.outbox.add_tags_of_pr(pr_num, 'ci_processing')
 
         # first get pr commit list, and then clone pr with depth = len(commit)
-        commit_data = self.gitcode.get_pr_commits(pr_num=pr_num)
-        commit_list = json.loads(commit_data)
+        commit_list = self.gitcode.list_pr_commits(pr_num=pr_num)
         commit_hash_list = self._get_hash_from_commit(commit_list=commit_list)
 
         print(f"=============clone with pr {pr_num} ===========================")
@@ -119,9 +123,8 @@ class Gate(Command):
 
 
         #determine whether to ask for document build
-        commits_files_data = self.gitcode.get_commits_files(pr_num)
-        commit_files_list = json.loads(commits_files_data)
-        commit_files_list = self.gitcode.filter_delete_commit_files(commit_files_list)
+        commit_files_list = self.gitcode.filter_delete_commit_files(
+            self.gitcode.list_pr_files(pr_num))
         # clone repo
         print("======================execute code check================================")
         code_check_res = self.code_check(repo_dir, commit_hash_list)
@@ -188,7 +191,7 @@ class Gate(Command):
 
     def send_result(self, pr_num, code_check_list, doc_check_list, build_check_list:BuildRes, is_test: bool):
         '''
-        format result to html table and send to gitcode comment
+        format result to html table and queue it as gitcode comment
         '''
         def format_code_check_list(code_check_list):
             format_code_check = {}
@@ -242,14 +245,14 @@ class Gate(Command):
         if not is_test:
             build_url = os.path.join(os.environ['BUILD_URL'], 'console')
         comment = comment + f"Please click <a href='{build_url}'>here</a> for details"
-        self.gitcode.comment_pr(pr_num=pr_num, comment=comment)
+        self.outbox.comment_pr(pr_num=pr_num, comment=comment)
 
         # send check result tag to gitcode
-        self.gitcode.delete_tags_of_pr(pr_num, 'ci_processing')
+        self.outbox.delete_tags_of_pr(pr_num, 'ci_processing')
         if final_res is Result().success:
-            self.gitcode.add_tags_of_pr(pr_num, 'ci_successful')
+            self.outbox.add_tags_of_pr(pr_num, 'ci_successful')
         else:
-            self.gitcode.add_tags_of_pr(pr_num, 'ci_failed')
+            self.outbox.add_tags_of_pr(pr_num, 'ci_failed')
 
     def _get_hash_from_commit(self, commit_list):
         hash_list = []
@@ -293,7 +296,7 @@ class Gate(Command):
                             build_num=pr_json['build_num'])
                         if 'building' in pre_build_info and pre_build_info['building']:
                             comment = "you retrigger the gatekeeper, the previous access task will stop and then restart the new access mission"
-                            self.gitcode.comment_pr(pr_num=pr_num, comment=comment)
+                            self.outbox.comment_pr(pr_num=pr_num, comment=comment)
                             self.jenkins.stop_build_by_build_num(
                                 job_name=pr_json['job_name'],
                                 build_num=pr_json['build_num'])
@@ -343,9 +346,11 @@ class Code:
             return Result().faild
 
         check_success = True
-        for commit in commit_hash_list:
+        # fetch the info of all commits concurrently, the order is kept
+        commit_info_list = self.gitcode.get_commits_info(commit_hash_list)
+        for commit, commit_info_data in zip(commit_hash_list, commit_info_list):
             #get all filename in a commit
-            commit_info = json.loads(self.gitcode.get_a_commit_info(commit))
+            commit_info = json.loads(commit_info_data)
             filename_list = [commit_files["filename"] for commit_files in commit_info["files"]]
             if len(filename_list) == 0:
                 print("In a pull request, no files have been deleted, added, or modified. \
@@ -13,8 +13,8 @@ import os
 from argparse import _SubParsersAction
 import time
 import getpass
-import hashlib
 
+from app import checksum
 from app.command import Command
 from app.lib import Gitee,Remote
 
@@ -120,21 +120,4 @@ class OTest(Command):
         xxx
         '''
         print(getpass.getuser())
-        self._add_sum_to_local_dir(local_dir= args.local_dir)
-
-    def _add_sum_to_local_dir(self, local_dir):
-        file_list = os.listdir(local_dir)
-        for file_name in file_list:
-            file_path = os.path.join(local_dir, file_name)
-            if os.path.isdir(file_path):
-                self._add_sum_to_local_dir(file_path)
-            else:
-                sha256 = hashlib.sha256()
-                with open(file_path, 'rb') as r_f:
-                    while True:
-                        data = r_f.read(1024)
-                        if not data:
-                            break
-                        sha256.update(data)
-                    with open(f'{file_path}.sha256sum', 'w', encoding="utf-8") as w_f:
-                        w_f.write(f"{str(sha256.hexdigest())} {file_name}")
+        checksum.add_sum_to_local_dir(local_dir= args.local_dir)
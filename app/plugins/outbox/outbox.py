@@ -0,0 +1,55 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+from argparse import _SubParsersAction
+import os
+import time
+
+from app.command import Command
+from app.lib import Gitcode, Gitee
+from app.outbox import Outbox, TOKEN_ENV
+
+class FlushOutbox(Command):
+    '''
+    This class sends the forge mutations queued in the outbox, it is started
+    in background by the commands that exit before their queue is empty, and
+    can also be run by hand to push a queue left by a broken job
+    '''
+    def __init__(self):
+        super().__init__(
+            "outbox",
+            "flush the queued forge mutations",
+            "This class sends the forge mutations queued in the outbox")
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-f', '--forge', dest="forge", default="Gitcode",
+            choices=["Gitcode", "Gitee"])
+        parser_addr.add_argument('-o', '--owner', dest="owner")
+        parser_addr.add_argument('-p', '--repo', dest="repo")
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
+        parser_addr.add_argument('-gt', '--git_token', dest="git_token", default=None)
+
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        token = args.git_token or os.environ.get(TOKEN_ENV)
+        forge_cls = Gitcode if args.forge == "Gitcode" else Gitee
+        forge = forge_cls(owner=args.owner, repo=args.repo, token=token, share_dir=args.share_dir)
+        outbox = Outbox(forge=forge, share_dir=args.share_dir)
+        # the mutations that keep failing are moved to the dead dir after
+        # max_attempts, so the loop always ends
+        backoff = 1
+        while outbox.flush() > 0:
+            time.sleep(backoff)
+            backoff = min(backoff * 2, outbox.max_backoff)
+        print(f"the outbox {outbox.spool_dir} is flushed")
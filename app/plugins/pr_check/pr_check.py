@@ -11,7 +11,6 @@ See the Mulan PSL v2 for more details.
 '''
 
 from argparse import _SubParsersAction
-import json
 from app.command import Command
 from app.lib import Gitcode
 
@@ -32,15 +31,15 @@ class PrCheck(Command):
         parser_addr.add_argument('-p', '--repo', dest="repo")
         parser_addr.add_argument('-gt', '--git_token', dest="git_token")
         parser_addr.add_argument('-pr', '--pr_num', dest="pr_num")
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
 
         return parser_addr
 
     def do_run(self, args, unknow):
         args = self.parser.parse_args(unknow)
-        self.gitcode = Gitcode(owner=args.owner, repo= args.repo, token=args.git_token)
-        commits_files_data = self.gitcode.get_commits_files(args.pr_num)
-        commit_files_list = json.loads(commits_files_data)
-        commit_files_list = self.gitcode.filter_delete_commit_files(commit_files_list)
+        self.gitcode = Gitcode(owner=args.owner, repo= args.repo, token=args.git_token, share_dir=args.share_dir)
+        commit_files_list = self.gitcode.filter_delete_commit_files(
+            self.gitcode.list_pr_files(args.pr_num))
         path_list = self._get_file_path_list(commit_files_list=commit_files_list)
         result = []
         if self.has_docs(path_list=path_list):
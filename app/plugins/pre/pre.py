@@ -17,6 +17,7 @@ from jenkins import JenkinsException
 
 from app.command import Command
 from app.lib import Jenkins, Gitcode
+from app.outbox import Outbox
 from app.const import PROCESS_LABEL, SUCCESS_LABEL, FAILED_LABEL
 
 class Pre(Command):
@@ -26,6 +27,7 @@ class Pre(Command):
     def __init__(self):
         self.jenkins = None
         self.gitcode = None
+        self.outbox = None
         self.owner = None
         self.repo = None
         self.pr_num = None
@@ -54,7 +56,9 @@ class Pre(Command):
         self.pr_num = args.pr_num
         self.share_dir = args.share_dir
         self.jenkins = Jenkins(jenkins_user=args.jenkins_user, jenkins_token=args.jenkins_pwd)
-        self.gitcode = Gitcode(owner=args.owner, repo=args.repo, token=args.git_token)
+        self.gitcode = Gitcode(owner=args.owner, repo=args.repo, token=args.git_token, share_dir=args.share_dir)
+        # the comments and labels are sent in background
+        self.outbox = Outbox(forge=self.gitcode, share_dir=args.share_dir)
 
         jenkins_info = self.get_jenkins_job_info()
         if jenkins_info is not None:
@@ -134,7 +138,7 @@ class Pre(Command):
             pre_build_info = self.jenkins.get_build_info(job_name=job_name, build_num=build_num)
             if 'building' in pre_build_info and pre_build_info['building']:
                 comment = "you retrigger the gatekeeper, the previous access task will stop and then restart the new access mission"
-                self.gitcode.comment_pr(pr_num=self.pr_num, comment=comment)
+                self.outbox.comment_pr(pr_num=self.pr_num, comment=comment)
                 self.jenkins.stop_build_by_build_num(
                     job_name=job_name,
                     build_num=build_num)
@@ -143,5 +147,5 @@ class Pre(Command):
             pass
 
     def _set_process_label(self, ):
-        self.gitcode.delete_tags_of_pr(self.pr_num, SUCCESS_LABEL, FAILED_LABEL)
-        self.gitcode.add_tags_of_pr(self.pr_num, PROCESS_LABEL)
+        self.outbox.delete_tags_of_pr(self.pr_num, SUCCESS_LABEL, FAILED_LABEL)
+        self.outbox.add_tags_of_pr(self.pr_num, PROCESS_LABEL)
@@ -16,7 +16,7 @@ import subprocess
 
 from app.command import Command
 from app.lib import Remote
-from app import util
+from app import checksum
 
 class PutToDst(Command):
     '''
@@ -46,6 +46,11 @@ class PutToDst(Command):
         parser_addr.add_argument('-u', '--remote_dst_user', dest="remote_dst_user", default=None)
         parser_addr.add_argument('-w', '--remote_dst_pwd', dest="remote_dst_pwd", default=None)
         parser_addr.add_argument('-k', '--remote_dst_sshkey', dest="remote_dst_sshkey", default=None)
+        # send a remote directory as one tar stream, optionally zstd compressed
+        parser_addr.add_argument('-stream', '--stream', dest="stream", action="store_true")
+        parser_addr.add_argument('-zstd', '--zstd', dest="zstd", action="store_true")
+        # publish a remote directory as dst_dir/<date> and point dst_dir/latest to it
+        parser_addr.add_argument('-publish', '--publish', dest="publish", action="store_true")
         parser_addr.add_argument('-ptoken', '--pypi_token', dest="pypi_token", default=None)
         parser_addr.add_argument('-pserver', '--pypi_server_name', dest="pypi_server_name", default=None)
         return parser_addr
@@ -66,7 +71,10 @@ class PutToDst(Command):
                 sign_file = args.sign_file,
                 local_dir = local_dir,
                 dst_dir = dst_dir,
-                delete_original = args.delete_original)
+                delete_original = args.delete_original,
+                is_stream = args.stream,
+                is_zstd = args.zstd,
+                is_publish = args.publish)
 
         #Shared disk or local folder
         elif int(args.dst_type) == 1:
@@ -92,16 +100,16 @@ class PutToDst(Command):
                            sign_file,
                            local_dir,
                            dst_dir,
-                           delete_original):
+                           delete_original,
+                           is_stream = False,
+                           is_zstd = False,
+                           is_publish = False):
         if remote_dst_ip is None \
             or remote_dst_port is None \
             or remote_dst_user is None \
             or (remote_dst_pwd is None and remote_dst_sshkey is None):
             return ValueError("Missing remote related parameters!")
 
-        if sign_file:
-            util.add_sum_to_local_dir(local_dir=local_dir)
-
         self.remote = Remote(
             remote_ip=remote_dst_ip,
             remote_port=remote_dst_port,
@@ -109,17 +117,34 @@ class PutToDst(Command):
             remote_pwd=remote_dst_pwd,
             remote_key=remote_dst_sshkey
             )
-        if os.path.isdir(local_dir):
-            self.remote.put_to_remote(
+        report = None
+        if os.path.isdir(local_dir) and is_publish:
+            report = self.remote.publish_to_remote(
+                local_dir=local_dir,
+                dst_dir=dst_dir,
+                is_stream=is_stream,
+                is_zstd=is_zstd,
+                is_sign=sign_file)
+        elif os.path.isdir(local_dir):
+            report = self.remote.put_to_remote(
                 local_dir=local_dir,
                 dst_dir=dst_dir,
-                is_delete_dst=delete_original)
+                is_delete_dst=delete_original,
+                is_stream=is_stream,
+                is_zstd=is_zstd,
+                is_sign=sign_file)
         if os.path.isfile(local_dir):
-            self.remote.put_file_to_remote(
+            report = self.remote.put_file_to_remote(
                 local_path=local_dir,
                 dst_dir=dst_dir,
-                is_delete_dst=delete_original
+                is_delete_dst=delete_original,
+                is_sign=sign_file
             )
+        # the job fails so that it is rerun, the big files resume where they stopped
+        if report is None and os.path.exists(local_dir):
+            raise IOError(f"connect to {remote_dst_ip} faild")
+        if report is not None and len(report.failed) > 0:
+            raise IOError(f"{len(report.failed)} files put faild")
 
     def _put_dst_to_local(self,
                             sign_file,
@@ -127,7 +152,7 @@ class PutToDst(Command):
                             dst_dir,
                             delete_original):
         if sign_file:
-            util.add_sum_to_local_dir(local_dir=local_dir)
+            checksum.add_sum_to_local_dir(local_dir=local_dir)
         if delete_original:
             if os.path.isdir(dst_dir):
                 shutil.rmtree(dst_dir)
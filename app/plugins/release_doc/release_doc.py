@@ -14,7 +14,6 @@ from argparse import _SubParsersAction
 import os
 import subprocess
 import shutil
-import json
 import git
 from git.exc import GitCommandError
 
@@ -68,9 +67,8 @@ class ReleaseDoc(Command):
         the exec will be called by releasedoc
         '''
         #determine if it is a document related PR
-        commits_files_data = self.gitee.get_commits_files(pr_num)
-        commit_files_list = json.loads(commits_files_data)
-        commit_files_list = self.gitee.filter_delete_commit_files(commit_files_list)
+        commit_files_list = self.gitee.filter_delete_commit_files(
+            self.gitee.list_pr_files(pr_num))
         if not self.is_docs_build(commit_files_list=commit_files_list):
             return
 
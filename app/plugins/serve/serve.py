@@ -0,0 +1,46 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app.app import App
+from app.server import Server, default_sock_path
+
+class Serve(Command):
+    '''
+    This class starts a long-running server on a local unix socket, the
+    commands are forwarded to it by `main.py` when the environment variable
+    EMBEDDED_CI_SOCK points to the socket, so every pipeline step does not
+    need to import libraries and parse configs again
+    '''
+    def __init__(self):
+        super().__init__(
+            "serve",
+            "run a warm server for embedded-ci commands",
+            """This class starts a long-running server on a local unix socket, the
+    commands are forwarded to it when EMBEDDED_CI_SOCK points to the socket""")
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-sock', '--sock_path', dest="sock_path", default=None)
+        parser_addr.add_argument('-idle', '--idle_timeout', dest="idle_timeout", default=3600,
+            help='''
+            the server exits when no command comes in the idle seconds, 0 means never
+            ''')
+
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        sock_path = args.sock_path or default_sock_path()
+        server = Server(app=App(), sock_path=sock_path, idle_timeout=int(args.idle_timeout))
+        server.serve_forever()
@@ -0,0 +1,61 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app.sstate import SstateGc as Gc, get_sstate_dirs
+from app import const
+
+class SstateGc(Command):
+    '''
+    trim the sstate-cache of the cron workspace down to a size budget
+    '''
+    def __init__(self):
+        super().__init__(
+            "sstate gc",
+            "trim sstate-cache directories down to a size budget",
+            """
+            trim the sstate-cache directories of a workspace, or the ones given
+            with -d, down to a size budget. The superseded objects are evicted
+            first and then the least recently used ones, see conf/comm.yaml
+            """)
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        # the cron workspace of the branch under the share dir
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
+        parser_addr.add_argument('-b', '--branch', dest="branch", default="master")
+        # an oebuild workspace, or sstate-cache directories
+        parser_addr.add_argument('-ws', '--workspace', dest="workspace", default=None)
+        parser_addr.add_argument('-d', '--sstate_dir', dest="sstate_dirs", action="append", default=None)
+        # the budget in GB and the min age in hours, the conf by default
+        parser_addr.add_argument('-g', '--budget', dest="budget", default=None)
+        parser_addr.add_argument('-a', '--min_age', dest="min_age", default=None)
+        parser_addr.add_argument('-n', '--dry_run', dest="is_dry_run", action="store_true")
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        sstate_dirs = list(args.sstate_dirs or [])
+        workspace = args.workspace
+        if workspace is None and args.share_dir is not None:
+            workspace = os.path.join(args.share_dir, const.CRON_WORKSPACE, f"openeuler_{args.branch}")
+        if workspace is not None:
+            sstate_dirs.extend(get_sstate_dirs(workspace))
+        if len(sstate_dirs) == 0:
+            raise ValueError("no sstate-cache directory, give -s, -ws or -d")
+        for sstate_dir in sstate_dirs:
+            if not os.path.isdir(sstate_dir):
+                raise FileNotFoundError(f"the {sstate_dir} not exists")
+            print(f"sstate-cache: {sstate_dir}")
+        Gc(budget=args.budget, min_age=args.min_age).collect(sstate_dirs, is_dry_run=args.is_dry_run)
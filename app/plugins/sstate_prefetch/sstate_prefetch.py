@@ -0,0 +1,66 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app.sstate import (find_index, get_sstate_dirs, get_task_sigs, prefetch, read_locked_sigs,
+                        write_index)
+
+class SstatePrefetch(Command):
+    '''
+    copy the sstate objects a build needs from an indexed cache to a local dir
+    '''
+    def __init__(self):
+        super().__init__(
+            "sstate prefetch",
+            "copy the sstate objects a build needs to a local dir",
+            """
+            copy the sstate objects the targets of a generated build directory
+            need, or the ones of a locked-sigs.inc, from the index of a cron
+            workspace to a local dir, which is then given to oebuild generate
+            -s as the sstate mirror. With -index the index of a workspace is
+            written instead
+            """)
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        # the index, or a dir of it or under it like the sstate-cache of a cron board
+        parser_addr.add_argument('-i', '--index', dest="index", default=None)
+        parser_addr.add_argument('-d', '--build_dir', dest="build_dir", default=None)
+        # the targets are separated by ;
+        parser_addr.add_argument('-t', '--targets', dest="targets", default=None)
+        parser_addr.add_argument('-sigs', '--locked_sigs', dest="locked_sigs", default=None)
+        parser_addr.add_argument('-o', '--output', dest="output", default=None)
+        parser_addr.add_argument('-j', '--jobs', dest="jobs", type=int, default=8)
+        parser_addr.add_argument('-index', '--write_index', dest="workspace", default=None)
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        if args.workspace is not None:
+            write_index(args.workspace, get_sstate_dirs(args.workspace))
+            return
+        if args.index is None or args.output is None:
+            raise ValueError("-i and -o are needed")
+        index_path = args.index if os.path.isfile(args.index) else find_index(args.index)
+        if index_path is None:
+            raise FileNotFoundError(f"no sstate index for {args.index}")
+        if args.locked_sigs is not None:
+            hashes = read_locked_sigs(args.locked_sigs)
+        elif args.build_dir is not None and args.targets is not None:
+            hashes = get_task_sigs(
+                os.path.abspath(args.build_dir),
+                [target.strip() for target in args.targets.split(';') if target.strip()])
+        else:
+            raise ValueError("-sigs, or -d and -t are needed")
+        prefetch(index_path, hashes, args.output, args.jobs)
@@ -0,0 +1,94 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import json
+import statistics
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app.sstate import get_history_path, load_history, get_hit_rate
+
+# a hit rate this many points below the mean of the runs before is a drop
+DROP_POINTS = 10
+
+class SstateReport(Command):
+    '''
+    show the sstate hit rate trend of the builds per branch, board and target
+    '''
+    def __init__(self):
+        super().__init__(
+            "sstate report",
+            "show the sstate hit rate trend of the builds",
+            """
+            show the sstate hit rate of the last runs of every branch, board and
+            target from the metrics history of the share dir, and warn when the
+            last run of one dropped below the runs before it
+            """)
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-s', '--share_dir', dest="share_dir", default=None)
+        parser_addr.add_argument('-f', '--history', dest="history", default=None)
+        parser_addr.add_argument('-b', '--branch', dest="branch", default=None)
+        parser_addr.add_argument('-d', '--board', dest="board", default=None)
+        # cron, ci, gate or build
+        parser_addr.add_argument('-j', '--job', dest="job", default=None)
+        parser_addr.add_argument('-n', '--count', dest="count", type=int, default=10)
+        parser_addr.add_argument('-out', '--output', dest="output", default=None)
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        path = args.history or get_history_path(args.share_dir)
+        groups = {}
+        for record in load_history(path):
+            if args.branch is not None and record.get('branch') != args.branch:
+                continue
+            if args.board is not None and record.get('board') != args.board:
+                continue
+            if args.job is not None and record.get('job') != args.job:
+                continue
+            if get_hit_rate(record) is None:
+                continue
+            key = (str(record.get('branch')), str(record.get('board')), str(record.get('target')))
+            groups.setdefault(key, []).append(record)
+        if len(groups) == 0:
+            print(f"no sstate metrics in {path}")
+            return
+
+        summary = []
+        for (branch, board, target), records in sorted(groups.items()):
+            records = records[-args.count:]
+            print(f"=================== {branch} {board}->{target} ===================")
+            print(f"{'time':<21}{'job':<7}{'result':<9}{'wanted':>8}{'local':>8}"
+                  f"{'mirrors':>9}{'missed':>8}{'hit':>8}{'wall(s)':>10}")
+            for record in records:
+                print(f"{record.get('time', ''):<21}{record.get('job', ''):<7}{record.get('result', ''):<9}"
+                      f"{record['wanted']:>8}{record.get('local') or 0:>8}{record.get('mirrors') or 0:>9}"
+                      f"{record.get('missed') or 0:>8}{get_hit_rate(record) * 100:>7.1f}%"
+                      f"{record.get('wall') or 0:>10}")
+            rates = [get_hit_rate(record) * 100 for record in records]
+            item = {
+                'branch': branch,
+                'board': board,
+                'target': target,
+                'runs': len(records),
+                'last': round(rates[-1], 1),
+                'mean': round(statistics.mean(rates), 1)}
+            if len(rates) > 1 and rates[-1] < statistics.mean(rates[:-1]) - DROP_POINTS:
+                item['drop'] = True
+                print(f"[WARN]: the hit rate dropped to {rates[-1]:.1f}%, "
+                      f"it was {statistics.mean(rates[:-1]):.1f}% in the runs before")
+            summary.append(item)
+
+        if args.output is not None:
+            with open(args.output, 'w', encoding="utf-8") as w_f:
+                w_f.write(json.dumps(summary, indent=2))
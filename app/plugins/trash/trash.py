@@ -0,0 +1,45 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+from argparse import _SubParsersAction
+
+from app.command import Command
+from app import trash
+
+class Trash(Command):
+    '''
+    remove directories through the trash of their filesystem
+    '''
+    def __init__(self):
+        super().__init__(
+            "trash",
+            "remove directories through the trash of their filesystem",
+            """
+            move directories to the trash of their filesystem and delete them
+            there in the background, with -sync they are deleted before the
+            command returns. -reap empties a trash directory, it is what the
+            background reaper runs
+            """)
+
+    def do_add_parser(self, parser_addr:_SubParsersAction):
+        parser_addr.add_argument('-p', '--path', dest="paths", action='append', default=[])
+        parser_addr.add_argument('-sync', '--sync', dest="is_sync", action="store_true")
+        parser_addr.add_argument('-reap', '--reap', dest="trash_dir", default=None)
+        parser_addr.add_argument('-j', '--jobs', dest="jobs", type=int, default=None)
+        return parser_addr
+
+    def do_run(self, args, unknow):
+        args = self.parser.parse_args(unknow)
+        for path in args.paths:
+            trash.remove(path, args.is_sync)
+        if args.trash_dir is not None:
+            trash.reap(args.trash_dir, args.jobs)
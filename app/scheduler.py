@@ -0,0 +1,249 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import io
+import os
+import sys
+import time
+import shutil
+import threading
+import traceback
+import contextvars
+
+from app import util
+from app.buildlog import BuildLog, get_log_path
+
+GB = 1024 * 1024 * 1024
+
+def get_mem_info():
+    '''
+    return the MemTotal and MemAvailable of the host in bytes, None when
+    /proc/meminfo can not be read
+    '''
+    info = {}
+    try:
+        with open("/proc/meminfo", 'r', encoding="utf-8") as r_f:
+            for line in r_f:
+                key, _, value = line.partition(':')
+                info[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None, None
+    return info.get('MemTotal'), info.get('MemAvailable')
+
+# the job whose thread, or a thread started in its context, is running
+_current_job = contextvars.ContextVar("board_job", default=None)
+
+class JobOutput(io.TextIOBase):
+    '''
+    The stdout while the boards build, the lines printed in the context of
+    a job, e.g. by publish_to_remote, go to the job like its build output
+    '''
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        # the unfinished line of every thread
+        self._parts = {}
+
+    def write(self, text):
+        job = _current_job.get()
+        if job is None:
+            return self.stream.write(text)
+        key = threading.get_ident()
+        lines = (self._parts.pop(key, "") + text).split("\n")
+        if lines[-1] != "":
+            self._parts[key] = lines[-1]
+        for line in lines[:-1]:
+            job.write(line)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+class BoardJob:
+    '''
+    The build of one board, func is called with the job and args in a
+    thread of its own. Its output goes to the log of the board, and to the
+    console prefixed with the board name when boards run at once
+    '''
+    def __init__(self, name, func, args, log_path):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.log_path = log_path
+        # the share of the cpus set when the job starts, None for all of them
+        self.threads = None
+        self.result = None
+        self.error = None
+        self.elapsed = 0
+        self._log_file = None
+        self._is_prefix = False
+        self._console = None
+
+    def write(self, line):
+        '''
+        write a line of output of the board
+        '''
+        if self._log_file is not None:
+            self._log_file.write(line + "\n")
+        if self._is_prefix:
+            line = f"[{self.name}] {line}"
+        # one write per line, the lines of the boards do not cut each other
+        console = self._console or sys.stdout
+        console.write(line + "\n")
+        console.flush()
+
+    def open_build_log(self, target):
+        '''
+        return the BuildLog of a bitbake target of the board, the condensed
+        output of it goes to the log of the board and the console
+        '''
+        return BuildLog(get_log_path(os.path.dirname(self.log_path), self.name, target), self.write)
+
+    def set_compile_threads(self, compile_path):
+        '''
+        set BB_NUMBER_THREADS and PARALLEL_MAKE in the local_conf of the
+        compile.yaml to the share of the board, oebuild writes them to
+        local.conf when it runs bitbake. Nothing is set when the board has
+        all the cpus, that is the default of bitbake
+        '''
+        if self.threads is None:
+            return
+        compile_conf = util.parse_yaml(compile_path)
+        local_conf = compile_conf.get('local_conf') or ""
+        local_conf += f'\nBB_NUMBER_THREADS = "{self.threads}"\n'
+        local_conf += f'PARALLEL_MAKE = "-j {self.threads}"\n'
+        compile_conf['local_conf'] = local_conf
+        util.write_yaml(compile_path, compile_conf)
+
+    def run(self, is_prefix, console = None):
+        '''
+        run the job, an exception is kept in error for the scheduler, what
+        the job prints goes to its write, see JobOutput
+        '''
+        self._is_prefix = is_prefix
+        self._console = console
+        _current_job.set(self)
+        start = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'w', encoding="utf-8", buffering=1) as self._log_file:
+                try:
+                    self.result = self.func(self, *self.args)
+                except Exception as e_p:
+                    self.error = e_p
+                    self.write(traceback.format_exc().rstrip('\n'))
+        except OSError as e_p:
+            self.error = e_p
+            print(f"[ERROR]: write the log of {self.name} faild: {e_p}")
+        finally:
+            self._log_file = None
+            self.elapsed = time.time() - start
+
+class BoardScheduler:
+    '''
+    Run the builds of independent boards at once under cpu, memory and disk
+    budgets. The cpus are split evenly between the boards that can run
+    together, see BoardJob.set_compile_threads, and a board only starts when the
+    memory and disk reserved for it are free. With one board at a time the
+    boards build in order like a plain loop
+    '''
+    def __init__(self, log_dir, disk_dir = None):
+        self.log_dir = log_dir
+        self.disk_dir = disk_dir or log_dir
+        conf = util.get_common_conf().get('scheduler') or {}
+        self.cpus = int(conf.get('cpus', 0)) or os.cpu_count() or 1
+        cpus_per_board = max(int(conf.get('cpus_per_board', 16)), 1)
+        self.max_jobs = int(conf.get('max_jobs', 0)) or max(self.cpus // cpus_per_board, 1)
+        self.memory_per_board = int(conf.get('memory_per_board', 16)) * GB
+        mem_total, _ = get_mem_info()
+        self.memory = int(conf.get('memory', 0)) * GB or mem_total
+        self.disk_per_board = int(conf.get('disk_per_board', 100)) * GB
+        self.poll_interval = int(conf.get('poll_interval', 10))
+        self.jobs = []
+        self._cond = threading.Condition()
+
+    def add(self, name, func, *args):
+        '''
+        add the build of a board, func(job, *args) returns the result of it
+        '''
+        job = BoardJob(name, func, args, os.path.join(self.log_dir, f"{name}.log"))
+        self.jobs.append(job)
+        return job
+
+    def get_threads(self):
+        '''
+        return the share of the cpus of every board
+        '''
+        return max(self.cpus // max(min(self.max_jobs, len(self.jobs)), 1), 1)
+
+    def _is_fit(self, running):
+        # the first board always starts, whatever it needs
+        if len(running) == 0:
+            return True
+        if len(running) >= self.max_jobs:
+            return False
+        _, mem_available = get_mem_info()
+        if self.memory is not None and \
+            (len(running) + 1) * self.memory_per_board > self.memory:
+            return False
+        if mem_available is not None and mem_available < self.memory_per_board:
+            return False
+        # every running board may still write its reserved disk
+        try:
+            disk_free = shutil.disk_usage(self.disk_dir).free
+        except OSError:
+            return True
+        return disk_free >= (len(running) + 1) * self.disk_per_board
+
+    def run(self):
+        '''
+        run the jobs in the order they were added, return them when all have
+        finished, the first error of a job is raised after that
+        '''
+        threads = self.get_threads()
+        is_prefix = min(self.max_jobs, len(self.jobs)) > 1
+        if is_prefix:
+            print(f"build {len(self.jobs)} boards, up to {self.max_jobs} at once "
+                  f"with {threads} threads each, the logs are under {self.log_dir}")
+        pending = list(self.jobs)
+        running = []
+        console = sys.stdout
+
+        def run_job(job):
+            try:
+                job.run(is_prefix, console)
+            finally:
+                with self._cond:
+                    running.remove(job)
+                    self._cond.notify_all()
+
+        sys.stdout = JobOutput(console)
+        try:
+            with self._cond:
+                while len(pending) > 0 or len(running) > 0:
+                    if len(pending) > 0 and self._is_fit(running):
+                        job = pending.pop(0)
+                        job.threads = threads if threads < (os.cpu_count() or 1) else None
+                        running.append(job)
+                        threading.Thread(target=run_job, args=(job,), daemon=True).start()
+                        continue
+                    self._cond.wait(self.poll_interval)
+        finally:
+            sys.stdout = console
+
+        for job in self.jobs:
+            status = "faild" if job.error is not None else "finished"
+            print(f"board {job.name} {status} in {job.elapsed:.0f}s, log: {job.log_path}")
+        for job in self.jobs:
+            if job.error is not None:
+                raise job.error
+        return self.jobs
@@ -0,0 +1,258 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import traceback
+import importlib
+from array import array
+
+# when this environment variable is set, `main.py <command>` forwards the
+# command to the warm server listening on the socket it points to
+SOCK_ENV = "EMBEDDED_CI_SOCK"
+
+# the modules warmed up by the server before the first request comes
+WARM_MODULES = ["requests", "paramiko", "jenkins", "git", "json2table", "ruamel.yaml"]
+
+_HEAD = struct.Struct('!I')
+_CODE = struct.Struct('!i')
+
+def default_sock_path():
+    '''
+    return the default unix socket path of the server
+    '''
+    return os.path.join(tempfile.gettempdir(), f"embedded-ci-{os.getuid()}.sock")
+
+def _recv_exactly(conn:socket.socket, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def forward(sock_path, argv):
+    '''
+    forward argv to the server, the stdout and stderr of the current process
+    are passed to the server, so the output of the command is written to them
+    directly. return the exit code of the command, or None if the server
+    can not be reached
+    '''
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(sock_path)
+    except OSError:
+        conn.close()
+        return None
+    request = json.dumps({
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': dict(os.environ)}).encode()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with conn:
+        fds = array('i', [sys.stdout.fileno(), sys.stderr.fileno()])
+        conn.sendmsg(
+            [_HEAD.pack(len(request)), request],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        data = _recv_exactly(conn, _CODE.size)
+    if len(data) < _CODE.size:
+        print("the embedded-ci server closed the connection unexpectedly")
+        return 1
+    return _CODE.unpack(data)[0]
+
+
+class Server:
+    '''
+    A long-running server that keeps the plugins, the parsed configs and the
+    third-party modules warm, every request is run in a process forked from
+    the warm server, so the working directory, environment and global state
+    of one command never leak into another
+    '''
+    def __init__(self, app, sock_path, idle_timeout = 3600):
+        self.app = app
+        self.sock_path = sock_path
+        self.idle_timeout = idle_timeout
+        self._workers = set()
+
+    def warm_up(self):
+        '''
+        import the plugins and the heavy third-party modules in advance
+        '''
+        start = time.time()
+        for mod_name in WARM_MODULES:
+            try:
+                importlib.import_module(mod_name)
+            except ImportError:
+                print(f"[WARN]: {mod_name} is not installed, it will be imported on use")
+        for name in self.app.plugins:
+            try:
+                self.app.get_command(name)
+            except Exception as e_p:
+                print(f"[WARN]: load command {name} faild: {e_p}")
+        # util loads yaml, it is imported here to keep the client side light
+        from app import util
+        util.get_common_conf()
+        print(f"server warm up finished in {time.time() - start:.2f}s")
+
+    def _listen(self):
+        if os.path.exists(self.sock_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.sock_path)
+                probe.close()
+                raise ValueError(f"a server is already listening on {self.sock_path}")
+            except OSError:
+                probe.close()
+                os.remove(self.sock_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(self.sock_path)
+        finally:
+            os.umask(old_umask)
+        sock.listen(64)
+        return sock
+
+    def _reap(self):
+        for pid in list(self._workers):
+            try:
+                res_pid, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                res_pid = pid
+            if res_pid != 0:
+                self._workers.discard(pid)
+
+    def serve_forever(self):
+        '''
+        accept requests until the server has been idle for idle_timeout seconds
+        '''
+        self.warm_up()
+        sock = self._listen()
+        sock.settimeout(1)
+        print(f"embedded-ci server is listening on {self.sock_path}")
+        last_active = time.time()
+        try:
+            while True:
+                self._reap()
+                if len(self._workers) > 0:
+                    last_active = time.time()
+                elif self.idle_timeout and time.time() - last_active > self.idle_timeout:
+                    print("the server is idle for a long time, exit")
+                    break
+                try:
+                    conn, _ = sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError as e_p:
+                    if e_p.errno == errno.EINTR:
+                        continue
+                    raise
+                last_active = time.time()
+                conn.settimeout(None)
+                self._dispatch(conn, sock)
+        finally:
+            sock.close()
+            if os.path.exists(self.sock_path):
+                os.remove(self.sock_path)
+
+    def _dispatch(self, conn:socket.socket, sock:socket.socket):
+        fds = []
+        try:
+            msg, ancdata, _, _ = conn.recvmsg(
+                _HEAD.size, socket.CMSG_SPACE(2 * array('i').itemsize))
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                    fds_arr = array('i')
+                    fds_arr.frombytes(data[:len(data) - len(data) % fds_arr.itemsize])
+                    fds.extend(fds_arr)
+            if len(msg) < _HEAD.size or len(fds) != 2:
+                raise ValueError("bad request")
+            request = json.loads(_recv_exactly(conn, _HEAD.unpack(msg)[0]))
+        except (OSError, ValueError) as e_p:
+            print(f"[WARN]: drop request: {e_p}")
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            return
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            self._run_worker(conn, fds, request)
+        self._workers.add(pid)
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+
+    def _run_worker(self, conn:socket.socket, fds, request):
+        code = 1
+        try:
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            os.dup2(fds[0], 1)
+            os.dup2(fds[1], 2)
+            for fd in fds:
+                os.close(fd)
+            sys.stdout = open(1, 'w', buffering=1, encoding='utf-8', closefd=False)
+            sys.stderr = open(2, 'w', buffering=1, encoding='utf-8', closefd=False)
+            os.environ.clear()
+            os.environ.update(request['env'])
+            os.chdir(request['cwd'])
+            threading.Thread(target=self._watch_client, args=(conn,), daemon=True).start()
+            code = self._run_command(request['argv'])
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                conn.sendall(_CODE.pack(code))
+            except OSError:
+                pass
+            os._exit(0)
+
+    def _run_command(self, argv):
+        try:
+            self.app.run(argv)
+        except SystemExit as e_p:
+            if e_p.code is None:
+                return 0
+            if isinstance(e_p.code, int):
+                return e_p.code
+            print(e_p.code, file=sys.stderr)
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return 0
+
+    @staticmethod
+    def _watch_client(conn:socket.socket):
+        # the client sends nothing after the request, so the connection only
+        # becomes readable when the client went away, e.g. the jenkins step was
+        # aborted, then stop the whole command including its subprocesses
+        try:
+            data = conn.recv(1)
+        except OSError:
+            data = b''
+        if not data:
+            os.killpg(os.getpgid(0), signal.SIGTERM)
@@ -0,0 +1,531 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from app import util
+
+GB = 1024 * 1024 * 1024
+# the name of the sstate directory of a build directory
+SSTATE_DIR_NAME = "sstate-cache"
+# sstate:<pn>:<package_arch>:<pv>:<pr>:<sstate_pkgarch>:<version>:<hash>_<task>.<ext>
+SSTATE_PATTERN = re.compile(
+    r"sstate:(?P<spec>.*):(?P<hash>[0-9a-f]{32,64})_(?P<task>[^.:]+)"
+    r"\.(?P<ext>tar\.zst|tar\.xz|tar\.gz|tgz)")
+# the directories of the first bytes of the hashes
+HASH_DIR_PATTERN = re.compile(r"[0-9a-f]{2}")
+# the files written next to an object, they go with it
+SIDECAR_SUFFIXES = (".siginfo", ".sig")
+# the index of the sstate objects of a workspace, written at its top by cron
+INDEX_NAME = "sstate-index.json.gz"
+# the task signatures that bitbake -S none writes to the build directory
+LOCKED_SIGS_NAME = "locked-sigs.inc"
+LOCKED_SIG_PATTERN = re.compile(r"([^\s:\"]+):(do_[\w-]+):([0-9a-f]{32,64})")
+# the directory under the share dir that keeps the sstate metrics of the builds
+METRICS_DIR = "sstate_metrics"
+HISTORY_NAME = "history.jsonl"
+# Sstate summary: Wanted 2000 Local 1800 Mirrors 0 Missed 200 Current 100 (90% match, 95% complete),
+# older bitbake writes Found instead of Local and Mirrors
+SUMMARY_PATTERN = re.compile(
+    r"Sstate summary: Wanted (?P<wanted>\d+) (?:Local (?P<local>\d+) Mirrors (?P<mirrors>\d+)"
+    r"|Found (?P<found>\d+)) Missed (?P<missed>\d+) Current (?P<current>\d+)")
+SETSCENE_PATTERN = re.compile(r"Setscene tasks: (?P<done>\d+) of (?P<total>\d+)")
+TASKS_PATTERN = re.compile(
+    r"Tasks Summary: Attempted (?P<attempted>\d+) tasks of which (?P<reused>\d+) didn't need to be rerun")
+
+@dataclass
+class SstateObject:
+    '''
+    An sstate object and its sidecars, the size is that of all of them and
+    last_used the latest atime or mtime of them. Bitbake touches the object
+    and its siginfo every time it restores them from the cache
+    '''
+    top_dir: str
+    rel_path: str
+    spec: str
+    hash: str
+    task: str
+    size: int = 0
+    last_used: float = 0
+    files: list = field(default_factory=list)
+
+    @property
+    def group(self):
+        '''
+        return the key of the objects that are versions of each other, they
+        only differ by pv, pr and hash
+        '''
+        fields = self.spec.split(':')
+        fields = fields[:2] + fields[4:] if len(fields) >= 6 else fields
+        return (self.top_dir, os.path.dirname(os.path.dirname(os.path.dirname(self.rel_path))),
+                ':'.join(fields), self.task)
+
+    @property
+    def pn(self):
+        '''
+        return the recipe name of the object
+        '''
+        return self.spec.split(':')[0]
+
+def parse_name(name):
+    '''
+    return the match of an sstate file name without its sidecar suffix,
+    None if it is not one
+    '''
+    for suffix in SIDECAR_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return SSTATE_PATTERN.fullmatch(name)
+
+def scan(sstate_dir):
+    '''
+    return the sstate objects under sstate_dir keyed by their path
+    relative to it, an orphan sidecar is an object of its own
+    '''
+    objects = {}
+    stack = [sstate_dir]
+    while len(stack) > 0:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+                continue
+            match = parse_name(entry.name)
+            if match is None:
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            rel_path = os.path.relpath(entry.path, sstate_dir)
+            for suffix in SIDECAR_SUFFIXES:
+                if rel_path.endswith(suffix):
+                    rel_path = rel_path[:-len(suffix)]
+                    break
+            obj = objects.get(rel_path)
+            if obj is None:
+                obj = SstateObject(
+                    top_dir=sstate_dir,
+                    rel_path=rel_path,
+                    spec=match['spec'],
+                    hash=match['hash'],
+                    task=match['task'])
+                objects[rel_path] = obj
+            obj.size = obj.size + stat.st_size
+            obj.last_used = max(obj.last_used, stat.st_atime, stat.st_mtime)
+            obj.files.append(entry.path)
+    return objects
+
+def get_sstate_dirs(workspace):
+    '''
+    return the sstate directories of the build directories of an oebuild
+    workspace
+    '''
+    return sorted(path for path in glob.glob(os.path.join(workspace, 'build', '*', SSTATE_DIR_NAME))
+                  if os.path.isdir(path))
+
+def format_size(size):
+    '''
+    return the size in GB, or in MB below 1GB
+    '''
+    if size >= GB:
+        return f"{size / GB:.2f}GB"
+    return f"{size / 1024 / 1024:.1f}MB"
+
+@dataclass
+class GcReport:
+    '''
+    the result of a garbage collection of sstate directories
+    '''
+    total_files: int = 0
+    total_size: int = 0
+    superseded: list = field(default_factory=list)
+    expired: list = field(default_factory=list)
+    reclaimed: int = 0
+    recent_files: int = 0
+    recent_kept: int = 0
+    recent_size: int = 0
+    recent_kept_size: int = 0
+
+    def print_summary(self, budget, is_dry_run = False):
+        '''
+        print what was or would be removed
+        '''
+        left = self.total_size - self.reclaimed
+        print(f"sstate: {self.total_files} objects, {format_size(self.total_size)}, "
+              f"budget {format_size(budget)}")
+        print(f"{'would evict' if is_dry_run else 'evicted'} {len(self.superseded)} superseded and "
+              f"{len(self.expired)} least recently used objects, {format_size(self.reclaimed)} "
+              f"reclaimed, {format_size(left)} left")
+        if left > budget:
+            print(f"[WARN]: {format_size(left)} is still over the budget, the rest is in recent use")
+        if self.recent_files > 0:
+            print(f"hit rate of the recently used objects: {self.recent_kept} of {self.recent_files} "
+                  f"({self.recent_kept * 100 / self.recent_files:.1f}%), "
+                  f"{self.recent_kept_size * 100 / max(self.recent_size, 1):.1f}% of the bytes")
+
+class SstateGc:
+    '''
+    Trim sstate directories down to a size budget. The superseded objects go
+    first: the older versions of a recipe task of which a newer one exists,
+    and that were not used for min_age. Then the least recently used objects
+    go until the budget is met, the objects used within min_age always stay.
+    The hit rate is that of the objects used within hit_window, what the
+    next builds most likely ask for, against the trimmed cache
+    '''
+    def __init__(self, budget = None, min_age = None, keep = None):
+        sstate_conf = util.get_common_conf().get('sstate') or {}
+        # budget in GB and min_age in hours, the conf is used for the ones not given
+        if budget is None:
+            budget = sstate_conf.get('gc_budget', 500)
+        if min_age is None:
+            min_age = sstate_conf.get('gc_min_age', 24)
+        if keep is None:
+            keep = sstate_conf.get('gc_keep', 1)
+        self.budget = int(float(budget) * GB)
+        self.min_age = float(min_age) * 3600
+        self.keep = max(int(keep), 1)
+        self.hit_window = float(sstate_conf.get('gc_hit_window', 7)) * 24 * 3600
+
+    def plan(self, objects, now = None):
+        '''
+        return the GcReport of the objects, the list of SstateObject of all
+        the sstate directories, nothing is removed
+        '''
+        now = now or time.time()
+        report = GcReport(
+            total_files=len(objects),
+            total_size=sum(obj.size for obj in objects))
+        evicted = set()
+        groups = {}
+        for obj in objects:
+            groups.setdefault(obj.group, []).append(obj)
+        for group in groups.values():
+            group.sort(key=lambda obj: obj.last_used, reverse=True)
+            for obj in group[self.keep:]:
+                if now - obj.last_used >= self.min_age:
+                    report.superseded.append(obj)
+                    evicted.add(id(obj))
+        size = report.total_size - sum(obj.size for obj in report.superseded)
+        for obj in sorted(objects, key=lambda obj: obj.last_used):
+            if size <= self.budget:
+                break
+            if id(obj) in evicted:
+                continue
+            if now - obj.last_used < self.min_age:
+                break
+            report.expired.append(obj)
+            evicted.add(id(obj))
+            size = size - obj.size
+        report.reclaimed = report.total_size - size
+        for obj in objects:
+            if now - obj.last_used < self.hit_window:
+                report.recent_files = report.recent_files + 1
+                report.recent_size = report.recent_size + obj.size
+                if id(obj) not in evicted:
+                    report.recent_kept = report.recent_kept + 1
+                    report.recent_kept_size = report.recent_kept_size + obj.size
+        return report
+
+    @staticmethod
+    def remove(objects):
+        '''
+        remove the files of the objects and the hash directories left empty
+        '''
+        dirs = set()
+        for obj in objects:
+            for path in obj.files:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                dirs.add(os.path.dirname(path))
+        # <hash[:2]>/<hash[2:4]>, the deeper one first
+        for path in sorted(dirs, key=len, reverse=True):
+            for dir_path in (path, os.path.dirname(path)):
+                if not HASH_DIR_PATTERN.fullmatch(os.path.basename(dir_path)):
+                    break
+                try:
+                    os.rmdir(dir_path)
+                except OSError:
+                    break
+
+    def collect(self, sstate_dirs, is_dry_run = False):
+        '''
+        trim the sstate directories together, return the GcReport
+        '''
+        objects = []
+        for sstate_dir in sstate_dirs:
+            objects.extend(scan(sstate_dir).values())
+        report = self.plan(objects)
+        report.print_summary(self.budget, is_dry_run)
+        if not is_dry_run:
+            self.remove(report.superseded + report.expired)
+        return report
+
+def get_history_path(share_dir = None):
+    '''
+    return the path of the sstate metrics history, metrics_dir of the conf,
+    or the one under the share dir, or the one under the tmp dir
+    '''
+    metrics_dir = (util.get_common_conf().get('sstate') or {}).get('metrics_dir')
+    if metrics_dir is None:
+        if share_dir is None:
+            share_dir = os.path.join(tempfile.gettempdir(), f"embedded-ci-{os.getuid()}")
+        metrics_dir = os.path.join(share_dir, METRICS_DIR)
+    return os.path.join(metrics_dir, HISTORY_NAME)
+
+def load_history(path):
+    '''
+    return the records of the history, the lines that can not be parsed are
+    skipped
+    '''
+    records = []
+    try:
+        with open(path, 'r', encoding="utf-8") as r_f:
+            for line in r_f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+def get_hit_rate(record):
+    '''
+    return the share of the wanted objects found locally or on a mirror,
+    None if nothing was wanted
+    '''
+    if not record.get('wanted'):
+        return None
+    return ((record.get('local') or 0) + (record.get('mirrors') or 0)) / record['wanted']
+
+class SstateMetrics:
+    '''
+    The sstate counts of one bitbake run, parsed from its output line by
+    line: the objects wanted, found locally, found on a mirror and missed,
+    the setscene tasks and the tasks that did not need to rerun. save
+    appends them with the wall time to the history of the share dir
+    '''
+    def __init__(self, job, branch, board, target):
+        self.record = {
+            'job': job,
+            'branch': branch,
+            'board': board,
+            'target': target,
+            'wanted': None,
+            'local': None,
+            'mirrors': None,
+            'missed': None,
+            'current': None,
+            'setscene_done': None,
+            'setscene_total': None,
+            'tasks': None,
+            'tasks_reused': None}
+        self._start = time.time()
+
+    def feed(self, line):
+        '''
+        parse a line of bitbake output, most lines cost a substring search
+        '''
+        if "Sstate summary" in line:
+            match = SUMMARY_PATTERN.search(line)
+            if match is not None:
+                local = match['local'] if match['local'] is not None else match['found']
+                self.record.update({
+                    'wanted': int(match['wanted']),
+                    'local': int(local),
+                    'mirrors': int(match['mirrors'] or 0),
+                    'missed': int(match['missed']),
+                    'current': int(match['current'])})
+        elif "Setscene tasks" in line:
+            match = SETSCENE_PATTERN.search(line)
+            if match is not None:
+                self.record['setscene_done'] = int(match['done'])
+                self.record['setscene_total'] = int(match['total'])
+        elif "Tasks Summary" in line:
+            match = TASKS_PATTERN.search(line)
+            if match is not None:
+                self.record['tasks'] = int(match['attempted'])
+                self.record['tasks_reused'] = int(match['reused'])
+
+    def save(self, is_success, share_dir = None):
+        '''
+        append the record to the history, a failure to write only loses it
+        '''
+        self.record['time'] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._start))
+        self.record['wall'] = round(time.time() - self._start, 1)
+        self.record['result'] = "success" if is_success else "faild"
+        hit_rate = get_hit_rate(self.record)
+        if hit_rate is not None:
+            print(f"sstate {self.record['board']}->{self.record['target']}: "
+                  f"wanted {self.record['wanted']}, local {self.record['local']}, "
+                  f"mirrors {self.record['mirrors']}, missed {self.record['missed']}, "
+                  f"hit rate {hit_rate * 100:.1f}%")
+        path = get_history_path(share_dir)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # one append per record, the builds of the node share the file
+            with open(path, 'a', encoding="utf-8") as w_f:
+                w_f.write(json.dumps(self.record) + "\n")
+        except OSError as e_p:
+            print(f"[WARN]: write sstate metrics {path} faild: {e_p}")
+
+def write_index(top_dir, sstate_dirs):
+    '''
+    write the index of the sstate objects of the sstate directories under
+    top_dir: the hash of every object to its sstate directory, its path in
+    it, its size and its sidecars. A hash found in several directories
+    points to the most recently used copy. Return the number of objects
+    '''
+    roots = []
+    entries = {}
+    last_used = {}
+    for sstate_dir in sstate_dirs:
+        roots.append(os.path.relpath(sstate_dir, top_dir))
+        for obj in scan(sstate_dir).values():
+            if last_used.get(obj.hash, -1) >= obj.last_used:
+                continue
+            base_path = os.path.join(sstate_dir, obj.rel_path)
+            entries[obj.hash] = [
+                len(roots) - 1,
+                obj.rel_path,
+                obj.size,
+                sorted(path[len(base_path):] for path in obj.files)]
+            last_used[obj.hash] = obj.last_used
+    index_path = os.path.join(top_dir, INDEX_NAME)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding="utf-8") as w_f:
+        w_f.write(json.dumps({
+            'version': 1,
+            'time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            'roots': roots,
+            'objects': entries}))
+    # the readers never see a half written index
+    os.replace(tmp_path, index_path)
+    print(f"wrote the index of {len(entries)} sstate objects to {index_path}")
+    return len(entries)
+
+def find_index(path, depth = 4):
+    '''
+    return the index of path or of the nearest of its parents, a cron
+    sstate directory finds the index of its workspace, None if there is none
+    '''
+    path = os.path.abspath(path)
+    for _ in range(depth + 1):
+        if os.path.isfile(os.path.join(path, INDEX_NAME)):
+            return os.path.join(path, INDEX_NAME)
+        if os.path.dirname(path) == path:
+            break
+        path = os.path.dirname(path)
+    return None
+
+def load_index(index_path):
+    '''
+    return the objects of the index keyed by hash, the path of an object is
+    made absolute and the path in its sstate directory kept, so the object
+    is copied to the same place of another one
+    '''
+    with gzip.open(index_path, 'rt', encoding="utf-8") as r_f:
+        data = json.loads(r_f.read())
+    top_dir = os.path.dirname(os.path.abspath(index_path))
+    roots = [os.path.join(top_dir, root) for root in data.get('roots') or []]
+    objects = {}
+    for obj_hash, (root, rel_path, size, suffixes) in (data.get('objects') or {}).items():
+        objects[obj_hash] = (os.path.join(roots[root], rel_path), rel_path, size, suffixes)
+    return objects
+
+def read_locked_sigs(path):
+    '''
+    return the task hashes of a locked-sigs.inc
+    '''
+    with open(path, 'r', encoding="utf-8") as r_f:
+        return {match[2] for match in LOCKED_SIG_PATTERN.findall(r_f.read())}
+
+def get_task_sigs(build_dir, targets):
+    '''
+    return the task hashes the targets of the build directory need, bitbake
+    only parses the recipes for them and builds nothing
+    '''
+    hashes = set()
+    for target in targets:
+        sigs_path = os.path.join(build_dir, LOCKED_SIGS_NAME)
+        if os.path.exists(sigs_path):
+            os.remove(sigs_path)
+        result = subprocess.run(
+            f"oebuild bitbake {target} -S none",
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=build_dir,
+            encoding="utf-8",
+            check=False)
+        if not os.path.exists(sigs_path):
+            raise ValueError(f"no {LOCKED_SIGS_NAME} for {target}: {result.stdout[-2000:]}")
+        hashes.update(read_locked_sigs(sigs_path))
+    return hashes
+
+def _copy_object(src_base, dst_base, suffixes):
+    copied = 0
+    for suffix in suffixes:
+        src_path = src_base + suffix
+        dst_path = dst_base + suffix
+        try:
+            size = os.stat(src_path).st_size
+        except FileNotFoundError:
+            # trimmed since the index was written, bitbake builds the task
+            continue
+        try:
+            if os.stat(dst_path).st_size == size:
+                continue
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+        copied = copied + size
+    return copied
+
+def prefetch(index_path, hashes, local_dir, workers = 8):
+    '''
+    copy the objects of the hashes found in the index to local_dir in the
+    layout of an sstate directory, it is then a file:// sstate mirror of
+    only what the build needs. The copies run in parallel, the shared disk
+    is slow per file rather than per byte. Return the copied bytes
+    '''
+    start = time.time()
+    objects = load_index(index_path)
+    found = [objects[obj_hash] for obj_hash in sorted(hashes) if obj_hash in objects]
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        sizes = list(executor.map(
+            lambda obj: _copy_object(obj[0], os.path.join(local_dir, obj[1]), obj[3]), found))
+    copied = sum(sizes)
+    print(f"sstate prefetch: {len(hashes)} tasks, {len(found)} objects in the index, "
+          f"{sum(1 for size in sizes if size > 0)} copied ({format_size(copied)}) to {local_dir} "
+          f"in {time.time() - start:.1f}s, {len(hashes) - len(found)} not in the index")
+    return copied
@@ -0,0 +1,750 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import io
+import os
+import re
+import json
+import select
+import time
+import shlex
+import socket
+import tarfile
+import hashlib
+import tempfile
+import threading
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from app import util, checksum
+
+# the max length of a command line sent to the remote shell
+MAX_CMD_LEN = 64 * 1024
+# the manifest of an uploaded directory, it is kept in the remote directory
+MANIFEST_NAME = ".manifest.json"
+# the symlink to the current publication of a published directory
+LATEST_NAME = "latest"
+# the names of the dated publications
+PUBLICATION_PATTERN = re.compile(r"\d{8}-\d{6}(-\d+)?")
+# the directory of the checkpoints of the resumable uploads
+CHECKPOINT_DIR = "upload_checkpoints"
+
+@dataclass
+class FileStat:
+    '''
+    the transfer result of one file
+    '''
+    local_path: str
+    remote_path: str
+    size: int = 0
+    seconds: float = 0
+    error: str = None
+    sha256: str = None
+
+    @property
+    def speed(self):
+        '''
+        return the throughput in MB/s
+        '''
+        return self.size / 1024 / 1024 / self.seconds if self.seconds > 0 else 0
+
+@dataclass
+class TransferReport:
+    '''
+    the transfer result of a batch of files
+    '''
+    files: list = field(default_factory=list)
+    seconds: float = 0
+    # the bytes sent over the connection, when it differs from the file sizes
+    wire_size: int = None
+
+    @property
+    def size(self):
+        '''
+        return the bytes transferred
+        '''
+        return sum(stat.size for stat in self.files if stat.error is None)
+
+    @property
+    def failed(self):
+        '''
+        return the files that failed
+        '''
+        return [stat for stat in self.files if stat.error is not None]
+
+    def print_summary(self):
+        '''
+        print the aggregate throughput of the batch
+        '''
+        speed = self.size / 1024 / 1024 / self.seconds if self.seconds > 0 else 0
+        print(f"put {len(self.files) - len(self.failed)} files, {self.size / 1024 / 1024:.2f}MB "
+              f"in {self.seconds:.2f}s, {speed:.2f}MB/s")
+        if self.wire_size is not None:
+            print(f"sent {self.wire_size / 1024 / 1024:.2f}MB over the wire")
+        for stat in self.failed:
+            print(f"file put faild: {stat.local_path}, {stat.error}")
+
+def quote_paths(paths):
+    '''
+    split paths into quoted shell argument lists of bounded length
+    '''
+    batch = []
+    batch_len = 0
+    for path in paths:
+        arg = shlex.quote(path)
+        if len(batch) > 0 and batch_len + len(arg) + 1 > MAX_CMD_LEN:
+            yield batch
+            batch = []
+            batch_len = 0
+        batch.append(arg)
+        batch_len = batch_len + len(arg) + 1
+    if len(batch) > 0:
+        yield batch
+
+@dataclass
+class ManifestDiff:
+    '''
+    the files added, removed and changed between two manifests, and the
+    number of directories that were compared
+    '''
+    added: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    dirs_compared: int = 0
+
+    @property
+    def is_empty(self):
+        '''
+        return True if the manifests are the same
+        '''
+        return len(self.added) == 0 and len(self.removed) == 0 and len(self.changed) == 0
+
+class Manifest:
+    '''
+    The sha256 and size of every file of an uploaded directory, keyed by the
+    path relative to the directory. The manifest is written next to the files
+    on the remote, so the next upload only needs one read to know what is
+    already there.
+
+    It is also a merkle tree: every directory has a hash of the names and
+    hashes of its files and subdirectories, "" is the root. Two manifests
+    are compared from the root down, and a subtree with the same hash on
+    both sides is skipped, so the cost follows what changed
+    '''
+    def __init__(self, files = None, dirs = None, tree = None):
+        self.files = files or {}
+        # computed when first used and again when serialized, the files may
+        # be changed in between. A manifest written before the tree was
+        # kept computes both once when loaded
+        self._dirs = dirs if tree is not None else None
+        self._tree = tree if dirs is not None else None
+
+    @classmethod
+    def from_local(cls, local_dir, paths):
+        '''
+        build the manifest of the local files
+        '''
+        stats = [(path, os.stat(path)) for path in paths]
+        sums = checksum.get_sums(local_dir, stats)
+        files = {}
+        for path, stat in stats:
+            files[os.path.relpath(path, local_dir)] = {
+                'sha256': sums[path],
+                'size': stat.st_size}
+        return cls(files)
+
+    @classmethod
+    def loads(cls, data):
+        '''
+        parse a manifest, an unreadable one is taken as empty
+        '''
+        try:
+            obj = json.loads(data)
+            return cls(obj.get('files') or {}, obj.get('dirs'), obj.get('tree'))
+        except (ValueError, AttributeError):
+            return cls()
+
+    def dumps(self):
+        '''
+        serialize the manifest
+        '''
+        self._dirs, self._tree = self._build_tree()
+        return json.dumps({'files': self.files, 'dirs': self._dirs, 'tree': self._tree},
+                          indent=1, sort_keys=True)
+
+    @property
+    def dirs(self):
+        '''
+        return the merkle hash of every directory keyed by relative path
+        '''
+        if self._dirs is None:
+            self._dirs, self._tree = self._build_tree()
+        return self._dirs
+
+    @property
+    def tree(self):
+        '''
+        return the total size, file names and subdirectory names of every
+        directory keyed by relative path, the diff walks it from the root
+        '''
+        if self._tree is None:
+            self._dirs, self._tree = self._build_tree()
+        return self._tree
+
+    def _build_tree(self):
+        tree = {"": {'size': 0, 'files': [], 'dirs': []}}
+        def add_dir(rel_dir):
+            if rel_dir in tree:
+                return
+            tree[rel_dir] = {'size': 0, 'files': [], 'dirs': []}
+            parent = os.path.dirname(rel_dir)
+            add_dir(parent)
+            tree[parent]['dirs'].append(os.path.basename(rel_dir))
+        for rel_path in self.files:
+            rel_dir = os.path.dirname(rel_path)
+            add_dir(rel_dir)
+            tree[rel_dir]['files'].append(os.path.basename(rel_path))
+        dirs = {}
+        # the deepest directories first, a directory hashes its subdirectories
+        for rel_dir in sorted(tree, key=lambda rel_dir: rel_dir.count('/') + (1 if rel_dir else 0),
+                              reverse=True):
+            node = tree[rel_dir]
+            node['files'].sort()
+            node['dirs'].sort()
+            lines = []
+            for name in node['files']:
+                info = self.files[os.path.join(rel_dir, name)]
+                node['size'] = node['size'] + info['size']
+                lines.append((name, f"f\t{name}\t{info['sha256']}\t{info['size']}\n"))
+            for name in node['dirs']:
+                sub_dir = os.path.join(rel_dir, name)
+                node['size'] = node['size'] + tree[sub_dir]['size']
+                lines.append((name, f"d\t{name}\t{dirs[sub_dir]}\n"))
+            dirs[rel_dir] = hashlib.sha256("".join(line for _, line in sorted(lines)).encode()).hexdigest()
+        return dirs, tree
+
+    def _get_files_under(self, rel_dir):
+        node = self.tree[rel_dir]
+        paths = [os.path.join(rel_dir, name) for name in node['files']]
+        for name in node['dirs']:
+            paths.extend(self._get_files_under(os.path.join(rel_dir, name)))
+        return paths
+
+    def diff(self, other):
+        '''
+        return the ManifestDiff from the other manifest to this one
+        '''
+        result = ManifestDiff()
+        dirs, tree = self.dirs, self.tree
+        other_dirs, other_tree = other.dirs, other.tree
+        empty = {'files': [], 'dirs': []}
+        stack = [""]
+        while len(stack) > 0:
+            rel_dir = stack.pop()
+            result.dirs_compared = result.dirs_compared + 1
+            if dirs.get(rel_dir) == other_dirs.get(rel_dir):
+                continue
+            node = tree.get(rel_dir, empty)
+            other_node = other_tree.get(rel_dir, empty)
+            files, other_files = set(node['files']), set(other_node['files'])
+            for name in sorted(files | other_files):
+                rel_path = os.path.join(rel_dir, name)
+                if name not in other_files:
+                    result.added.append(rel_path)
+                elif name not in files:
+                    result.removed.append(rel_path)
+                else:
+                    info, other_info = self.files[rel_path], other.files[rel_path]
+                    if info.get('sha256') != other_info.get('sha256') \
+                        or info.get('size') != other_info.get('size'):
+                        result.changed.append(rel_path)
+            subdirs, other_subdirs = set(node['dirs']), set(other_node['dirs'])
+            for name in sorted(subdirs | other_subdirs):
+                sub_dir = os.path.join(rel_dir, name)
+                if name not in other_subdirs:
+                    result.added.extend(self._get_files_under(sub_dir))
+                elif name not in subdirs:
+                    result.removed.extend(other._get_files_under(sub_dir))
+                else:
+                    stack.append(sub_dir)
+        return result
+
+    def get_changed(self, remote, remote_sizes = None):
+        '''
+        return the paths that are not on the remote yet, or differ from it.
+        The remote manifest is trusted when remote_sizes, the real size of
+        every remote file, is not given: a file leaves it before it is sent
+        again, so an aborted upload never leaves a file it vouches for.
+        When given, a file whose size does not match is sent again too
+        '''
+        diff = self.diff(remote)
+        changed = set(diff.added) | set(diff.changed)
+        if remote_sizes is None:
+            return sorted(changed)
+        # the remote files match the remote manifest when their count and
+        # total size do, only a mismatch, e.g. after an aborted upload left
+        # a partial file, needs the check of every file
+        count = len(remote_sizes) - (1 if MANIFEST_NAME in remote_sizes else 0)
+        total = sum(remote_sizes.values()) - remote_sizes.get(MANIFEST_NAME, 0)
+        if count == len(remote.files) and total == remote.tree[""]['size']:
+            return sorted(changed)
+        for rel_path, info in self.files.items():
+            if remote_sizes.get(rel_path) != info['size']:
+                changed.add(rel_path)
+        return sorted(changed)
+
+def get_partial_path(remote_path):
+    '''
+    return the path a resumable upload writes to before the final rename, it
+    is hidden so that clearing the remote directory with "rm -rf dir/*" keeps it
+    '''
+    return os.path.join(os.path.dirname(remote_path), f".{os.path.basename(remote_path)}.part")
+
+def is_partial_path(rel_path):
+    '''
+    return True if the path is a partial file of a resumable upload
+    '''
+    name = os.path.basename(rel_path)
+    return name.startswith('.') and name.endswith(".part")
+
+def get_checkpoint_dir():
+    '''
+    return the directory of the upload checkpoints
+    '''
+    checkpoint_dir = (util.get_common_conf().get('remote') or {}).get('checkpoint_dir')
+    if checkpoint_dir is None:
+        checkpoint_dir = os.path.join(tempfile.gettempdir(), f"embedded-ci-{os.getuid()}")
+    return os.path.join(checkpoint_dir, CHECKPOINT_DIR)
+
+class SftpUploader:
+    '''
+    Upload files over several ssh connections at once, every connection has
+    its own sftp channel with a large window, and the writes of a file are
+    pipelined, so a big image does not wait for the ack of every packet and
+    many small files do not queue behind it.
+
+    A file of chunk_size or more is written to a hidden partial file in
+    chunks, and the offset and sha256 of every chunk the remote has taken are
+    kept in a local checkpoint. A broken upload is resumed from the last
+    checkpoint, by the retries here or by the next run, after the sha256 of
+    the remote partial file is checked, and the partial file is renamed to
+    its name when it is complete
+    '''
+    def __init__(self, remote, connections = 4, block_size = 4 * 1024 * 1024,
+                 chunk_size = 64 * 1024 * 1024, retries = 3):
+        self.remote = remote
+        self.connections = max(1, connections)
+        self.block_size = block_size
+        self.chunk_size = max(chunk_size, block_size)
+        self.retries = max(0, retries)
+        self.checkpoint_dir = get_checkpoint_dir()
+        self._local = threading.local()
+        self._clients = []
+        self._clients_lock = threading.Lock()
+
+    def _get_client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            ssh_cli, sftp_cli = self.remote.get_ssh_client()
+            if sftp_cli is None:
+                raise IOError(f"connect to {self.remote.remote_ip} faild")
+            client = (ssh_cli, sftp_cli)
+            self._local.client = client
+            with self._clients_lock:
+                self._clients.append(client)
+        return client
+
+    def _drop_client(self):
+        # a broken connection is replaced by a new one on the next attempt
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            return
+        self._local.client = None
+        with self._clients_lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        client[1].close()
+        client[0].close()
+
+    def close(self):
+        '''
+        close all the connections
+        '''
+        with self._clients_lock:
+            for ssh_cli, sftp_cli in self._clients:
+                sftp_cli.close()
+                ssh_cli.close()
+            self._clients = []
+
+    def _get_checkpoint_path(self, remote_path):
+        key = f"{self.remote.remote_ip}:{self.remote.remote_port}:{remote_path}"
+        return os.path.join(self.checkpoint_dir, hashlib.sha256(key.encode()).hexdigest()[:16] + ".json")
+
+    def _load_checkpoint(self, remote_path, local_path, local_stat):
+        try:
+            with open(self._get_checkpoint_path(remote_path), 'r', encoding='utf-8') as r_f:
+                checkpoint = json.loads(r_f.read())
+        except (OSError, ValueError):
+            return None
+        # a checkpoint of another version of the file is useless
+        if checkpoint.get('local_path') != local_path \
+            or checkpoint.get('size') != local_stat.st_size \
+            or checkpoint.get('mtime_ns') != local_stat.st_mtime_ns:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, remote_path, checkpoint):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        checkpoint_path = self._get_checkpoint_path(remote_path)
+        with open(checkpoint_path + ".tmp", 'w', encoding='utf-8') as w_f:
+            w_f.write(json.dumps(checkpoint))
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+    def _remove_checkpoint(self, remote_path):
+        try:
+            os.remove(self._get_checkpoint_path(remote_path))
+        except FileNotFoundError:
+            pass
+
+    def _get_remote_sha256(self, ssh_cli, remote_path, size):
+        code, output = self.remote.exec_command(
+            ssh_cli,
+            f"head -c {size} {shlex.quote(remote_path)} | sha256sum")
+        if code != 0:
+            return None
+        return output.split(' ', 1)[0]
+
+    def _get_resume_offset(self, ssh_cli, local_path, remote_path, local_stat):
+        checkpoint = self._load_checkpoint(remote_path, local_path, local_stat)
+        if checkpoint is None or checkpoint.get('offset', 0) <= 0:
+            return 0
+        offset = checkpoint['offset']
+        remote_sha256 = self._get_remote_sha256(ssh_cli, get_partial_path(remote_path), offset)
+        if remote_sha256 != checkpoint.get('sha256'):
+            print(f"the partial upload of {remote_path} does not match its checkpoint, restart it")
+            return 0
+        print(f"resume {remote_path} from {offset / 1024 / 1024:.2f}MB")
+        return offset
+
+    def _put_file(self, stat:FileStat):
+        _, sftp_cli = self._get_client()
+        stat.size = 0
+        sha256 = hashlib.sha256()
+        with open(stat.local_path, 'rb') as r_f, \
+            sftp_cli.open(stat.remote_path, 'wb', bufsize=self.block_size) as w_f:
+            # the writes are not acked one by one, the errors are raised on close
+            w_f.set_pipelined(True)
+            while True:
+                data = r_f.read(self.block_size)
+                if not data:
+                    break
+                w_f.write(data)
+                sha256.update(data)
+                stat.size = stat.size + len(data)
+        # the sha256 comes from the buffers that were sent, not a second read
+        stat.sha256 = sha256.hexdigest()
+
+    def _put_chunked(self, stat:FileStat, local_stat):
+        ssh_cli, sftp_cli = self._get_client()
+        part_path = get_partial_path(stat.remote_path)
+        offset = self._get_resume_offset(ssh_cli, stat.local_path, stat.remote_path, local_stat)
+        sha256 = hashlib.sha256()
+        with open(stat.local_path, 'rb') as r_f:
+            # the hash of the part that is already on the remote
+            while r_f.tell() < offset:
+                sha256.update(r_f.read(min(self.block_size, offset - r_f.tell())))
+            stat.size = offset
+            while True:
+                # the file is closed after every chunk, the close is answered
+                # after the writes before it, so the remote has taken the chunk
+                with sftp_cli.open(part_path, 'r+b' if offset > 0 else 'wb', bufsize=self.block_size) as w_f:
+                    w_f.seek(offset)
+                    w_f.set_pipelined(True)
+                    chunk_end = offset + self.chunk_size
+                    is_eof = False
+                    while offset < chunk_end:
+                        data = r_f.read(self.block_size)
+                        if not data:
+                            is_eof = True
+                            break
+                        w_f.write(data)
+                        sha256.update(data)
+                        offset = offset + len(data)
+                        stat.size = offset
+                if sftp_cli.stat(part_path).st_size < offset:
+                    raise IOError(f"{part_path} is shorter than {offset} bytes")
+                if is_eof or offset >= local_stat.st_size:
+                    break
+                self._save_checkpoint(stat.remote_path, {
+                    'local_path': stat.local_path,
+                    'size': local_stat.st_size,
+                    'mtime_ns': local_stat.st_mtime_ns,
+                    'offset': offset,
+                    'sha256': sha256.copy().hexdigest()})
+        # a resumed file may have a tail written after the last checkpoint
+        sftp_cli.truncate(part_path, offset)
+        sftp_cli.posix_rename(part_path, stat.remote_path)
+        self._remove_checkpoint(stat.remote_path)
+        stat.sha256 = sha256.hexdigest()
+
+    def _put(self, local_path, remote_path):
+        paramiko = util.import_module('paramiko')
+        stat = FileStat(local_path=local_path, remote_path=remote_path)
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                local_stat = os.stat(local_path)
+                if local_stat.st_size >= self.chunk_size:
+                    self._put_chunked(stat, local_stat)
+                else:
+                    self._put_file(stat)
+                stat.error = None
+                break
+            except FileNotFoundError as e_p:
+                stat.error = str(e_p)
+                break
+            except (OSError, EOFError, paramiko.SSHException) as e_p:
+                stat.error = str(e_p) or type(e_p).__name__
+                self._drop_client()
+                if attempt < self.retries:
+                    print(f"put {local_path} faild: {stat.error}, retry {attempt + 1}/{self.retries}")
+                    time.sleep(min(2 ** attempt, 30))
+        stat.seconds = time.perf_counter() - start
+        if stat.error is None:
+            # one write per line, the workers print at the same time
+            print(f"dst_file: {remote_path} successful, "
+                  f"{stat.size / 1024 / 1024:.2f}MB in {stat.seconds:.2f}s, {stat.speed:.2f}MB/s\n", end="")
+        return stat
+
+    def upload(self, jobs):
+        '''
+        upload the (local_path, remote_path) jobs, the remote directories are
+        created in advance by the caller
+        '''
+        report = TransferReport()
+        start = time.perf_counter()
+        # the big files start first so that they do not end the batch alone
+        jobs = sorted(jobs, key=lambda job: _get_size(job[0]), reverse=True)
+        try:
+            # the uploads print in the context of the caller, e.g. the board
+            # job whose output is published, see scheduler.JobOutput
+            contexts = [contextvars.copy_context() for _ in jobs]
+            with ThreadPoolExecutor(max_workers=min(self.connections, max(len(jobs), 1))) as executor:
+                report.files = list(executor.map(
+                    lambda context, job: context.run(self._put, *job), contexts, jobs))
+        finally:
+            self.close()
+        report.seconds = time.perf_counter() - start
+        return report
+
+class _HashReader:
+    '''
+    a file wrapper that hashes the data read through it
+    '''
+    def __init__(self, r_f):
+        self.r_f = r_f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size = -1):
+        '''
+        read and hash the data
+        '''
+        data = self.r_f.read(size)
+        self.sha256.update(data)
+        return data
+
+class _ChannelWriter:
+    '''
+    a file wrapper that sends the data written to it into a ssh channel
+    '''
+    def __init__(self, channel):
+        self.channel = channel
+        self.size = 0
+
+    def write(self, data):
+        '''
+        send the data, return when it is all in the channel window
+        '''
+        self.channel.sendall(data)
+        self.size = self.size + len(data)
+        return len(data)
+
+    def flush(self):
+        '''
+        the channel has no buffer of its own
+        '''
+
+class TarStreamer:
+    '''
+    Pack local files into a tar stream on the fly and extract it by one
+    remote `tar -x` over a single ssh channel, optionally zstd compressed.
+    A tree of many small files costs one round trip instead of one per file,
+    and no archive is written to the local disk. The sha256 of every file is
+    taken while it is packed, and checked on the remote after the extraction
+    '''
+    def __init__(self, ssh_cli, window_size = 64 * 1024 * 1024, block_size = 4 * 1024 * 1024,
+                 is_zstd = False, zstd_level = 3):
+        self.ssh_cli = ssh_cli
+        self.window_size = window_size
+        self.block_size = block_size
+        self.is_zstd = is_zstd
+        self.zstd_level = zstd_level
+
+    def _open_channel(self, command):
+        channel = self.ssh_cli.get_transport().open_session(window_size=self.window_size)
+        channel.exec_command(command)
+        return channel
+
+    @staticmethod
+    def _finish_channel(channel):
+        # the remote sees the end of its stdin, then the exit status comes back
+        channel.shutdown_write()
+        # stdout and stderr are read together, a remote that fills the window
+        # of the one not read would wait forever
+        output = []
+        err_output = []
+        while True:
+            is_read = False
+            if channel.recv_ready():
+                output.append(channel.recv(64 * 1024))
+                is_read = True
+            if channel.recv_stderr_ready():
+                err_output.append(channel.recv_stderr(64 * 1024))
+                is_read = True
+            if is_read:
+                continue
+            if channel.closed or (channel.eof_received and channel.exit_status_ready()):
+                break
+            # the channel is readable when data comes on either stream
+            select.select([channel], [], [], 1)
+        # the data that came with the eof, both buffers are closed by it
+        for recv, buffer in [(channel.recv, output), (channel.recv_stderr, err_output)]:
+            while True:
+                data = recv(64 * 1024)
+                if not data:
+                    break
+                buffer.append(data)
+        output = b''.join(output)
+        err_output = b''.join(err_output)
+        code = channel.recv_exit_status()
+        channel.close()
+        return code, output.decode(errors="replace"), err_output.decode(errors="replace")
+
+    def _pack(self, channel, local_dir, rel_paths, stats):
+        writer = _ChannelWriter(channel)
+        compressor = None
+        fileobj = writer
+        if self.is_zstd:
+            zstandard = util.import_module('zstandard')
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level, threads=-1) \
+                .stream_writer(writer, closefd=False)
+            fileobj = compressor
+        with tarfile.open(fileobj=fileobj, mode='w|', bufsize=self.block_size) as tar:
+            for rel_path in rel_paths:
+                stat = stats[rel_path]
+                tarinfo = tar.gettarinfo(stat.local_path, arcname=rel_path)
+                if not tarinfo.isreg():
+                    tar.addfile(tarinfo)
+                    continue
+                with open(stat.local_path, 'rb') as r_f:
+                    reader = _HashReader(r_f)
+                    tar.addfile(tarinfo, reader)
+                stat.size = tarinfo.size
+                stat.sha256 = reader.sha256.hexdigest()
+        if compressor is not None:
+            compressor.close()
+        return writer.size
+
+    def _verify(self, dst_dir, stats):
+        # only the files that do not match are printed by sha256sum
+        channel = self._open_channel(
+            f"cd {shlex.quote(dst_dir)} && LC_ALL=C sha256sum --quiet -c -")
+        for rel_path, stat in stats.items():
+            if stat.sha256 is not None:
+                channel.sendall(f"{stat.sha256}  {rel_path}\n".encode())
+        code, output, err_output = self._finish_channel(channel)
+        if code == 0:
+            return
+        # stdout has "path: FAILED", stderr has "sha256sum: path: No such file"
+        lines = output.splitlines() + [line.partition(": ")[2] for line in err_output.splitlines()]
+        for line in lines:
+            rel_path, _, error = line.rpartition(": ")
+            if rel_path in stats:
+                stats[rel_path].error = f"verify faild: {error}"
+
+    def put_members(self, dst_dir, members):
+        '''
+        put the (relative path, data) members into dst_dir by one tar stream,
+        return the error or None
+        '''
+        dst_arg = shlex.quote(dst_dir)
+        channel = self._open_channel(f"mkdir -p {dst_arg} && tar -x -f - -C {dst_arg} --no-same-owner")
+        error = None
+        try:
+            with tarfile.open(fileobj=_ChannelWriter(channel), mode='w|', bufsize=self.block_size) as tar:
+                for rel_path, data in members:
+                    tarinfo = tarfile.TarInfo(rel_path)
+                    tarinfo.size = len(data)
+                    tarinfo.mtime = int(time.time())
+                    tarinfo.mode = 0o644
+                    tar.addfile(tarinfo, io.BytesIO(data))
+        except (OSError, EOFError, tarfile.TarError, socket.timeout) as e_p:
+            error = str(e_p) or type(e_p).__name__
+        code, _, err_output = self._finish_channel(channel)
+        if error is None and code != 0:
+            error = f"remote tar exit {code}: {err_output.strip()[:200]}"
+        return error
+
+    def stream(self, local_dir, rel_paths, dst_dir):
+        '''
+        put the files of local_dir given by their relative paths into dst_dir,
+        return the transfer report, the bytes sent are in report.wire_size
+        '''
+        report = TransferReport()
+        stats = {}
+        for rel_path in rel_paths:
+            stats[rel_path] = FileStat(
+                local_path=os.path.join(local_dir, rel_path),
+                remote_path=os.path.join(dst_dir, rel_path))
+        report.files = list(stats.values())
+        if len(stats) == 0:
+            return report
+
+        dst_arg = shlex.quote(dst_dir)
+        extract = f"tar -x -f - -C {dst_arg} --no-same-owner"
+        if self.is_zstd:
+            extract = f"zstd -d -c -q | {extract}"
+        start = time.perf_counter()
+        channel = self._open_channel(f"mkdir -p {dst_arg} && {extract}")
+        error = None
+        try:
+            report.wire_size = self._pack(channel, local_dir, rel_paths, stats)
+        except (OSError, EOFError, tarfile.TarError, socket.timeout) as e_p:
+            # the remote tar died or a local file changed under the reader
+            error = str(e_p) or type(e_p).__name__
+        code, _, err_output = self._finish_channel(channel)
+        if error is None and code != 0:
+            error = f"remote tar exit {code}: {err_output.strip()[:200]}"
+        if error is not None:
+            for stat in stats.values():
+                stat.error = error
+        else:
+            self._verify(dst_dir, stats)
+        report.seconds = time.perf_counter() - start
+        return report
+
+def _get_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
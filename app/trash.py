@@ -0,0 +1,152 @@
+'''
+Copyright (c) 2023 openEuler Embedded
+oebuild is licensed under Mulan PSL v2.
+You can use this software according to the terms and conditions of the Mulan PSL v2.
+You may obtain a copy of Mulan PSL v2 at:
+         http://license.coscl.org.cn/MulanPSL2
+THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+See the Mulan PSL v2 for more details.
+'''
+
+import os
+import sys
+import stat
+import time
+import uuid
+import fcntl
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from app import util
+
+# the trash directory in the workspace, or next to the tree removed
+TRASH_NAME = ".oebuild-trash"
+LOCK_NAME = ".lock"
+REAP_LOG = ".reap.log"
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+def get_trash_dir(path, top_dir = None):
+    '''
+    return the trash directory for the path, it is in top_dir, e.g. the
+    workspace or share dir the path is in, or next to the path without it,
+    so that a rename moves the tree into it and nothing is written above
+    the directories the caller owns
+    '''
+    path = os.path.abspath(path)
+    if top_dir is not None:
+        top_dir = os.path.abspath(top_dir)
+        if os.path.commonpath([path, top_dir]) == top_dir and path != top_dir:
+            return os.path.join(top_dir, TRASH_NAME)
+    return os.path.join(os.path.dirname(path), TRASH_NAME)
+
+def _on_error(func, path, _):
+    # a tree may hold read-only directories, e.g. the go module cache
+    parent = os.path.dirname(path)
+    try:
+        os.chmod(parent, os.stat(parent).st_mode | stat.S_IRWXU)
+        if os.path.isdir(path) and not os.path.islink(path):
+            os.chmod(path, os.stat(path).st_mode | stat.S_IRWXU)
+        func(path)
+    except OSError as e_p:
+        print(f"[WARN]: delete {path} faild: {e_p}")
+
+def _rmtree(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, onerror=_on_error)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+def delete_tree(path, workers = 1):
+    '''
+    delete a tree now, with workers the directories two levels below it are
+    deleted at once
+    '''
+    if workers > 1 and os.path.isdir(path) and not os.path.islink(path):
+        subtrees = []
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                subtrees.extend(sub.path for sub in os.scandir(entry.path))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_rmtree, subtrees))
+    _rmtree(path)
+
+def reap(trash_dir, workers = None):
+    '''
+    empty the trash directory, only one reaper works on a trash directory,
+    another one started meanwhile leaves at once
+    '''
+    if workers is None:
+        workers = int((util.get_common_conf().get('trash') or {}).get('workers', 4))
+    lock_path = os.path.join(trash_dir, LOCK_NAME)
+    while True:
+        try:
+            lock_f = open(lock_path, 'a', encoding="utf-8")
+        except OSError:
+            return
+        with lock_f:
+            try:
+                fcntl.flock(lock_f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+            while True:
+                entries = [e for e in os.listdir(trash_dir)
+                           if e not in (LOCK_NAME, REAP_LOG)]
+                if len(entries) == 0:
+                    break
+                for entry in entries:
+                    delete_tree(os.path.join(trash_dir, entry), workers)
+        # a tree moved in after the last look and whose reaper found the lock
+        if len([e for e in os.listdir(trash_dir)
+                if e not in (LOCK_NAME, REAP_LOG)]) == 0:
+            return
+
+def start_reaper(trash_dir):
+    '''
+    start a reaper of the trash directory in the background, it outlives the
+    command and runs with the lowest cpu and io priority
+    '''
+    conf = util.get_common_conf().get('trash') or {}
+    cmd = [sys.executable, MAIN_PATH, "trash", "-reap", trash_dir]
+    if conf.get('ionice', True) and shutil.which("ionice") is not None:
+        cmd = ["ionice", "-c", "3"] + cmd
+    if shutil.which("nice") is not None:
+        cmd = ["nice", "-n", "19"] + cmd
+    # run it here, not in a worker of the warm server
+    env = dict(os.environ)
+    env.pop("EMBEDDED_CI_SOCK", None)
+    try:
+        util.spawn_detached(cmd, log_path=os.path.join(trash_dir, REAP_LOG), env=env)
+    except OSError as e_p:
+        print(f"[WARN]: start the reaper of {trash_dir} faild: {e_p}")
+
+def remove(path, is_sync = False, top_dir = None):
+    '''
+    remove a tree like shutil.rmtree but return at once, the tree is
+    renamed into the trash of top_dir, see get_trash_dir, and deleted there
+    in the background. With is_sync, or when the rename is not possible,
+    the tree is deleted before return, for when the space is needed right
+    now, e.g. by the next build
+    '''
+    if not os.path.lexists(path):
+        return
+    conf = util.get_common_conf().get('trash') or {}
+    workers = int(conf.get('workers', 4))
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.unlink(path)
+        return
+    if is_sync or conf.get('sync', False):
+        delete_tree(path, workers)
+        return
+    trash_dir = get_trash_dir(path, top_dir)
+    trash_path = os.path.join(
+        trash_dir, f"{int(time.time())}-{uuid.uuid4().hex[:8]}-{os.path.basename(path)}")
+    try:
+        os.makedirs(trash_dir, exist_ok=True)
+        os.rename(path, trash_path)
+    except OSError as e_p:
+        print(f"[WARN]: move {path} to {trash_dir} faild, delete it now: {e_p}")
+        delete_tree(path, workers)
+        return
+    start_reaper(trash_dir)
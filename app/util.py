@@ -16,37 +16,13 @@ import importlib.util
 import subprocess
 import random
 import base64
-import hashlib
-import sys
-import time
+import functools
+import copy
+from urllib.parse import urlsplit
 
 import yaml
-import git
-
-def install_package(package_name):
-    pkg_mirror = "https://pypi.tuna.tsinghua.edu.cn/simple"
-    cmd = [sys.executable, "-m", "pip", "install", package_name, "-i", pkg_mirror]
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            subprocess.check_call(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            print(f"Successfully installed {package_name}")
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"Attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(2)  # 等待2秒后重试
-    
-    print(f"Failed to install {package_name} after {max_retries} attempts")
-    return False
 
-try:
-    from json2table import convert
-except ImportError:
-    install_package('json2table')
-    from json2table import convert
-
-from urllib.parse import urlsplit
+from app import trash
 
 def check_oebuild_directory(o_dir: str):
     '''
@@ -57,7 +33,7 @@ def check_oebuild_directory(o_dir: str):
     oebuild_dir = os.path.join(o_dir, '.oebuild')
     if os.path.exists(oebuild_dir):
         return True
-    shutil.rmtree(o_dir)
+    trash.remove(o_dir)
     return False
 
 def parse_yaml(yaml_dir):
@@ -75,14 +51,19 @@ def write_yaml(yaml_dir, data):
     with open(yaml_dir, 'w', encoding='utf-8') as w_f:
         yaml.dump(data, w_f)
 
+@functools.lru_cache(maxsize=None)
+def _load_common_conf():
+    yaml_dir = os.path.join(get_conf_path(), "comm.yaml")
+    with open(yaml_dir, 'r', encoding='utf-8') as r_f:
+        return yaml.load(r_f.read(), yaml.Loader)
+
 def get_common_conf():
     '''
-    parser comm.yaml file and return json object
+    parser comm.yaml file and return json object, the file is read once
+    because it does not change while the process is running, and every
+    caller gets a copy of its own so that a change to it stays local
     '''
-    yaml_dir = os.path.join(get_conf_path(), "comm.yaml")
-    with open(yaml_dir, 'r', encoding='utf-8') as r_f:
-        data = yaml.load(r_f.read(), yaml.Loader)
-        return data
+    return copy.deepcopy(_load_common_conf())
 
 def get_top_path():
     '''
@@ -121,6 +102,7 @@ def clone_repo_with_depth(src_dir, repo, remote_url, branch, depth):
     '''
     clone remote repo to local with depth
     '''
+    git = import_module('git', 'GitPython')
     os.chdir(src_dir)
     git.Repo.clone_from(url=remote_url, to_path=repo, branch = branch, depth = depth)
 
@@ -128,6 +110,7 @@ def clone_repo_with_version_depth(src_dir, repo_dir, remote_url, version, depth)
     '''
     clone remote repo to local with depth
     '''
+    git = import_module('git', 'GitPython')
     os.chdir(src_dir)
     repo = git.Repo.init(repo_dir)
     remote = git.Remote.add(repo = repo, name = "origin", url = remote_url)
@@ -163,8 +146,9 @@ def json_to_html(json_data, direc="LEFT_TO_RIGHT"):
     '''
     translate json object to html data
     '''
+    json2table = import_module('json2table')
     table_attributes = {"style" : "align: center"}
-    html = convert(json_data, build_direction=direc, table_attributes=table_attributes)
+    html = json2table.convert(json_data, build_direction=direc, table_attributes=table_attributes)
     return html
 
 def generate_random_str(randomlength=16):
@@ -190,6 +174,19 @@ def install_package(package_name, remote_url = None):
     except subprocess.CalledProcessError:
         print(f"install {package_name} failed, please do it manual")
 
+def import_module(module_name, package_name = None):
+    '''
+    import a third-party module on first use and install it if missing,
+    heavy modules are loaded in this way so that commands which do not
+    need them start fast
+    '''
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        install_package(package_name or module_name)
+        importlib.invalidate_caches()
+        return importlib.import_module(module_name)
+
 def base64_encode(text):
     """
     encode text with base64
@@ -202,25 +199,24 @@ def base64_decode(text):
     """
     return base64.b64decode(text.encode()).decode()
 
-def add_sum_to_local_dir(local_dir):
-    """
-    adds a sign to all files in the specified directory
-    """
-    file_list = os.listdir(local_dir)
-    for file_name in file_list:
-        file_path = os.path.join(local_dir, file_name)
-        if os.path.isdir(file_path):
-            add_sum_to_local_dir(file_path)
-        else:
-            sha256 = hashlib.sha256()
-            with open(file_path, 'rb') as r_f:
-                while True:
-                    data = r_f.read(1024)
-                    if not data:
-                        break
-                    sha256.update(data)
-                with open(f'{file_path}.sha256sum', 'w', encoding="utf-8") as w_f:
-                    w_f.write(f"{str(sha256.hexdigest())} {file_name}")
+def spawn_detached(cmd, log_path, env = None):
+    '''
+    start cmd in a new session that outlives the current command, jenkins
+    leaves the processes marked with dontKillMe alone when the build ends
+    '''
+    env = dict(os.environ if env is None else env)
+    env['BUILD_ID'] = "dontKillMe"
+    env['JENKINS_NODE_COOKIE'] = "dontKillMe"
+    with open(log_path, 'a', encoding='utf-8') as log_f:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=log_f,
+            stderr=subprocess.STDOUT,
+            env=env,
+            cwd=get_top_path(),
+            start_new_session=True)
+    return proc.pid
 
 def is_url(variable):
     try:
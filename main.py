@@ -10,16 +10,28 @@ MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
 See the Mulan PSL v2 for more details.
 '''
 
+import os
 import sys
 
-from app.app import App
+from app import server
 
 def main(argv=None):
     '''
     the main enterpoint
     '''
+    argv = argv or sys.argv[1:]
+    # forward the command to the warm server if there is one
+    sock_path = os.environ.get(server.SOCK_ENV)
+    if sock_path and (len(argv) == 0 or argv[0] != "serve"):
+        code = server.forward(sock_path, argv)
+        if code is not None:
+            sys.exit(code)
+
+    # the app and its plugins are imported only when the command runs here,
+    # so that forwarding to the server stays light
+    from app.app import App
     app = App()
-    app.run(argv or sys.argv[1:])
+    app.run(argv)
 
 if __name__ == "__main__":
     main()